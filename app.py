@@ -1,31 +1,64 @@
 import streamlit as st
-import asyncio
 import os
 from dotenv import load_dotenv
-from src.api.spoonacular_integration import fetch_recipes_by_ingredients
-from langchain.embeddings import OpenAIEmbeddings
-from src.rag.vectorstore import store_recipes, retrieve_recipes_by_ingredients, retrieve_similar_recipes
-from src.rag.llm import generate_recipe
-from src.rag.utils import parse_ingredients
 
 
-def initialize_environment():
-    """Initialize environment variables and configurations"""
+@st.cache_resource
+def load_environment():
+    """
+    Load .env once per process (Streamlit runs this script again on every
+    rerun). The src modules read their settings when imported, so this
+    runs before their imports.
+    """
     os.environ["LANGCHAIN_ALLOW_DANGEROUS_DESERIALIZATION"] = "true"
     load_dotenv()
+    return True
+
+
+load_environment()
+
+# The heavy dependencies (langchain_openai, qdrant_client, the Spoonacular
+# client) are imported on first use or by preload(), not here
+from src import telemetry
+from src.pipeline import RecipePipeline, load_config, preload
+from src.rag.ingredient_index import IngredientIndex
+from src.rag.llm import get_llm, set_generation_cache
+from src.rag.generation_cache import GenerationCache
+from src.rag.nutrition import nutrition_markdown, recipe_nutrition
+from src.rag.prefetch import RecipePrefetcher
+from src.rag.utils import parse_ingredients
+from src.warming import get_query_log, start_warmer
+
+logger = telemetry.get_logger(__name__)
+
+GENERATION_CACHE_SEMANTIC = os.getenv(
+    "GENERATION_CACHE_SEMANTIC", "").lower() in ("1", "true", "yes")
+# How long "Gerar outra receita" waits for a variant that is already generating
+PREFETCH_WAIT_TIMEOUT = int(os.getenv("PREFETCH_WAIT_TIMEOUT", "60"))
 
-    try:
-        asyncio.get_running_loop()
-    except RuntimeError:
-        asyncio.set_event_loop(asyncio.new_event_loop())
 
-    return {
-        'openai_api_key': os.getenv("OPENAI_API_KEY"),
-        'qdrant_url': os.getenv("QDRANT_URL"),
-        'qdrant_api_key': os.getenv("QDRANT_API_KEY"),
-        'collection_name': "recipes",
-        'embedder': OpenAIEmbeddings(openai_api_key=os.getenv("OPENAI_API_KEY"))
-    }
+@st.cache_resource
+def get_config():
+    """Pipeline configuration, with its embedder, built once per process"""
+    return load_config()
+
+
+@st.cache_resource
+def get_pipeline():
+    """
+    Pipeline (and its retrieval cache) shared by every session of this
+    process, with the shared chat model. Vector store clients are pooled
+    per process by src/rag/vectorstore.py. Starts the cache warmer when
+    WARMING_ENABLED is set.
+    """
+    config = get_config()
+    # Enable the semantic tier of the generation cache when configured
+    if GENERATION_CACHE_SEMANTIC:
+        set_generation_cache(GenerationCache(embedder=config['embedder']))
+    pipeline = RecipePipeline(config, llm=get_llm(config['openai_api_key']),
+                              query_log=get_query_log())
+    start_warmer(pipeline)
+    return pipeline
 
 
 def initialize_session_state():
@@ -36,37 +69,41 @@ def initialize_session_state():
         st.session_state.ingredients_cache = None
     if 'app_logs' not in st.session_state:
         st.session_state.app_logs = []
+    if 'recipe_prefetcher' not in st.session_state:
+        st.session_state.recipe_prefetcher = None
 
 
 class AppLogger:
-    """Logger class to collect app messages for modal display"""
+    """
+    View of the user-facing telemetry events of this session, for modal
+    display. main() captures the events emitted while it runs (here or in
+    the pipeline) into st.session_state.app_logs.
+    """
 
     @staticmethod
     def clear_logs():
-        """Clear all logs"""
-        st.session_state.app_logs = []
+        """Clear all logs (in place, the list is the capture target)"""
+        st.session_state.app_logs.clear()
 
     @staticmethod
     def log_info(message):
         """Add info message to logs"""
-        st.session_state.app_logs.append({"type": "info", "message": message})
+        telemetry.ui("info", message)
 
     @staticmethod
     def log_success(message):
         """Add success message to logs"""
-        st.session_state.app_logs.append(
-            {"type": "success", "message": message})
+        telemetry.ui("success", message)
 
     @staticmethod
     def log_warning(message):
         """Add warning message to logs"""
-        st.session_state.app_logs.append(
-            {"type": "warning", "message": message})
+        telemetry.ui("warning", message)
 
     @staticmethod
     def log_error(message):
         """Add error message to logs"""
-        st.session_state.app_logs.append({"type": "error", "message": message})
+        telemetry.ui("error", message)
 
     @staticmethod
     def display_logs_modal():
@@ -91,7 +128,7 @@ class AppLogger:
 def filter_user_ingredients_by_recipes(user_ingredients, retrieved_docs):
     """
     Filter user ingredients to only include those that appear in any of the retrieved recipes.
-    Uses substring matching to handle complex ingredient names.
+    Uses partial-name matching (through an ingredient index) to handle complex ingredient names.
 
     Args:
         user_ingredients: List of ingredients provided by the user
@@ -103,35 +140,20 @@ def filter_user_ingredients_by_recipes(user_ingredients, retrieved_docs):
     if not retrieved_docs:
         return user_ingredients
 
-    # Get all used_ingredients from all retrieved recipes
-    all_recipe_ingredients = []
-    for doc in retrieved_docs:
-        used_ingredients = doc.metadata.get('used_ingredients', [])
-        all_recipe_ingredients.extend([ing.lower()
-                                      for ing in used_ingredients])
-
-    # Show first 10
-    print(f"DEBUG: All recipe ingredients: {all_recipe_ingredients[:10]}...")
-
-    # Filter user ingredients that are contained in any recipe ingredient
-    valid_ingredients = []
-    for user_ing in user_ingredients:
-        user_ing_lower = user_ing.lower()
-
-        # Check if user ingredient is contained in any recipe ingredient
-        for recipe_ing in all_recipe_ingredients:
-            if user_ing_lower in recipe_ing:
-                print(f"DEBUG: Found match: '{user_ing}' in '{recipe_ing}'")
-                valid_ingredients.append(user_ing)
-                break  # Found match, move to next user ingredient
-
-    print(f"DEBUG: Valid ingredients after filtering: {valid_ingredients}")
+    valid_ingredients = IngredientIndex.from_documents(
+        retrieved_docs).matched_terms(user_ingredients)
+
+    logger.debug("Valid ingredients after filtering: %s", valid_ingredients)
     return valid_ingredients
 
 
 def should_reset_cache(current_query):
     """Check if cache should be reset based on ingredients change"""
     if st.session_state.ingredients_cache != current_query:
+        # Stop generating variants for the previous ingredients
+        if st.session_state.recipe_prefetcher is not None:
+            st.session_state.recipe_prefetcher.cancel()
+            st.session_state.recipe_prefetcher = None
         st.session_state.generated_recipes = []
         st.session_state.ingredients_cache = current_query
         AppLogger.clear_logs()  # Clear logs for new search
@@ -139,123 +161,75 @@ def should_reset_cache(current_query):
     return False
 
 
-def fetch_recipes_with_ingredient_filter(ingredients_list, config):
-    """Fetch recipes using Spoonacular first, then fall back to Qdrant cache"""
-
-    query = ", ".join(ingredients_list)
-
-    # First, try to get fresh results from Spoonacular for the complete ingredient list
-    AppLogger.log_info("Buscando receitas no Spoonacular...")
-
-    try:
-        print(
-            f"DEBUG: Searching Spoonacular for ingredients: {ingredients_list}")
-        recipe_docs = fetch_recipes_by_ingredients(ingredients_list)
-
-        if recipe_docs:
-            AppLogger.log_success(
-                f"{len(recipe_docs)} receitas encontradas no Spoonacular!")
-
-            # Show debug info about Spoonacular results
-            for i, doc in enumerate(recipe_docs[:2]):
-                print(f"DEBUG: Spoonacular doc {i} metadata: {doc.metadata}")
-
-            # Store in Qdrant for future use (this will also create the index)
-            AppLogger.log_info(
-                "Armazenando receitas no Qdrant para futuras buscas...")
-            store_recipes(recipe_docs, config['embedder'], config['qdrant_url'],
-                          config['qdrant_api_key'], config['collection_name'])
-
-            AppLogger.log_success("Receitas armazenadas com sucesso!")
-            return recipe_docs
-
-        else:
-            AppLogger.log_warning(
-                "Nenhuma receita encontrada no Spoonacular com todos os ingredientes.")
-            AppLogger.log_info(
-                "Buscando receitas similares no Qdrant...")
-
-    except Exception as e:
-        AppLogger.log_warning(f"Erro ao buscar no Spoonacular: {str(e)}")
-        print(f"DEBUG: Exception in Spoonacular search: {e}")
-        AppLogger.log_info("Tentando buscar no Qdrant...")
-
-    # If Spoonacular fails or returns no results, try to retrieve from Qdrant cache
-    try:
-        print(f"DEBUG: Searching Qdrant for ingredients: {ingredients_list}")
-
-        # First try with ingredient filtering
-        retrieved_docs = retrieve_recipes_by_ingredients(
-            ingredients_list, config['embedder'], config['qdrant_url'],
-            config['qdrant_api_key'], config['collection_name'], k=5
-        )
-
-        print(
-            f"DEBUG: Found {len(retrieved_docs) if retrieved_docs else 0} docs with ingredient filter")
-
-        # Check if the cached recipes actually contain all requested ingredients
-        if retrieved_docs:
-            # Verify that we have recipes that use all the requested ingredients
-            valid_recipes = []
-            for doc in retrieved_docs:
-                used_ingredients = [
-                    ing.lower() for ing in doc.metadata.get('used_ingredients', [])]
-                # Check if all user ingredients are found in this recipe's used ingredients
-                if all(any(user_ing.lower() in recipe_ing for recipe_ing in used_ingredients)
-                       for user_ing in ingredients_list):
-                    valid_recipes.append(doc)
-
-            if valid_recipes:
-                AppLogger.log_success(
-                    f"{len(valid_recipes)} receitas encontradas no cache local que usam todos os ingredientes!")
-                return valid_recipes
-            else:
-                AppLogger.log_info(
-                    "Receitas no cache não contêm todos os ingredientes solicitados.")
-
-        # If no results with filter, try regular similarity search as last resort
-        if not retrieved_docs:
-            print("DEBUG: No results with filter, trying similarity search")
-            retrieved_docs = retrieve_similar_recipes(
-                query, config['embedder'], config['qdrant_url'],
-                config['qdrant_api_key'], config['collection_name'], k=5
-            )
-            print(
-                f"DEBUG: Similarity search returned {len(retrieved_docs) if retrieved_docs else 0} docs")
-
-        if retrieved_docs:
+def fetch_recipes_with_ingredient_filter(ingredients_list, pipeline, new_query=True):
+    """
+    Fetch recipes for an ingredient set, reusing results already retrieved by
+    any session. Streamlit reruns with the same ingredients (selecting or
+    regenerating a recipe) therefore make no external calls, and are not
+    counted again (new_query=False) for the cache warmer. The pipeline's
+    messages reach the logs through main's capture.
+    """
+    result = pipeline.retrieve(ingredients_list, record=new_query)
+    if result["cached"] and not st.session_state.app_logs:
+        AppLogger.log_info(
+            "Receitas recuperadas do cache (nenhuma chamada externa).")
+    return result["docs"]
+
+
+def generate_new_recipe(ingredients_list, context, context_ids, pipeline):
+    """Generate a new recipe, painting it as it streams in, and add to session state"""
+    placeholder = st.empty()
+    partial_recipe = {"title": "", "ingredients": [], "steps": []}
+    recipe_json = None
+
+    for event in pipeline.stream(context, ingredients_list,
+                                 st.session_state.generated_recipes, context_ids):
+        if event["type"] == "field":
+            partial_recipe[event["key"]] = event["value"]
+        elif event["type"] == "item":
+            partial_recipe.setdefault(event["key"], []).append(event["value"])
+        elif event["type"] == "done":
+            recipe_json = event["recipe"]
+            metrics = event["metrics"]
             AppLogger.log_info(
-                f"{len(retrieved_docs)} receitas similares encontradas no Qdrant.")
-            AppLogger.log_warning(
-                "Nota: Algumas receitas podem não usar todos os ingredientes solicitados.")
-            return retrieved_docs
+                f"Receita gerada em {metrics['total_time_s']:.1f}s "
+                f"(primeiro token em {metrics['time_to_first_token_s']:.1f}s)")
+            break
         else:
-            AppLogger.log_error("Nenhuma receita encontrada no Qdrant.")
-            return None
+            continue
 
-    except Exception as e:
-        AppLogger.log_error(f"Erro ao buscar no Qdrant: {str(e)}")
-        return None
+        with placeholder.container():
+            render_recipe_display(partial_recipe)
 
-
-def generate_new_recipe(ingredients_list, context, openai_api_key):
-    """Generate a new recipe and add to session state"""
-    recipe_json = generate_recipe(context, ingredients_list, openai_api_key)
+    placeholder.empty()
     st.session_state.generated_recipes.append(recipe_json)
     return recipe_json
 
 
-def render_recipe_interface(ingredients_list, context, openai_api_key):
+def render_recipe_interface(ingredients_list, context, context_ids, pipeline):
     """Render the recipe generation and selection interface"""
     st.subheader("Gerador de Receitas")
 
     if len(st.session_state.generated_recipes) == 0:
         with st.spinner("Gerando sua primeira receita..."):
-            generate_new_recipe(ingredients_list, context, openai_api_key)
+            generate_new_recipe(ingredients_list, context, context_ids, pipeline)
+
+    if st.session_state.recipe_prefetcher is None:
+        st.session_state.recipe_prefetcher = RecipePrefetcher(
+            context, ingredients_list, pipeline.config['openai_api_key'], llm=pipeline.llm,
+            context_ids=context_ids)
+    prefetcher = st.session_state.recipe_prefetcher
+    # Generate the next variants (PREFETCH_DEPTH) in the background while the user reads
+    prefetcher.fill(st.session_state.generated_recipes)
 
     if st.button("Gerar outra receita"):
         with st.spinner("Criando uma nova receita..."):
-            generate_new_recipe(ingredients_list, context, openai_api_key)
+            recipe_json = prefetcher.next(
+                st.session_state.generated_recipes, timeout=PREFETCH_WAIT_TIMEOUT)
+            if recipe_json is not None:
+                st.session_state.generated_recipes.append(recipe_json)
+            else:
+                generate_new_recipe(ingredients_list, context, context_ids, pipeline)
 
     if st.session_state.generated_recipes:
         opcoes = [
@@ -286,7 +260,11 @@ def render_recipe_display(recipe_json):
             st.write(f"{i}. {step}")
 
         st.markdown("**Informação nutricional:**")
-        nutrition_md = recipe_json.get("nutrition_markdown", "")
+        # Computed from the local nutrient table; recipes generated before
+        # that (e.g. in the generation cache) may still carry the model's
+        # own nutrition_markdown, shown when nothing could be computed
+        nutrition_md = (nutrition_markdown(recipe_nutrition(recipe_json))
+                        or recipe_json.get("nutrition_markdown", ""))
         if nutrition_md:
             st.markdown(nutrition_md)
 
@@ -301,9 +279,19 @@ def render_recipe_display(recipe_json):
 
 def main():
     """Main application function"""
-    config = initialize_environment()
+    telemetry.configure_logging()
+    # Prometheus /metrics endpoint when METRICS_PORT is set
+    telemetry.start_metrics_server()
+    # Import what the first request needs while the user types the ingredients
+    preload()
     initialize_session_state()
 
+    with telemetry.capture(st.session_state.app_logs, kinds=("ui",)):
+        render_app()
+
+
+def render_app():
+    """Ingredient input, retrieval and recipe generation of one run"""
     st.title("Gerador de Receitas")
 
     ingredients = st.text_input(
@@ -312,25 +300,27 @@ def main():
     )
 
     if ingredients:
+        pipeline = get_pipeline()
         ingredients_list = parse_ingredients(ingredients)
         query = ",".join(ingredients_list)
 
-        should_reset_cache(query)
+        new_query = should_reset_cache(query)
 
         # Show user ingredients
         st.info(
             f"Ingredientes selecionados: **{', '.join(ingredients_list)}**")
 
         retrieved_docs = fetch_recipes_with_ingredient_filter(
-            ingredients_list, config)
+            ingredients_list, pipeline, new_query)
 
         if retrieved_docs:
-            context = [doc.page_content for doc in retrieved_docs]
+            context = pipeline.context_for(retrieved_docs)
+            context_ids = pipeline.context_ids(retrieved_docs)
 
             # Use all the ingredients since our fetch function now ensures
             # we only get recipes that can use these ingredients
             render_recipe_interface(
-                ingredients_list, context, config['openai_api_key'])
+                ingredients_list, context, context_ids, pipeline)
         else:
             AppLogger.log_error(
                 "Não foi possível encontrar receitas com os ingredientes fornecidos.")
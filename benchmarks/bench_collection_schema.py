@@ -0,0 +1,171 @@
+"""
+Recall@k, query latency and vector memory of several collection
+configurations (quantization, rescoring, HNSW parameters) on a synthetic
+clustered corpus.
+
+Against a Qdrant server (--url) every column is measured. Qdrant's local
+mode (the default) accepts the configuration but always does exact search,
+so there recall is emulated with numpy (same quantization, oversampling and
+rescoring), latency is that of the exact search and memory is estimated
+from the configuration.
+
+    python -m benchmarks.bench_collection_schema [--url http://localhost:6333]
+        [--points 10000] [--dim 384] [--queries 200] [--k 10]
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.models import PointStruct
+
+from benchmarks.common import print_table, summarize_ms
+from src.rag.collection_schema import CollectionSchema, create_collection
+
+CONFIGS = {
+    "float32 in RAM": CollectionSchema(quantization="none", on_disk=False),
+    "scalar int8 + rescore": CollectionSchema(quantization="scalar"),
+    "scalar int8, no rescore": CollectionSchema(quantization="scalar", rescore=False),
+    "product x16 + rescore": CollectionSchema(quantization="product", pq_compression="x16"),
+    "product x32 + rescore": CollectionSchema(quantization="product", pq_compression="x32",
+                                              oversampling=4.0),
+    "scalar, m=32 ef=256": CollectionSchema(quantization="scalar", hnsw_m=32, hnsw_ef_construct=256,
+                                            search_ef=128),
+}
+
+
+def clustered_vectors(n, dim, clusters, rng):
+    centers = rng.normal(size=(clusters, dim))
+    vectors = centers[rng.integers(0, clusters, n)] + 0.6 * rng.normal(size=(n, dim))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def top_k(scores, k):
+    index = np.argpartition(-scores, k, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, index, axis=1), axis=1)
+    return np.take_along_axis(index, order, axis=1)
+
+
+def scalar_codes(vectors, quantile):
+    low, high = np.quantile(vectors, [1 - quantile, quantile])
+    scale = (high - low) / 255
+    codes = np.clip(np.round((vectors - low) / scale), 0, 255)
+    return codes * scale + low
+
+
+def _nearest(points, centroids):
+    # argmin ||p - c||^2 == argmin (||c||^2 - 2 p.c)
+    return ((centroids ** 2).sum(1)[None] - 2 * points @ centroids.T).argmin(1)
+
+
+def product_codes(vectors, ratio, rng, iterations=8, train_size=4096):
+    """Reconstruct vectors from a k-means (256 centroids) codebook per chunk"""
+    chunk = max(1, ratio // 4)  # floats per byte of code
+    train = vectors[rng.choice(len(vectors), min(train_size, len(vectors)), replace=False)]
+    decoded = np.empty_like(vectors)
+    for start in range(0, vectors.shape[1], chunk):
+        sub_train = train[:, start:start + chunk]
+        centroids = sub_train[rng.choice(len(sub_train), 256, replace=len(sub_train) < 256)]
+        for _ in range(iterations):
+            assign = _nearest(sub_train, centroids)
+            for c in range(len(centroids)):
+                members = sub_train[assign == c]
+                if len(members):
+                    centroids[c] = members.mean(0)
+        sub = vectors[:, start:start + chunk]
+        assign = _nearest(sub, centroids)
+        decoded[:, start:start + chunk] = centroids[assign]
+    return decoded
+
+
+def emulated_results(schema, vectors, decoded, queries, k):
+    """Ids a quantized search with the schema's oversampling/rescoring returns"""
+    if decoded is None:
+        return top_k(queries @ vectors.T, k)
+    candidates = k
+    if schema.rescore:
+        candidates = min(len(vectors) - 1, int(k * schema.oversampling))
+    ids = top_k(queries @ decoded.T, candidates)
+    if not schema.rescore:
+        return ids
+    exact = np.einsum("qd,qcd->qc", queries, vectors[ids])
+    return np.take_along_axis(ids, top_k(exact, k), axis=1)
+
+
+def recall(results, truth):
+    return float(np.mean([len(set(r) & set(t)) / len(t) for r, t in zip(results, truth)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=":memory:")
+    parser.add_argument("--api-key", default=None)
+    parser.add_argument("--points", type=int, default=10000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    local = args.url == ":memory:"
+    client = QdrantClient(location=":memory:") if local else QdrantClient(url=args.url, api_key=args.api_key)
+    rng = np.random.default_rng(0)
+    vectors = clustered_vectors(args.points, args.dim, args.clusters, rng)
+    queries = vectors[rng.choice(args.points, args.queries, replace=False)] + \
+        0.05 * rng.normal(size=(args.queries, args.dim)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    truth = top_k(queries @ vectors.T, args.k)
+
+    rows = []
+    for name, schema in CONFIGS.items():
+        collection = f"bench_schema_{len(rows)}"
+        if client.collection_exists(collection):
+            client.delete_collection(collection)
+        start = time.perf_counter()
+        create_collection(client, collection, args.dim, schema)
+        for batch in range(0, args.points, 512):
+            client.upsert(collection, points=[
+                PointStruct(id=i, vector=vectors[i].tolist())
+                for i in range(batch, min(batch + 512, args.points))], wait=True)
+        build_s = time.perf_counter() - start
+
+        results = []
+        samples = []
+        for query in queries:
+            start = time.perf_counter()
+            response = client.query_points(collection, query=query.tolist(), limit=args.k,
+                                           search_params=None if local else schema.search_params())
+            samples.append(time.perf_counter() - start)
+            results.append([point.id for point in response.points])
+
+        if local:
+            decoded = None
+            if schema.quantization == "scalar":
+                decoded = scalar_codes(vectors, schema.scalar_quantile)
+            elif schema.quantization == "product":
+                decoded = product_codes(vectors, int(schema.pq_compression.lstrip("x")), rng)
+            results = emulated_results(schema, vectors, decoded, queries, args.k)
+
+        latency = summarize_ms(samples)
+        rows.append({
+            "config": name,
+            f"recall@{args.k}": round(recall(results, truth), 4),
+            "p50_ms": latency["p50_ms"],
+            "p95_ms": latency["p95_ms"],
+            "vector_ram_mb": round(schema.vector_memory_bytes(args.points, args.dim) / 2 ** 20, 2),
+            "build_s": round(build_s, 2),
+        })
+        client.delete_collection(collection)
+
+    mode = "local mode: recall emulated, exact-search latency" if local else f"server {args.url}"
+    print(f"{args.points} points x {args.dim} dims, {args.queries} queries ({mode})")
+    print_table(rows, list(rows[0]))
+    if args.json:
+        with open(args.json, "w") as fp:
+            json.dump({"mode": mode, "results": rows}, fp, indent=2)
+
+
+if __name__ == "__main__":
+    main()
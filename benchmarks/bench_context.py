@@ -0,0 +1,78 @@
+"""
+Prompt size and end-to-end generation latency with the raw page_content list
+in the prompt (previous behavior) vs the token-budgeted context.
+
+The fake chat model charges prefill time per prompt token, so the latency
+difference comes only from the prompt size.
+
+    python -m benchmarks.bench_context [--docs 10] [--sentences 12] [--budget 600]
+"""
+import argparse
+import json
+import time
+
+from benchmarks.common import SAMPLE_RECIPE, SlowFakeChatModel, print_table, summarize_ms, synthetic_recipes
+from src.rag.context import build_context, count_tokens, get_encoding
+from src.rag.llm import LLM_MODEL, build_recipe_prompt, generate_recipe, set_generation_cache
+
+INGREDIENTS = ["egg", "tomato", "cheese"]
+GENERATED_RECIPES = [dict(SAMPLE_RECIPE, title=f"{SAMPLE_RECIPE['title']} {i}") for i in range(10)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=10)
+    parser.add_argument("--sentences", type=int, default=12,
+                        help="instruction sentences per retrieved recipe")
+    parser.add_argument("--budget", type=int, default=600)
+    parser.add_argument("--prompt-token", type=float, default=0.0002,
+                        help="simulated prefill seconds per prompt token")
+    parser.add_argument("--first-token", type=float, default=0.2)
+    parser.add_argument("--token", type=float, default=0.002)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    # Measure the model, not the generation cache
+    set_generation_cache(None)
+
+    docs = synthetic_recipes(args.docs, seed=1, instruction_sentences=args.sentences)
+    llm = SlowFakeChatModel(responses=[json.dumps(SAMPLE_RECIPE, ensure_ascii=False)],
+                            first_token_latency=args.first_token,
+                            token_latency=args.token,
+                            prompt_token_latency=args.prompt_token)
+
+    variants = {
+        # What app.main used to pass: the list repr f-stringed into the prompt
+        "raw page_content": lambda: str([doc.page_content for doc in docs]),
+        f"budgeted ({args.budget})": lambda: build_context(docs, budget=args.budget),
+    }
+
+    rows = []
+    for name, make_context in variants.items():
+        start = time.perf_counter()
+        context = make_context()
+        build_ms = (time.perf_counter() - start) * 1000
+        prompt = build_recipe_prompt(context, INGREDIENTS, GENERATED_RECIPES)
+
+        samples = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            generate_recipe(context, INGREDIENTS, None, GENERATED_RECIPES, llm=llm)
+            samples.append(time.perf_counter() - start)
+        latency = summarize_ms(samples)
+        rows.append({
+            "context": name,
+            "context_tokens": count_tokens(context, LLM_MODEL),
+            "prompt_tokens": count_tokens(prompt, LLM_MODEL),
+            "build_ms": round(build_ms, 3),
+            "e2e_mean_ms": latency["mean_ms"],
+            "e2e_p95_ms": latency["p95_ms"],
+        })
+
+    print(f"Token counts with the '{get_encoding(LLM_MODEL).name}' encoding, "
+          f"{args.docs} retrieved recipes")
+    print_table(rows, ["context", "context_tokens", "prompt_tokens",
+                       "build_ms", "e2e_mean_ms", "e2e_p95_ms"])
+
+
+if __name__ == "__main__":
+    main()
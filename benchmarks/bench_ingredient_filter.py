@@ -0,0 +1,110 @@
+"""
+Recall and latency of ingredient retrieval on a generated corpus:
+
+- legacy:   unfiltered search for k*3 docs, then substring filtering in Python
+- fallback: local ingredient index -> Qdrant has_id filter
+- filtered: server-side MatchAny on the canonical ingredients keyword index
+
+Ground truth is the exact top-k (cosine) among the recipes whose canonical
+ingredients contain any of the canonical query ingredients. Qdrant's local
+mode ignores payload indexes, so filtered latencies are only meaningful
+against a real server (--url).
+
+    python -m benchmarks.bench_ingredient_filter [--docs 2000] [--queries 200] [--url URL]
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from benchmarks.common import INGREDIENTS, print_table, summarize_ms, synthetic_recipes
+from src.rag import vectorstore
+from src.rag.ingredients import canonicalize_ingredients, ingredient_terms
+
+VARIANTS = ["{}", "fresh {}", "{}s", "chopped {}", "{} (large)"]
+
+
+def legacy_search(ingredients, embedder, url, collection, k):
+    docs = vectorstore.retrieve_similar_recipes(
+        f"receita com {', '.join(ingredients)}", embedder, url, None, collection, k=k * 3, diversity=0)
+    terms = [ing.lower().strip() for ing in ingredients]
+    return [doc for doc in docs
+            if any(term in recipe_ing.lower()
+                   for term in terms for recipe_ing in doc.metadata.get("used_ingredients", []))][:k]
+
+
+def fallback_search(ingredients, embedder, url, collection, k):
+    return vectorstore.retrieve_recipes_by_ingredients_fallback(
+        ingredients, embedder, url, None, collection, k)
+
+
+def filtered_search(ingredients, embedder, url, collection, k):
+    return vectorstore.retrieve_similar_recipes(
+        f"receita com {', '.join(ingredients)}", embedder, url, None, collection, k=k,
+        ingredients_filter=vectorstore.create_ingredients_filter(ingredients), diversity=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--url", default=":memory:")
+    args = parser.parse_args()
+
+    collection = "bench_ingredient_filter"
+    embedder = DeterministicFakeEmbedding(size=128)
+    docs = synthetic_recipes(args.docs, seed=args.seed)
+    vectorstore.store_recipes(docs, embedder, args.url, None, collection)
+
+    ids = [str(vectorstore.recipe_point_id(doc)) for doc in docs]
+    matrix = np.array(embedder.embed_documents(
+        [doc.page_content for doc in docs]), dtype=np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    doc_terms = [set(ingredient_terms(doc.metadata["ingredients"])) for doc in docs]
+
+    rng = random.Random(args.seed)
+    queries = []
+    for _ in range(args.queries):
+        names = rng.sample(INGREDIENTS, 2)
+        queries.append([rng.choice(VARIANTS).format(name) for name in names])
+
+    def ground_truth(ingredients):
+        wanted = set(canonicalize_ingredients(ingredients))
+        eligible = [i for i, terms in enumerate(doc_terms) if terms & wanted]
+        if not eligible:
+            return set()
+        query = np.array(embedder.embed_query(
+            f"receita com {', '.join(ingredients)}"), dtype=np.float32)
+        scores = matrix[eligible] @ (query / np.linalg.norm(query))
+        top = np.argsort(-scores)[:args.k]
+        return {ids[eligible[i]] for i in top}
+
+    truths = [ground_truth(query) for query in queries]
+
+    rows = []
+    for name, search in [("legacy", legacy_search), ("fallback", fallback_search),
+                         ("filtered", filtered_search)]:
+        samples, recalls = [], []
+        for query, truth in zip(queries, truths):
+            start = time.perf_counter()
+            results = search(query, embedder, args.url, collection, args.k)
+            samples.append(time.perf_counter() - start)
+            if truth:
+                found = {doc.metadata.get("_id") for doc in results}
+                recalls.append(len(found & truth) / len(truth))
+        rows.append({"mode": name, f"recall@{args.k}": round(float(np.mean(recalls)), 3),
+                     **summarize_ms(samples)})
+
+    print(f"url={args.url} docs={args.docs} queries={args.queries} k={args.k}")
+    print_table(rows, ["mode", f"recall@{args.k}", "mean_ms", "p50_ms", "p95_ms"])
+
+    if args.url != ":memory:":
+        vectorstore.get_client(args.url).delete_collection(collection)
+
+
+if __name__ == "__main__":
+    main()
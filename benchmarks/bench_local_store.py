@@ -0,0 +1,134 @@
+"""
+Embedded vector store (src/rag/local_store.py, float32 and int8) against
+Qdrant: insert throughput, dense / ingredient-filtered / hybrid search
+latency, batched queries and the time to reopen the store from disk.
+
+Vectors are random (normalized) so that large corpora are cheap to build;
+payloads and sparse vectors are those of the synthetic recipes. Qdrant's
+local :memory: mode is always measured; pass --url to add a server (the
+network round-trip is then part of every query).
+
+    python -m benchmarks.bench_local_store [--docs 20000] [--dim 384] [--url http://localhost:6333]
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.models import Fusion, FusionQuery, Prefetch, QueryRequest
+
+from benchmarks.common import print_table, synthetic_recipes, time_calls
+from src.rag import vectorstore
+from src.rag.collection_schema import CollectionSchema, create_collection
+from src.rag.local_store import LocalVectorStore
+from src.rag.sparse import SPARSE_VECTOR_NAME, query_sparse_vector
+
+
+def directory_mb(path):
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(path) for name in names) / 2 ** 20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--url", default=None, help="also measure this Qdrant server")
+    parser.add_argument("--api-key", default=None)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    docs = synthetic_recipes(args.docs, seed=5)
+    vectors = rng.normal(size=(args.docs, args.dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    points = [vectorstore.recipe_point(vectorstore.recipe_point_id(doc), doc, "", vector.tolist(), sparse=True)
+              for doc, vector in zip(docs, vectors)]
+    queries = rng.normal(size=(args.queries, args.dim)).astype(np.float32).tolist()
+    sample = random.Random(1)
+    ingredient_queries = [sample.sample(sample.choice(docs).metadata["ingredients"], 2)
+                          for _ in range(args.queries)]
+
+    workdir = tempfile.mkdtemp(prefix="bench_local_store-")
+    schema = CollectionSchema(quantization="none")
+    backends = {
+        "qdrant :memory:": QdrantClient(location=":memory:"),
+        "local float32": LocalVectorStore(os.path.join(workdir, "f32"), "float32"),
+        "local int8": LocalVectorStore(os.path.join(workdir, "i8"), "int8"),
+    }
+    if args.url:
+        backends[f"qdrant {args.url}"] = QdrantClient(url=args.url, api_key=args.api_key, timeout=60)
+
+    rows, results = [], {}
+    for name, client in backends.items():
+        collection = "bench_local_store"
+        if client.collection_exists(collection):
+            client.delete_collection(collection)
+        create_collection(client, collection, args.dim, schema)
+        start = time.perf_counter()
+        for offset in range(0, len(points), vectorstore.UPSERT_BATCH_SIZE):
+            client.upsert(collection_name=collection, points=points[offset:offset + vectorstore.UPSERT_BATCH_SIZE])
+        insert_s = time.perf_counter() - start
+
+        cursor = iter(range(10 ** 9))
+
+        def dense():
+            client.query_points(collection, query=queries[next(cursor) % len(queries)], limit=10)
+
+        def filtered():
+            ingredients = ingredient_queries[next(cursor) % len(ingredient_queries)]
+            client.query_points(collection, query=queries[0], limit=10,
+                                query_filter=vectorstore.create_ingredients_filter(ingredients))
+
+        def hybrid():
+            ingredients = ingredient_queries[next(cursor) % len(ingredient_queries)]
+            query_filter = vectorstore.create_ingredients_filter(ingredients)
+            client.query_points(collection, prefetch=[
+                Prefetch(query=queries[0], limit=20, filter=query_filter),
+                Prefetch(query=query_sparse_vector(ingredients), using=SPARSE_VECTOR_NAME, limit=20,
+                         filter=query_filter),
+            ], query=FusionQuery(fusion=Fusion.RRF), limit=10)
+
+        def batch():
+            client.query_batch_points(collection, [QueryRequest(query=query, limit=10)
+                                                   for query in queries[:args.batch]])
+
+        repeat = max(5, args.queries // 4)
+        row = {
+            "backend": name,
+            "insert_per_s": round(len(points) / insert_s),
+            "dense_p50_ms": time_calls(dense, args.queries)["p50_ms"],
+            "filtered_p50_ms": time_calls(filtered, args.queries)["p50_ms"],
+            "hybrid_p50_ms": time_calls(hybrid, args.queries)["p50_ms"],
+            f"batch{args.batch}_per_query_ms": round(time_calls(batch, repeat)["p50_ms"] / args.batch, 3),
+        }
+        results[name] = [[point.id for point in client.query_points(collection, query=query, limit=10).points]
+                         for query in queries]
+        if isinstance(client, LocalVectorStore):
+            client.close()
+            start = time.perf_counter()
+            reopened = LocalVectorStore(client.path, client.precision)
+            reopened.count(collection)
+            row["reopen_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            row["disk_mb"] = round(directory_mb(client.path), 1)
+            reopened.close()
+        rows.append(row)
+    shutil.rmtree(workdir)
+
+    print(f"{args.docs} points, dim={args.dim}")
+    print_table(rows, ["backend", "insert_per_s", "dense_p50_ms", "filtered_p50_ms", "hybrid_p50_ms",
+                       f"batch{args.batch}_per_query_ms", "reopen_ms", "disk_mb"])
+    reference = results["qdrant :memory:"]
+    print("\nOverlap of the top 10 with Qdrant's (exact search)")
+    print_table([{"backend": name, "overlap@10": round(float(np.mean(
+        [len(set(found) & set(expected)) / 10 for found, expected in zip(ids, reference)])), 3)}
+        for name, ids in results.items()], ["backend", "overlap@10"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Cost of the MMR / near-duplicate reranking stage for k=5..200 (on 2k
+candidates, like the retrieval functions fetch), compared with langchain's
+maximal_marginal_relevance, and the effect of the diversity parameter.
+
+Candidates are clustered vectors in which a fifth are near-duplicates of
+another candidate (like the same recipe stored twice by Spoonacular).
+
+    python -m benchmarks.bench_mmr [--dim 1536] [--repeat 20]
+"""
+import argparse
+
+import numpy as np
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
+
+from benchmarks.common import print_table, time_calls
+from src.rag.diversify import DIVERSITY_FETCH_FACTOR, mmr_select
+
+K_VALUES = [5, 10, 20, 50, 100, 200]
+DIVERSITIES = [0.0, 0.3, 0.5, 0.7]
+
+
+def candidates(n, dim, rng, duplicate_share=0.2):
+    centers = rng.normal(size=(max(2, n // 10), dim))
+    vectors = centers[rng.integers(0, len(centers), n)] + rng.normal(size=(n, dim))
+    duplicates = rng.choice(n, int(n * duplicate_share), replace=False)
+    originals = rng.integers(0, n, len(duplicates))
+    vectors[duplicates] = vectors[originals] + 0.05 * rng.normal(size=(len(duplicates), dim))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    query = vectors[:n // 4].mean(0)
+    query /= np.linalg.norm(query)
+    return query.astype(np.float32), vectors.astype(np.float32)
+
+
+def mean_pairwise_similarity(vectors):
+    if len(vectors) < 2:
+        return 1.0
+    similarity = vectors @ vectors.T
+    return float((similarity.sum() - len(vectors)) / (len(vectors) * (len(vectors) - 1)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--diversity", type=float, default=0.3)
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    rows = []
+    for k in K_VALUES:
+        query, vectors = candidates(k * DIVERSITY_FETCH_FACTOR, args.dim, rng)
+        relevance = vectors @ query
+        picked = mmr_select(vectors, relevance, k, args.diversity)
+        ours = time_calls(lambda: mmr_select(vectors, relevance, k, args.diversity), args.repeat)
+        langchain = time_calls(lambda: maximal_marginal_relevance(
+            query, vectors, lambda_mult=1 - args.diversity, k=k), args.repeat)
+        rows.append({
+            "k": k,
+            "candidates": len(vectors),
+            "mmr_p50_ms": ours["p50_ms"],
+            "mmr_p95_ms": ours["p95_ms"],
+            "langchain_p50_ms": langchain["p50_ms"],
+            "returned": len(picked),
+        })
+    print(f"Reranking cost (dim={args.dim}, diversity={args.diversity})")
+    print_table(rows, list(rows[0]))
+
+    query, vectors = candidates(40, args.dim, rng)
+    relevance = vectors @ query
+    rows = []
+    for diversity in DIVERSITIES:
+        picked = mmr_select(vectors, relevance, 20, diversity, duplicate_threshold=1.01)
+        collapsed = mmr_select(vectors, relevance, 20, diversity)
+        rows.append({
+            "diversity": diversity,
+            "mean_relevance": round(float(relevance[picked].mean()), 4),
+            "mean_pairwise_sim": round(mean_pairwise_similarity(vectors[picked]), 4),
+            "near_dups_without_collapse": int(((vectors[picked] @ vectors[picked].T) > 0.95).sum()
+                                              - len(picked)) // 2,
+            "returned_with_collapse": len(collapsed),
+        })
+    print("\nEffect of the diversity parameter (k=20 of 40 candidates)")
+    print_table(rows, list(rows[0]))
+
+
+if __name__ == "__main__":
+    main()
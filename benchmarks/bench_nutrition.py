@@ -0,0 +1,113 @@
+"""
+Output tokens and generation time saved by computing the nutrition table
+locally (src/rag/nutrition.py) instead of having the model write it.
+
+"before" is the recipe with the per-ingredient nutrition_markdown table the
+previous prompt asked for (rendered by the nutrition engine, the size the
+model had to write), and the prompt with its nutrition instructions.
+"after" is the recipe alone, with the table computed after the generation.
+Both are generated by a fake chat model with simulated token latency.
+
+    python -m benchmarks.bench_nutrition [--first-token 0.3] [--token 0.01]
+"""
+import argparse
+import json
+import time
+
+from benchmarks.common import SAMPLE_RECIPE, SlowFakeChatModel, print_table, time_calls
+from src.rag.context import count_tokens
+from src.rag.llm import build_recipe_prompt, generate_recipe, set_generation_cache
+from src.rag.nutrition import get_nutrition_table, nutrition_markdown, recipe_nutrition
+
+CONTEXT = ['Recipe Name: Chicken and rice\nIngredients: ["chicken breast", "rice", "onion"]']
+INGREDIENTS = ["chicken breast", "rice", "onion", "garlic", "carrot", "peas"]
+
+LARGE_RECIPE = {
+    "title": "Arroz de frango com legumes",
+    "ingredients": [
+        "300 g de peito de frango em cubos",
+        "200 g de arroz",
+        "1 cebola (110 g), picada",
+        "2 dentes de alho (10 g), picados",
+        "1 cenoura (70 g) em cubos",
+        "80 g de ervilha",
+        "2 colheres de sopa de azeite (30 ml)",
+        "500 ml de caldo de legumes",
+        "Sal e pimenta-do-reino a gosto",
+        "10 g de salsinha picada",
+    ],
+    "steps": [
+        "Tempere o frango com sal, pimenta e metade do alho e deixe descansar por 10 minutos.",
+        "Aqueça o azeite em uma panela funda e doure o frango em fogo alto, mexendo de vez em quando.",
+        "Junte a cebola e o restante do alho e refogue até a cebola ficar transparente.",
+        "Acrescente a cenoura e o arroz e mexa por 2 minutos para o arroz absorver o tempero.",
+        "Despeje o caldo quente, acerte o sal e cozinhe em fogo baixo, com a panela semitampada, por 15 minutos.",
+        "Adicione a ervilha nos últimos 3 minutos de cozimento.",
+        "Desligue o fogo, tampe e deixe descansar por 5 minutos. Finalize com a salsinha.",
+    ],
+}
+
+# Instructions the prompt had for the nutrition table
+LEGACY_NUTRITION_INSTRUCTIONS = """
+        "nutrition_markdown": "| Nutriente | Valor |\\n|---|---|\\n| Calorias | ... | ... | ... | ... |",
+    A informação nutricional deve ser uma tabela markdown no campo 'nutrition_markdown', e deve conter a quantidade total de calorias, proteinas, carboidratos, gorduras, fibras e sódio, dos ingredientes da receita, e na quantidade total de cada ingrediente.
+"""
+
+
+def timed_generation(response, args):
+    llm = SlowFakeChatModel(responses=[response], first_token_latency=args.first_token,
+                            token_latency=args.token)
+    start = time.perf_counter()
+    recipe = generate_recipe(CONTEXT, INGREDIENTS, None, llm=llm)
+    nutrition_markdown(recipe_nutrition(recipe))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--first-token", type=float, default=0.3)
+    parser.add_argument("--token", type=float, default=0.01)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    # Measure the model, not the generation cache
+    set_generation_cache(None)
+    get_nutrition_table()
+
+    prompt = build_recipe_prompt(CONTEXT, INGREDIENTS)
+    prompt_tokens = count_tokens(prompt)
+    legacy_prompt_tokens = prompt_tokens + count_tokens(LEGACY_NUTRITION_INSTRUCTIONS)
+
+    rows = []
+    for name, recipe in {"sample (5 ingredients)": SAMPLE_RECIPE, "large (10 ingredients)": LARGE_RECIPE}.items():
+        after = json.dumps(recipe, ensure_ascii=False)
+        before = json.dumps({**recipe, "nutrition_markdown": nutrition_markdown(recipe_nutrition(recipe))},
+                            ensure_ascii=False)
+        before_s, after_s = timed_generation(before, args), timed_generation(after, args)
+        rows.append({
+            "recipe": name,
+            "prompt_tokens_before": legacy_prompt_tokens,
+            "prompt_tokens_after": prompt_tokens,
+            "output_tokens_before": count_tokens(before),
+            "output_tokens_after": count_tokens(after),
+            "generation_s_before": round(before_s, 3),
+            "generation_s_after": round(after_s, 3),
+            "saved": f"{1 - after_s / before_s:.0%}",
+        })
+    print(f"Generation with a fake model ({args.first_token}s to the first token, {args.token}s per token)")
+    print_table(rows, list(rows[0]))
+
+    table = get_nutrition_table()
+    lines = LARGE_RECIPE["ingredients"]
+    rows = [
+        {"stage": "compute (10 lines, names cached)", **time_calls(lambda: table.compute(lines), args.repeat)},
+        {"stage": "compute (names not cached)", **time_calls(
+            lambda: (table.lookup.cache_clear(), table.compute(lines)), args.repeat)},
+        {"stage": "render markdown", **time_calls(
+            lambda: nutrition_markdown(recipe_nutrition(LARGE_RECIPE)), args.repeat)},
+    ]
+    print("\nNutrition engine cost")
+    print_table(rows, ["stage", "p50_ms", "p95_ms", "p99_ms"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Startup cost of the Streamlit app: the import time of app.py (python -X
+importtime, with the modules it spends it on) and, in fresh processes driven
+by Streamlit's AppTest, the time of
+
+    first_render     the page before any input (what a new user waits for)
+    first_request    the first ingredient list: config, embedder and clients
+                     built, retrieval and one streamed generation
+    rerun            a rerun with the same ingredients (e.g. a widget change)
+    next_request     another ingredient list, with everything warm
+
+against local stand-ins: the stub Spoonacular and OpenAI servers
+(benchmarks.stub_spoonacular, benchmarks.stub_openai), Qdrant in :memory:
+mode and the hashing embedder. --think is the time the simulated user takes
+to type the ingredients after the first render.
+
+    python -m benchmarks.bench_startup [--runs 3] [--think 2] [--first-token 0.3] [--token 0.01]
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.common import print_table, synthetic_recipes
+from benchmarks.stub_openai import StubOpenAI
+from benchmarks.stub_spoonacular import StubSpoonacular
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STAGES = ["streamlit_import", "first_render", "first_request", "rerun", "next_request"]
+_IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)")
+
+
+def import_times(env, top=8):
+    """Cumulative import time of app and of the modules it imports directly, in ms"""
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True).stderr
+    entries = [(len(match.group(3)), match.group(4), int(match.group(2)) / 1000)
+               for match in map(_IMPORT_LINE.match, stderr.splitlines()) if match]
+    depth = next(depth for depth, name, _ in entries if name == "app")
+    total = next(ms for entry_depth, name, ms in entries if name == "app" and entry_depth == depth)
+    # Direct imports of app are the entries one level deeper (after the app line they belong to)
+    direct = [(name, ms) for entry_depth, name, ms in entries if entry_depth == depth + 2]
+    return total, sorted(direct, key=lambda entry: -entry[1])[:top]
+
+
+def run_child(args):
+    """One fresh app process; prints the stage times as JSON"""
+    start = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+
+    timings = {"streamlit_import": time.perf_counter() - start}
+
+    def timed(stage, run):
+        start = time.perf_counter()
+        app = run()
+        timings[stage] = time.perf_counter() - start
+        if app.exception:
+            raise RuntimeError(f"{stage}: {app.exception}")
+        return app
+
+    app = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=120)
+    timed("first_render", app.run)
+    time.sleep(args.think)
+    timed("first_request", app.text_input[0].input("tomato,cheese").run)
+    timed("rerun", app.run)
+    timed("next_request", app.text_input[0].input("egg,onion").run)
+    print(json.dumps(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--think", type=float, default=2.0,
+                        help="seconds between the first render and the first request")
+    parser.add_argument("--first-token", type=float, default=0.3)
+    parser.add_argument("--token", type=float, default=0.01)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        run_child(args)
+        return
+
+    openai = StubOpenAI(first_token_latency=args.first_token, token_latency=args.token).start()
+    spoonacular = StubSpoonacular(synthetic_recipes(500, seed=11), latency=0.0).start()
+    env = {
+        **os.environ,
+        "PYTHONPATH": ROOT,
+        "OPENAI_API_KEY": "stub",
+        "OPENAI_BASE_URL": openai.url,
+        "SPOONACULAR_API_KEY": "stub",
+        "SPOONACULAR_BASE_URL": spoonacular.url,
+        "SPOONACULAR_CACHE_PATH": ":memory:",
+        "QDRANT_URL": ":memory:",
+        "EMBEDDING_BACKEND": "hashing",
+        "EMBEDDING_CACHE_ENABLED": "false",
+        "GENERATION_CACHE_ENABLED": "false",
+        "LOG_LEVEL": "WARNING",
+    }
+
+    total, direct = import_times(env)
+    print(f"import app: {total:.0f} ms")
+    print_table([{"module": name, "cumulative_ms": round(ms, 1)} for name, ms in direct],
+                ["module", "cumulative_ms"])
+
+    runs = []
+    for _ in range(args.runs):
+        child = subprocess.run([sys.executable, "-m", "benchmarks.bench_startup", "--child",
+                                "--think", str(args.think)],
+                               cwd=ROOT, env=env, capture_output=True, text=True)
+        if child.returncode != 0:
+            sys.exit(child.stderr)
+        runs.append(json.loads(child.stdout.strip().splitlines()[-1]))
+    print(f"\nApp runs in fresh processes (median of {args.runs}, {args.think}s between the first "
+          f"render and the first request; model: {args.first_token}s to the first token)")
+    print_table([{"stage": stage, "median_ms": round(statistics.median(run[stage] for run in runs) * 1000, 1),
+                  "max_ms": round(max(run[stage] for run in runs) * 1000, 1)} for stage in STAGES],
+                ["stage", "median_ms", "max_ms"])
+    openai.stop()
+    spoonacular.stop()
+
+
+if __name__ == "__main__":
+    main()
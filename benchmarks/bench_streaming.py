@@ -0,0 +1,57 @@
+"""
+Blocking vs streaming recipe generation against a fake chat model with
+simulated latency: time until the user sees the title, the first ingredient
+and the first step, and the total generation time.
+
+    python -m benchmarks.bench_streaming [--first-token 0.3] [--token 0.01]
+"""
+import argparse
+import json
+import time
+
+from benchmarks.common import SAMPLE_RECIPE, SlowFakeChatModel, print_table
+from src.rag.llm import generate_recipe, set_generation_cache, stream_recipe
+
+CONTEXT = ['Recipe Name: Tomato omelette\nIngredients: ["egg", "tomato"]']
+INGREDIENTS = ["egg", "tomato", "cheese"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--first-token", type=float, default=0.3)
+    parser.add_argument("--token", type=float, default=0.01)
+    args = parser.parse_args()
+    # Measure the model, not the generation cache
+    set_generation_cache(None)
+
+    def make_llm():
+        return SlowFakeChatModel(responses=[json.dumps(SAMPLE_RECIPE, ensure_ascii=False)],
+                                 first_token_latency=args.first_token,
+                                 token_latency=args.token)
+
+    start = time.perf_counter()
+    recipe = generate_recipe(CONTEXT, INGREDIENTS, None, llm=make_llm())
+    blocking = time.perf_counter() - start
+    assert recipe == SAMPLE_RECIPE
+
+    seen = {}
+    start = time.perf_counter()
+    for event in stream_recipe(CONTEXT, INGREDIENTS, None, llm=make_llm()):
+        elapsed = time.perf_counter() - start
+        if event["type"] == "token":
+            seen.setdefault("first token", elapsed)
+        elif event["type"] == "field" and event["key"] == "title":
+            seen.setdefault("title", elapsed)
+        elif event["type"] == "item":
+            seen.setdefault(f"first {event['key']} item", elapsed)
+        elif event["type"] == "done":
+            assert event["recipe"] == SAMPLE_RECIPE
+            seen["complete"] = elapsed
+
+    rows = [{"milestone": name, "blocking_s": round(blocking, 3), "streaming_s": round(value, 3)}
+            for name, value in seen.items()]
+    print_table(rows, ["milestone", "blocking_s", "streaming_s"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Per-query latency of a similarity search, before and after pooling the
+Qdrant client.
+
+"before" rebuilds a langchain vector store on every query like the old
+get_vectorstore did (QdrantVectorStore.from_existing_collection, which also
+re-validates the collection); "after" is retrieve_similar_recipes on the
+client shared by get_client. Against Qdrant's local :memory: mode the old
+per-call client cannot be reproduced (a new :memory: client is an empty
+database), so the shared client is reused there and the difference is the
+store construction and collection checks, less the candidate vectors "after"
+fetches for the diversity reranking; against a real server (--url) the
+connection setup is included as well.
+
+    python -m benchmarks.bench_vectorstore_pool [--url http://localhost:6333]
+"""
+import argparse
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_qdrant import QdrantVectorStore
+
+from benchmarks.common import print_table, synthetic_recipes, time_calls
+from src.rag import vectorstore
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", default=":memory:")
+    parser.add_argument("--api-key", default=None)
+    parser.add_argument("--collection", default="bench_pool")
+    parser.add_argument("--docs", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    embedder = DeterministicFakeEmbedding(size=256)
+    vectorstore.store_recipes(synthetic_recipes(args.docs), embedder,
+                              args.url, args.api_key, args.collection)
+
+    def before():
+        if args.url == ":memory:":
+            vector_db = QdrantVectorStore(
+                client=vectorstore.get_client(args.url),
+                collection_name=args.collection,
+                embedding=embedder
+            )
+        else:
+            vector_db = QdrantVectorStore.from_existing_collection(
+                embedding=embedder,
+                collection_name=args.collection,
+                url=args.url,
+                api_key=args.api_key
+            )
+        vector_db.similarity_search("receita com tomato, egg", k=5)
+
+    def after():
+        vectorstore.retrieve_similar_recipes(
+            "receita com tomato, egg", embedder, args.url, args.api_key, args.collection, k=5, diversity=0)
+
+    rows = [
+        {"mode": "per-call store", **time_calls(before, args.queries)},
+        {"mode": "pooled client", **time_calls(after, args.queries)},
+    ]
+    print(f"url={args.url} docs={args.docs} queries={args.queries}")
+    print_table(rows, ["mode", "mean_ms", "p50_ms", "p95_ms", "p99_ms"])
+
+    if args.url != ":memory:":
+        vectorstore.get_client(args.url, args.api_key).delete_collection(
+            args.collection)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Effect of the cache warmer (src/warming.py) on the first recipe of popular
+ingredient sets, with skewed (Zipf) traffic against local stand-ins: the
+stub Spoonacular server, Qdrant in :memory: mode, the hashing embedder and a
+fake chat model with simulated latency.
+
+A query log is filled with a "yesterday" of --history queries. Then, with
+cold caches (a restarted process whose Spoonacular responses expired), the
+same traffic distribution sends --requests requests, each retrieving
+recipes and streaming the first one like the app does:
+
+    no warming      the requests alone
+    warming         after one warming pass over the top --top sets (with
+                    pre-generation), with the default budgets
+    small budget    the same pass with --small-budget Spoonacular calls per hour
+
+Reported: retrieval and generation cache hit rates (and the retrieval hits
+served by warmed entries), latency of the requests, and the Spoonacular
+calls and LLM tokens spent by the requests and by the warming pass.
+
+    python -m benchmarks.bench_warming [--sets 300] [--top 100] [--requests 150]
+        [--spoonacular-latency 0.1] [--first-token 0.1] [--token 0.002]
+"""
+import argparse
+import json
+import random
+import time
+
+from benchmarks.common import INGREDIENTS, SAMPLE_RECIPE, SlowFakeChatModel, print_table, summarize_ms, synthetic_recipes
+from benchmarks.stub_spoonacular import StubSpoonacular
+from src import telemetry
+from src.api.spoonacular_integration import ResponseCache, SpoonacularClient, set_client
+from src.pipeline import RecipePipeline, flush_background_tasks
+from src.rag import vectorstore
+from src.rag.embedders import HashingEmbeddings
+from src.rag.generation_cache import GenerationCache
+from src.rag.llm import set_generation_cache
+from src.warming import CacheWarmer, QueryLog
+
+
+def zipf_sampler(items, exponent, seed):
+    """sample(n): n items drawn with probability proportional to 1 / rank ** exponent"""
+    rng = random.Random(seed)
+    weights = [1 / rank ** exponent for rank in range(1, len(items) + 1)]
+    return lambda n: rng.choices(items, weights=weights, k=n)
+
+
+def counter_total(name, **labels):
+    """Sum of a counter over the label values not given"""
+    wanted = [f"{key}={value}" for key, value in labels.items()]
+    return sum(value for key, value in telemetry.REGISTRY.snapshot()["counters"].items()
+               if key.startswith(name + "{") and all(label in key for label in wanted))
+
+
+def hit_rate(cache, **labels):
+    hits = counter_total("cache_hits_total", cache=cache, **labels)
+    misses = counter_total("cache_misses_total", cache=cache)
+    return f"{hits / (hits + misses):.0%}" if hits + misses else "-"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sets", type=int, default=300, help="distinct ingredient sets in the traffic")
+    parser.add_argument("--zipf", type=float, default=1.1, help="skew of the traffic")
+    parser.add_argument("--history", type=int, default=3000, help="queries recorded before the test")
+    parser.add_argument("--requests", type=int, default=150)
+    parser.add_argument("--top", type=int, default=100, help="sets warmed")
+    parser.add_argument("--small-budget", type=int, default=30)
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--spoonacular-latency", type=float, default=0.1)
+    parser.add_argument("--first-token", type=float, default=0.1)
+    parser.add_argument("--token", type=float, default=0.002)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    sets = []
+    while len(sets) < args.sets:
+        candidate = sorted(rng.sample(INGREDIENTS, rng.randint(2, 3)))
+        if candidate not in sets:
+            sets.append(candidate)
+    history = zipf_sampler(sets, args.zipf, seed=1)(args.history)
+    traffic = zipf_sampler(sets, args.zipf, seed=2)(args.requests)
+
+    embedder = HashingEmbeddings(256)
+    corpus = synthetic_recipes(args.docs, seed=3, instruction_sentences=4)
+    stub_docs = synthetic_recipes(args.docs, seed=17, instruction_sentences=4)
+    for doc in stub_docs:
+        doc.metadata["id"] += 10 ** 6
+    stub = StubSpoonacular(stub_docs, latency=args.spoonacular_latency).start()
+    llm = SlowFakeChatModel(responses=[json.dumps(SAMPLE_RECIPE, ensure_ascii=False)],
+                            first_token_latency=args.first_token, token_latency=args.token)
+
+    scenarios = {
+        "no warming": None,
+        "warming": {},
+        "small budget": {"api_calls_per_hour": args.small_budget},
+    }
+    rows, spend = [], []
+    for index, (name, warming) in enumerate(scenarios.items()):
+        # Cold caches: a fresh retrieval cache, Spoonacular responses and generations
+        collection = f"bench_warming_{index}"
+        vectorstore.store_recipes(corpus, embedder, ":memory:", None, collection)
+        set_client(SpoonacularClient(api_key="bench", base_url=stub.url, rate=1000, burst=1000,
+                                     cache=ResponseCache(":memory:")))
+        set_generation_cache(GenerationCache(":memory:"))
+        query_log = QueryLog(":memory:")
+        for ingredients in history:
+            query_log.record(ingredients)
+        pipeline = RecipePipeline({"openai_api_key": None, "qdrant_url": ":memory:", "qdrant_api_key": None,
+                                   "collection_name": collection, "embedder": embedder},
+                                  llm=llm, query_log=query_log)
+
+        if warming is not None:
+            telemetry.REGISTRY.reset()
+            stub.requests = 0
+            warmer = CacheWarmer(pipeline, query_log, top_n=args.top, min_score=0, workers=4, rate=1000,
+                                 pregenerate=True, off_peak_hours="", **warming)
+            start = time.perf_counter()
+            results = warmer.run_once()
+            spend.append({
+                "scenario": name,
+                "warmed_sets": results.get("warmed", 0),
+                "over_budget": results.get("budget", 0),
+                "pregenerated": counter_total("warming_generations_total", result="ok"),
+                "generations_over_budget": counter_total("warming_generations_total", result="budget"),
+                "spoonacular_calls": stub.requests,
+                "llm_tokens": counter_total("llm_tokens_total"),
+                "pass_s": round(time.perf_counter() - start, 1),
+            })
+            warmer.stop()
+
+        telemetry.REGISTRY.reset()
+        stub.requests = 0
+        samples = []
+        for ingredients in traffic:
+            start = time.perf_counter()
+            result = pipeline.retrieve(ingredients)
+            if result["docs"]:
+                events = pipeline.stream(pipeline.context_for(result["docs"]), ingredients,
+                                         context_ids=pipeline.context_ids(result["docs"]))
+                for event in events:
+                    if event["type"] == "done":
+                        break
+            samples.append(time.perf_counter() - start)
+        flush_background_tasks()
+        latency = summarize_ms(samples)
+        rows.append({
+            "scenario": name,
+            "retrieval_hits": hit_rate("retrieval"),
+            "warmed_hits": counter_total("warming_hits_total"),
+            "generation_hits": hit_rate("generation"),
+            "p50_ms": round(latency["p50_ms"]),
+            "p95_ms": round(latency["p95_ms"]),
+            "mean_ms": round(latency["mean_ms"]),
+            "spoonacular_calls": stub.requests,
+            "llm_tokens": counter_total("llm_tokens_total"),
+        })
+    stub.stop()
+
+    print(f"{args.requests} requests over {args.sets} ingredient sets (Zipf {args.zipf}), "
+          f"{args.top} sets warmed from {args.history} recorded queries")
+    print_table(rows, list(rows[0]))
+    print("\nWarming pass")
+    print_table(spend, list(spend[0]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""Helpers shared by the benchmark scripts (synthetic corpus, fakes, timing)."""
+import json
+import random
+import re
+import statistics
+import time
+
+from langchain_core.documents import Document
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessageChunk
+from langchain_core.outputs import ChatGenerationChunk
+
+INGREDIENTS = [
+    "tomato", "cherry tomatoes", "cheese", "parmesan cheese", "cheddar cheese",
+    "egg", "eggs", "chicken breast", "chicken thighs", "ground beef", "bacon",
+    "onion", "red onion", "garlic", "garlic cloves", "potato", "sweet potatoes",
+    "carrot", "celery", "bell pepper", "red bell pepper", "spinach", "kale",
+    "mushrooms", "zucchini", "broccoli", "cauliflower", "rice", "brown rice",
+    "pasta", "spaghetti", "flour", "all purpose flour", "butter", "unsalted butter",
+    "milk", "whole milk", "heavy cream", "yogurt", "lemon", "lemon juice", "lime",
+    "olive oil", "vegetable oil", "salt", "black pepper", "basil", "fresh basil",
+    "parsley", "cilantro", "cumin", "paprika", "sugar", "brown sugar", "honey",
+    "beans", "black beans", "chickpeas", "lentils", "tofu", "shrimp", "salmon",
+    "tuna", "corn", "peas", "avocado", "banana", "apple", "oats", "bread",
+]
+
+
+INSTRUCTION_SENTENCES = [
+    "Preheat the oven to 200 degrees and line a baking sheet with parchment paper.",
+    "Chop the {a} and the {b} into small, even pieces so they cook at the same rate.",
+    "Heat a drizzle of oil in a large skillet over medium heat until it shimmers.",
+    "Add the {a} and cook, stirring occasionally, for about 5 minutes until softened.",
+    "Season generously with salt and pepper, then stir in the {b}.",
+    "Cover and simmer for 10 to 12 minutes, stirring every few minutes to prevent sticking.",
+    "Taste and adjust the seasoning, adding a splash of water if the mixture looks dry.",
+    "Transfer to a serving dish and let it rest for a couple of minutes before serving.",
+]
+
+
+def synthetic_recipes(n, seed=0, min_ingredients=4, max_ingredients=10, instruction_sentences=0):
+    """
+    Documents shaped like the ones built by fetch_recipes_by_ingredients.
+    With instruction_sentences > 0 they get verbose, HTML-formatted
+    instructions like many Spoonacular recipes have.
+    """
+    rng = random.Random(seed)
+    docs = []
+    for recipe_id in range(n):
+        ingredients = rng.sample(
+            INGREDIENTS, rng.randint(min_ingredients, max_ingredients))
+        split = rng.randint(1, len(ingredients))
+        used, missed = ingredients[:split], ingredients[split:]
+        title = f"{ingredients[0].title()} with {ingredients[1]} #{recipe_id}"
+        instructions = "No instructions provided"
+        if instruction_sentences:
+            steps = [rng.choice(INSTRUCTION_SENTENCES).format(a=ingredients[0], b=ingredients[1])
+                     for _ in range(instruction_sentences)]
+            instructions = "<ol>" + "".join(f"<li>{step}</li>" for step in steps) + "</ol>"
+        content = f"""
+        Recipe Name: {title}
+        Ingredients: {json.dumps(used)}
+        Instructions: {instructions}
+        """
+        docs.append(Document(page_content=content, metadata={
+            "id": recipe_id,
+            "title": title,
+            "ingredients": ingredients,
+            "used_ingredients": used,
+            "missed_ingredients": missed,
+            "ingredient_count": len(ingredients),
+        }))
+    return docs
+
+
+SAMPLE_RECIPE = {
+    "title": "Omelete de tomate com queijo",
+    "ingredients": [
+        "3 ovos (150 g)",
+        "1 tomate (120 g), picado",
+        "50 g de queijo muçarela ralado",
+        "5 g de manteiga",
+        "Sal e pimenta-do-reino a gosto",
+    ],
+    "steps": [
+        "Quebre os ovos em uma tigela, tempere com sal e pimenta e bata com um garfo até ficarem homogêneos.",
+        "Pique o tomate em cubos pequenos e retire o excesso de sementes para a omelete não ficar aguada.",
+        "Aqueça uma frigideira antiaderente em fogo médio e derreta a manteiga, espalhando-a por todo o fundo.",
+        "Despeje os ovos batidos e deixe cozinhar por cerca de 2 minutos, até as bordas começarem a firmar.",
+        "Distribua o tomate e o queijo sobre metade da omelete, dobre ao meio e cozinhe por mais 1 minuto.",
+        "Sirva imediatamente, enquanto o queijo ainda está derretido.",
+    ],
+    "sugestoes_temperos": ["orégano", "manjericão fresco", "cebolinha"],
+}
+
+
+class SlowFakeChatModel(FakeListChatModel):
+    """
+    Fake chat model that simulates generation latency: a fixed delay before
+    the first token and a per-token delay afterwards, for both invoke and
+    stream. Tokens are roughly word-sized chunks of the response.
+    prompt_token_latency adds prefill time proportional to the prompt size.
+    """
+
+    first_token_latency: float = 0.3
+    token_latency: float = 0.01
+    prompt_token_latency: float = 0.0
+
+    @staticmethod
+    def tokenize(text):
+        return re.findall(r"\s*\S{1,4}|\s+", text)
+
+    def _next_response(self):
+        response = self.responses[self.i]
+        self.i = (self.i + 1) % len(self.responses)
+        return response
+
+    def _prefill(self, messages):
+        if self.prompt_token_latency:
+            prompt = "".join(str(message.content) for message in messages)
+            time.sleep(self.prompt_token_latency * len(self.tokenize(prompt)))
+
+    def _call(self, messages, *args, **kwargs):
+        response = self._next_response()
+        self._prefill(messages)
+        time.sleep(self.first_token_latency +
+                   self.token_latency * len(self.tokenize(response)))
+        return response
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        response = self._next_response()
+        self._prefill(messages)
+        time.sleep(self.first_token_latency)
+        for index, token in enumerate(self.tokenize(response)):
+            if index:
+                time.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize_ms(samples):
+    """Latency summary in milliseconds for a list of durations in seconds"""
+    millis = [sample * 1000 for sample in samples]
+    return {
+        "mean_ms": round(statistics.fmean(millis), 3) if millis else 0.0,
+        "p50_ms": round(percentile(millis, 50), 3),
+        "p95_ms": round(percentile(millis, 95), 3),
+        "p99_ms": round(percentile(millis, 99), 3),
+        "n": len(millis),
+    }
+
+
+def time_calls(fn, repeat, warmup=3):
+    """Call fn repeatedly and return the latency summary"""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return summarize_ms(samples)
+
+
+def print_table(rows, columns):
+    widths = [max(len(str(col)), *(len(str(row.get(col, ""))) for row in rows))
+              for col in columns]
+    print("  ".join(str(col).ljust(width) for col, width in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(str(row.get(col, "")).ljust(width)
+              for col, width in zip(columns, widths)))
@@ -0,0 +1,95 @@
+"""
+Retrieval quality and latency of ingredient queries: dense-only search vs
+hybrid (dense + sparse ingredients, fused with RRF in one Qdrant request).
+
+A recipe is relevant when it contains every queried ingredient. recall@k is
+the share of the relevant recipes found (out of at most k) and precision@k
+the share of the returned recipes that are relevant. Queries are 2-3
+ingredients taken from a random recipe of the synthetic corpus.
+
+    python -m benchmarks.eval_hybrid [--docs 2000] [--queries 200] [--k 5]
+        [--embedder hashing|configured] [--url :memory:]
+"""
+import argparse
+import contextlib
+import io
+import random
+import time
+
+from benchmarks.common import print_table, summarize_ms, synthetic_recipes
+from src.rag import vectorstore
+from src.rag.embedders import HashingEmbeddings, get_embedder
+
+
+def quiet(fn, *args, **kwargs):
+    """Call fn without its DEBUG output"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args, **kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=":memory:")
+    parser.add_argument("--api-key", default=None)
+    parser.add_argument("--collection", default="eval_hybrid")
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--embedder", choices=["hashing", "configured"], default="hashing")
+    args = parser.parse_args()
+
+    embedder = HashingEmbeddings(256) if args.embedder == "hashing" else get_embedder()
+    docs = synthetic_recipes(args.docs, seed=3, instruction_sentences=6)
+    quiet(vectorstore.store_recipes, docs, embedder, args.url, args.api_key, args.collection)
+    index = vectorstore.get_ingredient_index(args.url, args.api_key, args.collection)
+
+    rng = random.Random(7)
+    queries = []
+    for _ in range(args.queries):
+        ingredients = rng.choice(docs).metadata["ingredients"]
+        query = rng.sample(ingredients, min(len(ingredients), rng.randint(2, 3)))
+        queries.append((query, index.match_all(query)))
+
+    def dense(query):
+        return vectorstore.retrieve_recipes_by_ingredients(
+            query, embedder, args.url, args.api_key, args.collection, args.k, hybrid=False)
+
+    def dense_overfetch(query):
+        # Previous approach: fetch 3x and keep the recipes using every ingredient
+        retrieved = vectorstore.retrieve_recipes_by_ingredients(
+            query, embedder, args.url, args.api_key, args.collection, args.k * 3, hybrid=False)
+        valid = index.match_all(query)
+        return [doc for doc in retrieved if doc.metadata["_id"] in valid][:args.k]
+
+    def hybrid(query):
+        return vectorstore.retrieve_recipes_hybrid(
+            query, embedder, args.url, args.api_key, args.collection, args.k,
+            query_filter=vectorstore.create_ingredients_filter(query))
+
+    rows = []
+    for name, search in {f"dense k={args.k}": dense,
+                         f"dense k={args.k * 3} + re-filter": dense_overfetch,
+                         f"hybrid RRF k={args.k}": hybrid}.items():
+        recalls, precisions, samples = [], [], []
+        for query, relevant in queries:
+            start = time.perf_counter()
+            results = quiet(search, query)
+            samples.append(time.perf_counter() - start)
+            hits = sum(1 for doc in results if doc.metadata["_id"] in relevant)
+            recalls.append(hits / min(args.k, len(relevant)) if relevant else 1.0)
+            precisions.append(hits / len(results) if results else 0.0)
+        latency = summarize_ms(samples)
+        rows.append({
+            "mode": name,
+            f"recall@{args.k}": round(sum(recalls) / len(recalls), 4),
+            f"precision@{args.k}": round(sum(precisions) / len(precisions), 4),
+            "p50_ms": latency["p50_ms"],
+            "p95_ms": latency["p95_ms"],
+        })
+
+    print(f"{args.docs} recipes, {args.queries} queries, {args.embedder} embedder ({args.url})")
+    print_table(rows, list(rows[0]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+"""
+End-to-end load test of the recipe pipeline against local stand-ins:
+Qdrant in :memory: mode, a stub Spoonacular server (benchmarks.stub_spoonacular),
+a fake chat model with configurable latency and streaming, and the
+deterministic hashing embedder (behind the usual embedding cache).
+
+Scenarios, each run by --users concurrent simulated users making
+--requests requests each (ingredient queries drawn from a pool, so some
+repeat like real traffic):
+
+    store      store_recipes of a batch of new recipes
+    retrieve   retrieve_recipes_by_ingredients
+    similar    retrieve_similar_recipes
+    pipeline   RecipePipeline.retrieve, what the app's
+               fetch_recipes_with_ingredient_filter calls (Spoonacular and
+               Qdrant raced, retrieval cache, request coalescing)
+    generate   RecipePipeline.generate (generate_recipe)
+    stream     RecipePipeline.stream (stream_recipe), with time to first token
+
+For each one it reports p50/p95/p99 latency, requests/sec, external calls
+per request (Spoonacular requests seen by the stub; embedding, Qdrant and
+LLM calls from the telemetry stage counters) and peak memory (process RSS,
+plus the Python heap with --trace-memory). Results are written as JSON
+(default benchmarks/results/e2e-<commit>.json) and --compare prints the
+change against an earlier results file.
+
+    python -m benchmarks.load_test [--users 8] [--requests 20] [--scenarios pipeline,generate]
+        [--spoonacular-latency 0.2] [--first-token 0.3] [--token 0.01]
+        [--output PATH] [--compare benchmarks/results/e2e-<old commit>.json]
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import subprocess
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import SAMPLE_RECIPE, SlowFakeChatModel, print_table, summarize_ms, synthetic_recipes
+from benchmarks.stub_spoonacular import StubSpoonacular
+from src import telemetry
+from src.api.spoonacular_integration import ResponseCache, SpoonacularClient, set_client
+from src.pipeline import RecipePipeline, flush_background_tasks
+from src.rag import vectorstore
+from src.rag.context import build_context
+from src.rag.embedders import HashingEmbeddings
+from src.rag.embedding_cache import CachedEmbeddings
+from src.rag.llm import set_generation_cache
+
+SCENARIOS = ["store", "retrieve", "similar", "pipeline", "generate", "stream"]
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+# External calls, from the telemetry stage histograms
+CALL_STAGES = {
+    "embedding": ["embedding.embed"],
+    "qdrant": ["qdrant.search", "qdrant.upsert"],
+    "llm": ["llm.generate", "llm.stream"],
+}
+COMPARED_METRICS = ["p50_ms", "p95_ms", "p99_ms", "rps", "peak_rss_mb"]
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return f"{commit}-dirty" if dirty else commit
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux (bytes on macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if platform.system() == "Darwin" else 1024), 1)
+
+
+def stage_calls():
+    return {name: sum(telemetry.REGISTRY.histogram("stage_duration_seconds", stage=stage)["count"]
+                      for stage in stages)
+            for name, stages in CALL_STAGES.items()}
+
+
+def make_queries(docs, n, rng):
+    """Ingredient queries of 2-3 ingredients of corpus recipes"""
+    queries = []
+    for _ in range(n):
+        ingredients = rng.choice(docs).metadata["ingredients"]
+        queries.append(rng.sample(ingredients, min(len(ingredients), rng.randint(2, 3))))
+    return queries
+
+
+def fresh_recipes(n, first_id, seed):
+    """Synthetic recipes with ids starting at first_id (new points in Qdrant)"""
+    docs = synthetic_recipes(n, seed=seed, instruction_sentences=4)
+    for doc in docs:
+        doc.metadata["id"] += first_id
+    return docs
+
+
+def run_load(request, users, requests_per_user, seed=0):
+    """
+    Run request(rng) requests_per_user times in each of users threads.
+
+    Returns:
+        (latency samples in seconds, number of failed requests, wall time)
+    """
+    samples, errors = [], []
+    lock = threading.Lock()
+    barrier = threading.Barrier(users)
+
+    def user(index):
+        rng = random.Random(seed * 1000 + index)
+        barrier.wait()
+        for _ in range(requests_per_user):
+            start = time.perf_counter()
+            try:
+                request(rng)
+            except Exception as e:
+                with lock:
+                    errors.append(e)
+                continue
+            with lock:
+                samples.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        list(pool.map(user, range(users)))
+    wall = time.perf_counter() - start
+    if errors:
+        print(f"  {len(errors)} failed requests, first: {errors[0]!r}")
+    return samples, len(errors), wall
+
+
+class Bench:
+    """Stand-ins and data shared by the scenarios"""
+
+    def __init__(self, args):
+        self.args = args
+        self.corpus = synthetic_recipes(args.docs, seed=3, instruction_sentences=4)
+        self.embedder = CachedEmbeddings(HashingEmbeddings(args.dim), cache_path=":memory:")
+        self.collection = "load_test"
+        self.queries = make_queries(self.corpus, args.queries, random.Random(5))
+        self.store_batches = 0
+
+        # Spoonacular knows other recipes than the ones already in Qdrant
+        self.stub = StubSpoonacular(fresh_recipes(args.docs, 10 ** 6, seed=17),
+                                    latency=args.spoonacular_latency).start()
+        set_client(SpoonacularClient(api_key="load-test", base_url=self.stub.url, rate=1000, burst=1000,
+                                     cache=ResponseCache(":memory:")))
+        # Measure the model path, not the generation cache
+        set_generation_cache(None)
+        self.llm = SlowFakeChatModel(responses=[json.dumps(SAMPLE_RECIPE, ensure_ascii=False)],
+                                     first_token_latency=args.first_token, token_latency=args.token)
+        self.config = {
+            "openai_api_key": None,
+            "qdrant_url": ":memory:",
+            "qdrant_api_key": None,
+            "collection_name": self.collection,
+            "embedder": self.embedder,
+        }
+
+        vectorstore.store_recipes(self.corpus, self.embedder, ":memory:", None, self.collection)
+        self.contexts = {}
+        for query in self.queries:
+            docs = vectorstore.retrieve_recipes_by_ingredients(
+                query, self.embedder, ":memory:", None, self.collection, 5)
+            self.contexts[tuple(query)] = build_context(docs)
+
+    def scenario(self, name):
+        """request(rng) function of a scenario"""
+        args = self.args
+        if name == "store":
+            lock = threading.Lock()
+
+            def store(rng):
+                with lock:
+                    self.store_batches += 1
+                    first_id = 2 * 10 ** 6 + self.store_batches * args.batch
+                docs = fresh_recipes(args.batch, first_id, seed=first_id)
+                vectorstore.store_recipes(docs, self.embedder, ":memory:", None, "load_test_store")
+            return store
+        if name == "retrieve":
+            return lambda rng: vectorstore.retrieve_recipes_by_ingredients(
+                rng.choice(self.queries), self.embedder, ":memory:", None, self.collection, 5)
+        if name == "similar":
+            return lambda rng: vectorstore.retrieve_similar_recipes(
+                ", ".join(rng.choice(self.queries)), self.embedder, ":memory:", None, self.collection, 5)
+        pipeline = RecipePipeline(self.config, llm=self.llm)
+        if name == "pipeline":
+            return lambda rng: pipeline.retrieve(rng.choice(self.queries))
+        if name == "generate":
+            def generate(rng):
+                query = rng.choice(self.queries)
+                pipeline.generate(self.contexts[tuple(query)], query)
+            return generate
+        if name == "stream":
+            self.ttft = []
+
+            def stream(rng):
+                query = rng.choice(self.queries)
+                start = time.perf_counter()
+                first_token = None
+                for event in pipeline.stream(self.contexts[tuple(query)], query):
+                    if first_token is None and event["type"] == "token":
+                        first_token = time.perf_counter() - start
+                self.ttft.append(first_token or 0.0)
+            return stream
+        raise ValueError(f"Unknown scenario '{name}'")
+
+    def run(self, name):
+        args = self.args
+        request = self.scenario(name)
+        stub_before, calls_before = self.stub.requests, stage_calls()
+        if args.trace_memory:
+            tracemalloc.start()
+        samples, errors, wall = run_load(request, args.users, args.requests, seed=SCENARIOS.index(name))
+        heap_peak = None
+        if args.trace_memory:
+            heap_peak = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 1)
+            tracemalloc.stop()
+        if name == "pipeline":
+            # Spoonacular results are persisted in the background
+            flush_background_tasks()
+
+        requests = len(samples) + errors
+        calls = stage_calls()
+        per_request = {"spoonacular": (self.stub.requests - stub_before) / requests}
+        per_request.update({key: (calls[key] - calls_before[key]) / requests for key in calls})
+        result = {
+            "scenario": name,
+            "requests": requests,
+            "errors": errors,
+            "rps": round(len(samples) / wall, 2),
+            **{key: value for key, value in summarize_ms(samples).items() if key != "n"},
+            "calls_per_request": {key: round(value, 3) for key, value in per_request.items()},
+            "peak_rss_mb": peak_rss_mb(),
+        }
+        if heap_peak is not None:
+            result["heap_peak_mb"] = heap_peak
+        if name == "stream":
+            ttft = summarize_ms(self.ttft)
+            result["ttft_p50_ms"], result["ttft_p95_ms"] = ttft["p50_ms"], ttft["p95_ms"]
+        return result
+
+
+def compare(previous, current):
+    """Rows with the change of each metric between two results files"""
+    before = {result["scenario"]: result for result in previous["results"]}
+    rows = []
+    for result in current["results"]:
+        old = before.get(result["scenario"])
+        if old is None:
+            continue
+        row = {"scenario": result["scenario"]}
+        for metric in COMPARED_METRICS:
+            if metric in old and metric in result:
+                change = (result[metric] - old[metric]) / old[metric] * 100 if old[metric] else 0.0
+                row[metric] = f"{old[metric]} -> {result[metric]} ({change:+.1f}%)"
+        rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=20, help="requests per user")
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=50, help="distinct ingredient queries")
+    parser.add_argument("--batch", type=int, default=20, help="recipes per store request")
+    parser.add_argument("--spoonacular-latency", type=float, default=0.2)
+    parser.add_argument("--first-token", type=float, default=0.3)
+    parser.add_argument("--token", type=float, default=0.01)
+    parser.add_argument("--trace-memory", action="store_true", help="also measure the Python heap peak (slower)")
+    parser.add_argument("--output")
+    parser.add_argument("--compare")
+    args = parser.parse_args()
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    for name in scenarios:
+        if name not in SCENARIOS:
+            parser.error(f"unknown scenario '{name}', expected some of {SCENARIOS}")
+    telemetry.configure_logging(level=logging.ERROR)
+
+    commit = git_commit()
+    print(f"Setting up ({args.docs} recipes in Qdrant :memory:, stub Spoonacular)...")
+    bench = Bench(args)
+    results = []
+    for name in scenarios:
+        print(f"Running '{name}' ({args.users} users x {args.requests} requests)...")
+        results.append(bench.run(name))
+
+    columns = ["scenario", "requests", "errors", "rps", "p50_ms", "p95_ms", "p99_ms", "peak_rss_mb"]
+    print_table(results, columns)
+    print("\nExternal calls per request")
+    print_table([{"scenario": result["scenario"], **result["calls_per_request"]} for result in results],
+                ["scenario", "spoonacular", "embedding", "qdrant", "llm"])
+    for result in results:
+        if "ttft_p50_ms" in result:
+            print(f"\nstream: time to first token p50 {result['ttft_p50_ms']} ms, p95 {result['ttft_p95_ms']} ms")
+
+    report = {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "args": vars(args),
+        "results": results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"e2e-{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as fp:
+        json.dump(report, fp, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        with open(args.compare) as fp:
+            previous = json.load(fp)
+        print(f"\nCompared with {previous.get('commit')} ({args.compare})")
+        print_table(compare(previous, report), ["scenario", *COMPARED_METRICS])
+
+
+if __name__ == "__main__":
+    main()
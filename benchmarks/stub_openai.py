@@ -0,0 +1,135 @@
+"""
+Local stand-in for the OpenAI chat completions endpoint: every request is
+answered with the same recipe (benchmarks.common.SAMPLE_RECIPE), streamed in
+small chunks when the client asks for a stream. Unlike a fake chat model,
+the real ChatOpenAI client (and its HTTP stack) is exercised.
+
+    python -m benchmarks.stub_openai [--port 8098] [--first-token 0.3] [--token 0.01]
+
+then point the app or the API at it with OPENAI_BASE_URL=http://127.0.0.1:8098/v1
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.common import SAMPLE_RECIPE
+
+CHUNK_CHARS = 16
+
+
+class StubOpenAI:
+    """/v1/chat/completions answering content, with simulated latencies. Runs in a daemon thread."""
+
+    def __init__(self, content=None, first_token_latency=0.0, token_latency=0.0, host="127.0.0.1", port=0):
+        self.content = content or json.dumps(SAMPLE_RECIPE, ensure_ascii=False)
+        self.first_token_latency = first_token_latency
+        self.token_latency = token_latency
+        self.requests = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if not self.path.endswith("/chat/completions"):
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                request = json.loads(body or b"{}")
+                with stub._lock:
+                    stub.requests += 1
+                time.sleep(stub.first_token_latency)
+                if request.get("stream"):
+                    self._stream(request)
+                else:
+                    self._send_json(stub.completion(request))
+
+            def _send_json(self, payload):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, request):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                for chunk in stub.chunks(request):
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                    time.sleep(stub.token_latency)
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.close_connection = True
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def usage(self):
+        completion_tokens = len(self.content) // 4
+        return {"prompt_tokens": 400, "completion_tokens": completion_tokens,
+                "total_tokens": 400 + completion_tokens}
+
+    def completion(self, request):
+        return {
+            "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()),
+            "model": request.get("model", "stub"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": self.content}}],
+            "usage": self.usage(),
+        }
+
+    def chunks(self, request):
+        base = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": request.get("model", "stub")}
+        for start in range(0, len(self.content), CHUNK_CHARS):
+            delta = {"content": self.content[start:start + CHUNK_CHARS]}
+            if start == 0:
+                delta["role"] = "assistant"
+            yield {**base, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+        yield {**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        if request.get("stream_options", {}).get("include_usage"):
+            yield {**base, "choices": [], "usage": self.usage()}
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name="stub-openai", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8098)
+    parser.add_argument("--first-token", type=float, default=0.3)
+    parser.add_argument("--token", type=float, default=0.01)
+    args = parser.parse_args()
+    stub = StubOpenAI(first_token_latency=args.first_token, token_latency=args.token,
+                      host=args.host, port=args.port)
+    print(f"Stub OpenAI on {stub.url} ({args.first_token}s to the first token, {args.token}s per chunk)")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Local stand-in for the Spoonacular findByIngredients endpoint, serving the
+synthetic corpus of benchmarks.common with a configurable latency. It
+counts the requests it receives, so benchmarks can report the external
+calls made per request.
+
+    python -m benchmarks.stub_spoonacular [--port 8099] [--latency 0.2] [--recipes 2000]
+
+then point the app or the API at it with SPOONACULAR_BASE_URL=http://127.0.0.1:8099
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from benchmarks.common import synthetic_recipes
+
+
+def to_spoonacular(doc, ingredients):
+    """findByIngredients entry of a synthetic recipe for the queried ingredients"""
+    wanted = {ingredient.lower() for ingredient in ingredients}
+    names = doc.metadata["ingredients"]
+    return {
+        "id": doc.metadata["id"],
+        "title": doc.metadata["title"],
+        "usedIngredients": [{"name": name} for name in names if name in wanted],
+        "missedIngredients": [{"name": name} for name in names if name not in wanted],
+        "instructions": "Cook everything together.",
+    }
+
+
+class StubSpoonacular:
+    """
+    findByIngredients over a list of Documents: recipes using the most of
+    the queried ingredients first. Runs in a daemon thread.
+    """
+
+    def __init__(self, docs, latency=0.2, host="127.0.0.1", port=0):
+        self.docs = docs
+        self.latency = latency
+        self.requests = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path != "/recipes/findByIngredients":
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                query = parse_qs(url.query)
+                ingredients = [ing for ing in query.get("ingredients", [""])[0].split(",") if ing]
+                number = int(query.get("number", ["10"])[0])
+                body = json.dumps(stub.find(ingredients, number)).encode("utf-8")
+                with stub._lock:
+                    stub.requests += 1
+                time.sleep(stub.latency)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def find(self, ingredients, number=10):
+        wanted = {ingredient.lower() for ingredient in ingredients}
+        scored = []
+        for doc in self.docs:
+            used = len(wanted.intersection(doc.metadata["ingredients"]))
+            if used:
+                scored.append((-used, doc.metadata["id"], doc))
+        scored.sort(key=lambda entry: entry[:2])
+        return [to_spoonacular(doc, ingredients) for _, _, doc in scored[:number]]
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name="stub-spoonacular", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--recipes", type=int, default=2000)
+    args = parser.parse_args()
+    stub = StubSpoonacular(synthetic_recipes(args.recipes, seed=11), args.latency, args.host, args.port)
+    print(f"Stub Spoonacular on {stub.url} ({args.recipes} recipes, {args.latency}s latency)")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
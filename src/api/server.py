@@ -0,0 +1,259 @@
+"""
+HTTP API over the recipe pipeline (src/pipeline.py), for clients other
+than the Streamlit app:
+
+    POST /retrieve          {"ingredients": ["tomato", "cheese"]}
+    POST /generate          {"ingredients": [...], "exclude": [recipes already shown]}
+    POST /generate/stream   same body; newline-delimited JSON events of
+                            llm.stream_recipe (token, field, item, done),
+                            then a "nutrition" event
+    GET  /health
+    GET  /metrics           Prometheus text (see src/telemetry.py)
+
+"ingredients" can also be a comma-separated string, like the app's input.
+Identical concurrent requests share one in-flight retrieval (and one
+generation). Blocking work (LLM calls) runs on API_WORKERS threads and at
+most API_MAX_CONCURRENCY requests do pipeline work at once; the others
+wait. The service keeps no session state, so it can be replicated behind a
+load balancer. With WARMING_ENABLED, the caches of the most requested
+ingredient sets are warmed in the background (src/warming.py).
+
+    python -m src.api.server [--host 0.0.0.0] [--port 8080] [--workers 8]
+"""
+import argparse
+import asyncio
+import contextlib
+import contextvars
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+from dotenv import load_dotenv
+
+# The src modules read their settings when imported, so .env is loaded
+# before them (like app.py's load_environment)
+load_dotenv()
+
+from src import telemetry
+from src.pipeline import RecipePipeline, wait_for_background_tasks
+from src.rag.ingredients import canonicalize_ingredients
+from src.rag.nutrition import recipe_nutrition
+from src.rag.utils import parse_ingredients
+from src.warming import CacheWarmer, get_query_log, start_warmer
+
+API_HOST = os.getenv("API_HOST", "0.0.0.0")
+API_PORT = int(os.getenv("API_PORT", "8080"))
+API_WORKERS = int(os.getenv("API_WORKERS", "8"))
+API_MAX_CONCURRENCY = int(os.getenv("API_MAX_CONCURRENCY", "32"))
+
+PIPELINE = web.AppKey("pipeline", RecipePipeline)
+EXECUTOR = web.AppKey("executor", ThreadPoolExecutor)
+LIMITER = web.AppKey("limiter", asyncio.Semaphore)
+WARMER = web.AppKey("warmer", CacheWarmer)
+
+logger = telemetry.get_logger(__name__)
+
+
+def _error(status, message):
+    return web.json_response({"error": message}, status=status)
+
+
+def _bad_request(message):
+    return web.HTTPBadRequest(text=json.dumps({"error": message}), content_type="application/json")
+
+
+async def _read_request(request):
+    """(ingredients, exclude) of a JSON request body"""
+    try:
+        body = await request.json()
+    except ValueError:
+        raise _bad_request("invalid JSON body")
+    if not isinstance(body, dict):
+        raise _bad_request("the body must be a JSON object")
+    ingredients = body.get("ingredients")
+    if isinstance(ingredients, str):
+        ingredients = parse_ingredients(ingredients)
+    elif isinstance(ingredients, list):
+        ingredients = canonicalize_ingredients(str(ing) for ing in ingredients if str(ing).strip())
+    if not ingredients:
+        raise _bad_request("'ingredients' is required")
+    exclude = body.get("exclude") or []
+    if not isinstance(exclude, list):
+        raise _bad_request("'exclude' must be a list of recipes")
+    return ingredients, exclude
+
+
+def _serialize_docs(docs):
+    return [{
+        "page_content": doc.page_content,
+        "metadata": {key: value for key, value in doc.metadata.items() if not key.startswith("_")},
+        "score": doc.metadata.get("_score"),
+    } for doc in docs or []]
+
+
+def _retrieval_response(ingredients, result):
+    return {
+        "ingredients": ingredients,
+        "source": result["source"],
+        "cached": result["cached"],
+        "docs": _serialize_docs(result["docs"]),
+        "logs": [{"type": log["type"], "message": log["message"]} for log in result["logs"]],
+    }
+
+
+async def handle_retrieve(request):
+    ingredients, _ = await _read_request(request)
+    async with request.app[LIMITER]:
+        result = await request.app[PIPELINE].retrieve_async(ingredients)
+    return web.json_response(_retrieval_response(ingredients, result))
+
+
+async def handle_generate(request):
+    ingredients, exclude = await _read_request(request)
+    async with request.app[LIMITER]:
+        result = await request.app[PIPELINE].generate_async(
+            ingredients, exclude, executor=request.app[EXECUTOR])
+    response = _retrieval_response(ingredients, result)
+    if result["recipe"] is None:
+        return web.json_response({**response, "error": "no recipes found for the ingredients"}, status=404)
+    return web.json_response({**response, "recipe": result["recipe"],
+                              "nutrition": recipe_nutrition(result["recipe"])})
+
+
+async def _iterate_in_thread(events, executor):
+    """
+    Iterate a blocking generator on executor, yielding its items on the
+    event loop. The generator is closed when the consumer stops early (e.g.
+    the client disconnected).
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    stop = threading.Event()
+    done = object()
+
+    def run():
+        try:
+            for item in events:
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+                if stop.is_set():
+                    break
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        finally:
+            events.close()
+            loop.call_soon_threadsafe(queue.put_nowait, done)
+
+    loop.run_in_executor(executor, contextvars.copy_context().run, run)
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+
+async def handle_generate_stream(request):
+    ingredients, exclude = await _read_request(request)
+    pipeline = request.app[PIPELINE]
+    async with request.app[LIMITER]:
+        retrieval = await pipeline.retrieve_async(ingredients)
+        if not retrieval["docs"]:
+            return _error(404, "no recipes found for the ingredients")
+
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await response.prepare(request)
+        await response.write((json.dumps({"type": "retrieval", **_retrieval_response(
+            ingredients, retrieval)}, ensure_ascii=False) + "\n").encode("utf-8"))
+        events = pipeline.stream(pipeline.context_for(retrieval["docs"]), ingredients, exclude,
+                                 pipeline.context_ids(retrieval["docs"]))
+        try:
+            async with contextlib.aclosing(_iterate_in_thread(events, request.app[EXECUTOR])) as stream:
+                async for event in stream:
+                    await response.write((json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8"))
+                    if event["type"] == "done":
+                        nutrition = {"type": "nutrition", "nutrition": recipe_nutrition(event["recipe"])}
+                        await response.write((json.dumps(nutrition, ensure_ascii=False) + "\n").encode("utf-8"))
+        except ConnectionResetError:
+            # The client went away; closing the stream stopped the generation
+            return response
+        except Exception as e:
+            logger.warning("Recipe stream failed: %s", e)
+            await response.write((json.dumps({"type": "error", "error": str(e)}) + "\n").encode("utf-8"))
+        await response.write_eof()
+        return response
+
+
+async def handle_health(request):
+    return web.json_response({"status": "ok"})
+
+
+async def handle_metrics(request):
+    return web.Response(text=telemetry.render_prometheus(), content_type="text/plain")
+
+
+@web.middleware
+async def trace_requests(request, handler):
+    resource = request.match_info.route.resource
+    route = resource.canonical if resource is not None else "unmatched"
+    with telemetry.span("api.request", route=route) as request_span:
+        try:
+            response = await handler(request)
+        except web.HTTPException as e:
+            request_span.set(http_status=e.status)
+            raise
+        request_span.set(http_status=response.status)
+        return response
+
+
+async def _start_warming(app):
+    # None unless WARMING_ENABLED
+    app[WARMER] = start_warmer(app[PIPELINE])
+
+
+async def _shutdown(app):
+    if app.get(WARMER) is not None:
+        await asyncio.to_thread(app[WARMER].stop, 5)
+    # Let background persistence (Spoonacular results) finish
+    await wait_for_background_tasks()
+    app[EXECUTOR].shutdown(wait=False, cancel_futures=True)
+
+
+def create_app(pipeline=None, workers=API_WORKERS, max_concurrency=API_MAX_CONCURRENCY):
+    """The aiohttp application (pipeline defaults to one configured from the environment)"""
+    app = web.Application(middlewares=[trace_requests])
+    app[PIPELINE] = pipeline or RecipePipeline.from_env(query_log=get_query_log())
+    app[EXECUTOR] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="api-worker")
+    app[LIMITER] = asyncio.Semaphore(max_concurrency)
+    app.router.add_post("/retrieve", handle_retrieve)
+    app.router.add_post("/generate", handle_generate)
+    app.router.add_post("/generate/stream", handle_generate_stream)
+    app.router.add_get("/health", handle_health)
+    app.router.add_get("/metrics", handle_metrics)
+    app.on_startup.append(_start_warming)
+    app.on_cleanup.append(_shutdown)
+    return app
+
+
+def main():
+    telemetry.configure_logging()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    parser.add_argument("--workers", type=int, default=API_WORKERS,
+                        help="threads for blocking work (LLM calls)")
+    parser.add_argument("--max-concurrency", type=int, default=API_MAX_CONCURRENCY,
+                        help="requests doing pipeline work at once")
+    args = parser.parse_args()
+
+    web.run_app(create_app(workers=args.workers, max_concurrency=args.max_concurrency),
+                host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,33 +1,151 @@
+import contextvars
 import os
 import requests
-from dotenv import load_dotenv
 import json
-from langchain.docstore.document import Document
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.documents import Document
+from requests.adapters import HTTPAdapter
 
-load_dotenv()
+from src import telemetry
+from src.rag.cache import ingredients_key
+from src.rag.ingredients import ingredient_terms
 
+logger = telemetry.get_logger(__name__)
+
+# Read at import: the entry points (app.py, src/api/server.py) load .env
+# before importing the src modules
 SPOONACULAR_KEY = os.getenv("SPOONACULAR_API_KEY")
+SPOONACULAR_BASE_URL = os.getenv(
+    "SPOONACULAR_BASE_URL", "https://api.spoonacular.com")
+SPOONACULAR_TIMEOUT = float(os.getenv("SPOONACULAR_TIMEOUT", "10"))
+# Sustained requests per second and burst size of the rate limiter
+SPOONACULAR_RATE = float(os.getenv("SPOONACULAR_RATE", "1"))
+SPOONACULAR_BURST = int(os.getenv("SPOONACULAR_BURST", "5"))
+SPOONACULAR_MAX_RETRIES = int(os.getenv("SPOONACULAR_MAX_RETRIES", "3"))
+SPOONACULAR_CACHE_PATH = os.getenv(
+    "SPOONACULAR_CACHE_PATH", os.path.join(".cache", "spoonacular.sqlite3"))
+SPOONACULAR_CACHE_TTL = int(os.getenv("SPOONACULAR_CACHE_TTL", str(24 * 3600)))
 
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Spoonacular answers 402 once the daily quota is used up
+QUOTA_EXCEEDED_STATUS = 402
 
-def fetch_recipes_by_ingredients(ingredients, num_recipes=10):
-    """Fetch recipes from Spoonacular API and format as LangChain Documents"""
-    url = "https://api.spoonacular.com/recipes/findByIngredients"
-    params = {
-        "ingredients": ",".join(ingredients),
-        "number": num_recipes,
-        "apiKey": SPOONACULAR_KEY,
-        "instructionsRequired": True
-    }
-
-    response = requests.get(url, params=params)
-    try:
-        response.raise_for_status()
-        recipes = response.json()
-    except Exception as e:
-        print(f"Error fetching recipes: {e}")
-        print(f"Response content: {response.text}")
-        return []
 
+class SpoonacularError(Exception):
+    pass
+
+
+class QuotaExceededError(SpoonacularError):
+    pass
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: rate tokens per second, up to capacity at once.
+    acquired and waited_s count the tokens taken and the time spent waiting.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.acquired = 0
+        self.waited_s = 0.0
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, timeout=None):
+        """Take a token, waiting for one if needed. Returns False on timeout"""
+        start = time.monotonic()
+        deadline = None if timeout is None else start + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    self.acquired += 1
+                    self.waited_s += now - start
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if deadline is not None:
+                if now + wait > deadline:
+                    return False
+            time.sleep(wait)
+
+    def stats(self):
+        with self._lock:
+            return {"acquired": self.acquired, "waited_s": round(self.waited_s, 3)}
+
+
+class ResponseCache:
+    """
+    On-disk cache of Spoonacular responses keyed on the sorted ingredient list.
+
+    Fresh entries (younger than ttl) are served without a request; stale
+    ones keep their ETag so the client can revalidate them with
+    If-None-Match instead of downloading the body again.
+    """
+
+    def __init__(self, path=SPOONACULAR_CACHE_PATH, ttl=SPOONACULAR_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                body TEXT NOT NULL,
+                etag TEXT,
+                fetched_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(ingredients, number):
+        return json.dumps([ingredients_key(ingredients), number])
+
+    def get(self, key):
+        """(body, etag, fresh) for a cached response, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body, etag, fetched_at FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        body, etag, fetched_at = row
+        return json.loads(body), etag, time.time() - fetched_at < self.ttl
+
+    def put(self, key, body, etag=None):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, body, etag, fetched_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(body), etag, time.time()))
+            self._conn.commit()
+
+    def touch(self, key):
+        """Mark a stale entry fresh again (the server answered 304 Not Modified)"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE responses SET fetched_at = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+
+def recipes_to_documents(recipes):
+    """Format findByIngredients results as LangChain Documents"""
     docs = []
     for recipe in recipes:
         # Extract all ingredients (used + missed)
@@ -56,15 +174,191 @@ def fetch_recipes_by_ingredients(ingredients, num_recipes=10):
             "ingredients": all_ingredients,  # List of ingredient names
             "used_ingredients": used_ingredients,  # User provided ingredients
             "missed_ingredients": missed_ingredients,  # Additional ingredients needed
+            # Canonical keyword terms, indexed in Qdrant for filtering
+            "canonical_ingredients": ingredient_terms(all_ingredients),
             "ingredient_count": len(all_ingredients)
         }
 
-        # Debug: Print metadata to see what's being stored
-        print(f"DEBUG: Recipe '{recipe.get('title', 'Unknown')}' metadata:")
-        print(f"  - ingredients: {all_ingredients}")
-        print(f"  - used_ingredients: {used_ingredients}")
-        print(f"  - missed_ingredients: {missed_ingredients}")
-
         docs.append(Document(page_content=content, metadata=metadata))
 
     return docs
+
+
+class SpoonacularClient:
+    """
+    Spoonacular API client.
+
+    Requests share a pooled requests.Session, go through a token-bucket rate
+    limiter and are retried with exponential backoff on 429/5xx (honouring
+    Retry-After). Responses are cached on disk (see ResponseCache); pass
+    cache=None to disable it. base_url can point at a local stub server.
+    """
+
+    def __init__(self, api_key=SPOONACULAR_KEY, base_url=SPOONACULAR_BASE_URL, timeout=SPOONACULAR_TIMEOUT,
+                 rate=SPOONACULAR_RATE, burst=SPOONACULAR_BURST, max_retries=SPOONACULAR_MAX_RETRIES,
+                 backoff=0.5, max_backoff=30.0, cache=None, pool_size=10):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.cache = cache
+        self.limiter = TokenBucket(rate, burst)
+        self.quota_left = None
+        self.requests_made = 0
+        self.cache_hits = 0
+        self.revalidated = 0
+        # Guards the counters above, updated from the fetch_many workers
+        self._stats_lock = threading.Lock()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _retry_delay(self, attempt, response=None):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), self.max_backoff)
+            except ValueError:
+                pass
+        return min(self.backoff * 2 ** attempt, self.max_backoff)
+
+    def _request(self, path, params, headers=None):
+        """GET with rate limiting and retries; returns the final response"""
+        url = f"{self.base_url}{path}"
+        params = {**params, "apiKey": self.api_key}
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            try:
+                response = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.max_retries:
+                    raise SpoonacularError(f"Request to {path} failed: {e}") from e
+                time.sleep(self._retry_delay(attempt))
+                continue
+            finally:
+                with self._stats_lock:
+                    self.requests_made += 1
+
+            quota_left = response.headers.get("X-API-Quota-Left")
+            if quota_left is not None:
+                try:
+                    quota_left = float(quota_left)
+                except ValueError:
+                    pass
+                else:
+                    with self._stats_lock:
+                        self.quota_left = quota_left
+            if response.status_code == QUOTA_EXCEEDED_STATUS:
+                raise QuotaExceededError("Spoonacular daily quota exceeded")
+            if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                delay = self._retry_delay(attempt, response)
+                logger.warning("Spoonacular returned %s, retrying in %.1fs", response.status_code, delay)
+                telemetry.incr("spoonacular_retries_total", status=response.status_code)
+                time.sleep(delay)
+                continue
+            return response
+
+    def find_by_ingredients(self, ingredients, number=10):
+        """Raw findByIngredients results, served from the cache when fresh"""
+        key = ResponseCache.make_key(ingredients, number)
+        cached = self.cache.get(key) if self.cache is not None else None
+        headers = None
+        if cached is not None:
+            body, etag, fresh = cached
+            if fresh:
+                with self._stats_lock:
+                    self.cache_hits += 1
+                telemetry.incr("cache_hits_total", cache="spoonacular")
+                return body
+            if etag:
+                headers = {"If-None-Match": etag}
+        telemetry.incr("cache_misses_total", cache="spoonacular")
+
+        with telemetry.span("spoonacular.fetch", ingredients=len(ingredients), number=number) as fetch:
+            response = self._request("/recipes/findByIngredients", {
+                "ingredients": ",".join(ingredients),
+                "number": number,
+                "instructionsRequired": True
+            }, headers)
+            fetch.set(http_status=response.status_code)
+
+        if response.status_code == 304 and cached is not None:
+            with self._stats_lock:
+                self.revalidated += 1
+            self.cache.touch(key)
+            return cached[0]
+        try:
+            response.raise_for_status()
+            body = response.json()
+        except Exception as e:
+            raise SpoonacularError(f"{e}; response content: {response.text[:500]}") from e
+        if self.cache is not None:
+            self.cache.put(key, body, response.headers.get("ETag"))
+        return body
+
+    def fetch_recipes(self, ingredients, num_recipes=10):
+        return recipes_to_documents(self.find_by_ingredients(ingredients, num_recipes))
+
+    def fetch_many(self, ingredient_lists, num_recipes=10, max_workers=4):
+        """
+        Fetch several ingredient combinations concurrently; the rate limiter
+        keeps the whole batch within the quota. Returns one list of Documents
+        per combination (empty when that request failed), in order.
+        """
+        def fetch(ingredients):
+            try:
+                return self.fetch_recipes(ingredients, num_recipes)
+            except SpoonacularError as e:
+                logger.warning("Error fetching recipes for %s: %s", ingredients, e)
+                return []
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="spoonacular") as pool:
+            # Each fetch runs in a copy of the caller's context, so its events reach the caller's capture()
+            futures = [pool.submit(contextvars.copy_context().run, fetch, ingredients)
+                       for ingredients in ingredient_lists]
+            return [future.result() for future in futures]
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "requests": self.requests_made,
+                "cache_hits": self.cache_hits,
+                "revalidated": self.revalidated,
+                "quota_left": self.quota_left,
+                "rate_limited_s": self.limiter.stats()["waited_s"],
+            }
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """The process-wide client, with the on-disk response cache"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = SpoonacularClient(cache=ResponseCache())
+        return _client
+
+
+def set_client(client):
+    """Replace the process-wide client (e.g. with one pointed at a stub server)"""
+    global _client
+    with _client_lock:
+        _client = client
+
+
+def fetch_recipes_by_ingredients(ingredients, num_recipes=10):
+    """Fetch recipes from Spoonacular API and format as LangChain Documents"""
+    try:
+        return get_client().fetch_recipes(ingredients, num_recipes)
+    except SpoonacularError as e:
+        logger.warning("Error fetching recipes: %s", e)
+        return []
@@ -0,0 +1,431 @@
+import asyncio
+import contextvars
+import importlib
+import os
+import threading
+from concurrent.futures import Future
+
+from src import telemetry
+from src.rag.cache import TTLCache, ingredients_key
+from src.rag.context import build_context, context_ids
+from src.rag.dedupe import recipe_title
+from src.rag.llm import generate_recipe, get_generation_pool, stream_recipe
+
+logger = telemetry.get_logger(__name__)
+
+# Imported on first use (the Spoonacular client, the vector store and the
+# OpenAI clients, with langchain and qdrant_client) or by preload(): together
+# they take seconds to import, which would otherwise delay the app's first
+# render. The openai resources are imported when the first client is built.
+PRELOADED_MODULES = (
+    "src.api.spoonacular_integration",
+    "src.rag.vectorstore",
+    "src.rag.embedders",
+    "langchain_openai",
+    "openai.resources.chat",
+    "openai.resources.embeddings",
+)
+
+RETRIEVAL_CACHE_TTL = int(os.getenv("RETRIEVAL_CACHE_TTL", "900"))
+RETRIEVAL_CACHE_NEGATIVE_TTL = int(
+    os.getenv("RETRIEVAL_CACHE_NEGATIVE_TTL", "60"))
+RETRIEVAL_CACHE_MAX_ENTRIES = int(
+    os.getenv("RETRIEVAL_CACHE_MAX_ENTRIES", "256"))
+
+# Event loop running in a daemon thread. Coroutines submitted from sync code
+# run here, and background tasks (like Qdrant persistence) keep running after
+# the request that scheduled them has returned.
+_loop = None
+_loop_lock = threading.Lock()
+_background_tasks = set()
+_preload_thread = None
+_preload_lock = threading.Lock()
+
+
+def get_event_loop():
+    """Return the pipeline's background event loop, starting it on first use"""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever,
+                             name="recipe-pipeline-loop", daemon=True).start()
+        return _loop
+
+
+def preload(modules=PRELOADED_MODULES):
+    """
+    Import the modules the first request needs in a daemon thread (once per
+    process), e.g. while the user is still typing the ingredients. Returns
+    the thread.
+    """
+    global _preload_thread
+
+    def run():
+        with telemetry.span("startup.preload"):
+            for module in modules:
+                try:
+                    importlib.import_module(module)
+                except ImportError as e:
+                    logger.warning("Could not preload %s: %s", module, e)
+
+    with _preload_lock:
+        if _preload_thread is None:
+            _preload_thread = threading.Thread(target=run, name="recipe-pipeline-preload", daemon=True)
+            _preload_thread.start()
+        return _preload_thread
+
+
+def _copy_task_result(task, future):
+    if task.cancelled():
+        future.cancel()
+    elif task.exception() is not None:
+        future.set_exception(task.exception())
+    else:
+        future.set_result(task.result())
+
+
+def run_sync(coro, timeout=None):
+    """
+    Run a coroutine on the pipeline loop and block until it finishes.
+
+    The coroutine runs in a copy of the caller's context (unlike with
+    run_coroutine_threadsafe), so the events it emits reach the caller's
+    telemetry.capture().
+    """
+    loop = get_event_loop()
+    future = Future()
+
+    def start():
+        task = loop.create_task(coro)
+        task.add_done_callback(lambda finished: _copy_task_result(finished, future))
+
+    loop.call_soon_threadsafe(start, context=contextvars.copy_context())
+    return future.result(timeout)
+
+
+def _log(logs, log_type, message):
+    """Emit a user-facing message and keep it in the request's logs"""
+    logs.append(telemetry.ui(log_type, message))
+
+
+def _result(docs, source, logs):
+    telemetry.incr("documents_retrieved_total", len(docs), source=source)
+    return {"docs": docs, "source": source, "logs": logs}
+
+
+def _run_in_background(coro, description):
+    """Schedule a coroutine off the request path, keeping a reference to it"""
+    task = asyncio.get_running_loop().create_task(coro)
+    _background_tasks.add(task)
+
+    def _done(finished):
+        _background_tasks.discard(finished)
+        if not finished.cancelled() and finished.exception() is not None:
+            logger.error("Background task '%s' failed: %s", description, finished.exception())
+
+    task.add_done_callback(_done)
+    return task
+
+
+async def _persist_recipes(recipe_docs, config):
+    from src.rag.vectorstore import store_recipes
+
+    stats = await asyncio.to_thread(
+        store_recipes, recipe_docs, config['embedder'], config['qdrant_url'],
+        config['qdrant_api_key'], config['collection_name'])
+    logger.debug("Background persistence finished: %s", stats)
+    return stats
+
+
+async def _persist_late_results(spoonacular_task, config):
+    try:
+        recipe_docs = await spoonacular_task
+    except Exception as e:
+        logger.debug("Late Spoonacular fetch failed: %s", e)
+        return None
+    if recipe_docs:
+        return await _persist_recipes(recipe_docs, config)
+    return None
+
+
+async def _fetch_from_spoonacular(ingredients_list):
+    from src.api.spoonacular_integration import fetch_recipes_by_ingredients
+
+    logger.debug("Searching Spoonacular for ingredients: %s", ingredients_list)
+    return await asyncio.to_thread(fetch_recipes_by_ingredients, ingredients_list)
+
+
+async def _lookup_qdrant(ingredients_list, config):
+    """
+    Look the ingredients up in the Qdrant cache.
+
+    Returns:
+        Tuple (recipes that use all the ingredients, all retrieved recipes)
+    """
+    from src.rag.vectorstore import get_ingredient_index, retrieve_recipes_by_ingredients
+
+    logger.debug("Searching Qdrant for ingredients: %s", ingredients_list)
+    retrieved_docs = await asyncio.to_thread(
+        retrieve_recipes_by_ingredients, ingredients_list, config['embedder'],
+        config['qdrant_url'], config['qdrant_api_key'], config['collection_name'], 5)
+    if not retrieved_docs:
+        return [], []
+
+    index = get_ingredient_index(
+        config['qdrant_url'], config['qdrant_api_key'], config['collection_name'])
+    valid_ids = index.match_all(ingredients_list)
+    valid_recipes = [doc for doc in retrieved_docs
+                     if doc.metadata.get('_id') in valid_ids]
+    return valid_recipes, retrieved_docs
+
+
+async def retrieve_recipes_async(ingredients_list, config):
+    """
+    Fetch recipes for the ingredients from Spoonacular and the Qdrant cache
+    concurrently and return whichever produces a usable context first.
+
+    Spoonacular results are persisted to Qdrant in a background task, off the
+    request path. If neither source has recipes using all the ingredients, the
+    partial Qdrant matches (or a plain similarity search) are returned.
+
+    Returns:
+        Dict with 'docs' (list of Documents or None), 'source' and 'logs'
+        (list of {'type', 'message'} entries for the UI)
+    """
+    logs = []
+    _log(logs, "info", "Buscando receitas no Spoonacular e no Qdrant...")
+
+    spoonacular_task = asyncio.create_task(
+        _fetch_from_spoonacular(ingredients_list))
+    qdrant_task = asyncio.create_task(_lookup_qdrant(ingredients_list, config))
+    pending = {spoonacular_task, qdrant_task}
+    partial_docs = []
+
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+
+        if spoonacular_task in done:
+            try:
+                recipe_docs = spoonacular_task.result()
+            except Exception as e:
+                recipe_docs = []
+                _log(logs, "warning", f"Erro ao buscar no Spoonacular: {str(e)}")
+
+            if recipe_docs:
+                _log(logs, "success",
+                     f"{len(recipe_docs)} receitas encontradas no Spoonacular!")
+                _log(logs, "info",
+                     "Armazenando receitas no Qdrant em segundo plano para futuras buscas...")
+                _run_in_background(_persist_recipes(recipe_docs, config),
+                                   "store recipes")
+                qdrant_task.cancel()
+                return _result(recipe_docs, "spoonacular", logs)
+
+            _log(logs, "warning",
+                 "Nenhuma receita encontrada no Spoonacular com todos os ingredientes.")
+
+        if qdrant_task in done:
+            try:
+                valid_recipes, partial_docs = qdrant_task.result()
+            except Exception as e:
+                valid_recipes, partial_docs = [], []
+                _log(logs, "warning", f"Erro ao buscar no Qdrant: {str(e)}")
+
+            if valid_recipes:
+                _log(logs, "success",
+                     f"{len(valid_recipes)} receitas encontradas no cache local que usam todos os ingredientes!")
+                if not spoonacular_task.done():
+                    # Still store the fresh results once they arrive
+                    _run_in_background(_persist_late_results(spoonacular_task, config),
+                                       "store late Spoonacular results")
+                return _result(valid_recipes, "qdrant", logs)
+
+            if partial_docs:
+                _log(logs, "info",
+                     "Receitas no cache não contêm todos os ingredientes solicitados.")
+
+    # If no results with filter, try regular similarity search as last resort
+    if not partial_docs:
+        logger.debug("No results with filter, trying similarity search")
+        from src.rag.vectorstore import retrieve_similar_recipes
+
+        try:
+            partial_docs = await asyncio.to_thread(
+                retrieve_similar_recipes, ", ".join(ingredients_list), config['embedder'],
+                config['qdrant_url'], config['qdrant_api_key'], config['collection_name'], 5)
+        except Exception as e:
+            _log(logs, "error", f"Erro ao buscar no Qdrant: {str(e)}")
+            return {"docs": None, "source": None, "logs": logs}
+
+    if partial_docs:
+        _log(logs, "info",
+             f"{len(partial_docs)} receitas similares encontradas no Qdrant.")
+        _log(logs, "warning",
+             "Nota: Algumas receitas podem não usar todos os ingredientes solicitados.")
+        return _result(partial_docs, "similar", logs)
+
+    _log(logs, "error", "Nenhuma receita encontrada no Qdrant.")
+    return {"docs": None, "source": None, "logs": logs}
+
+
+def retrieve_recipes(ingredients_list, config, timeout=None):
+    """Sync wrapper around retrieve_recipes_async"""
+    return run_sync(retrieve_recipes_async(ingredients_list, config), timeout)
+
+
+async def wait_for_background_tasks():
+    """Wait until every scheduled background task has finished"""
+    while _background_tasks:
+        await asyncio.gather(*list(_background_tasks), return_exceptions=True)
+
+
+def flush_background_tasks(timeout=None):
+    """Sync wrapper around wait_for_background_tasks (e.g. before shutdown)"""
+    run_sync(wait_for_background_tasks(), timeout)
+
+
+def load_config():
+    """Pipeline configuration from the environment (call load_dotenv first)"""
+    from src.rag.embedders import get_embedder
+
+    return {
+        'openai_api_key': os.getenv("OPENAI_API_KEY"),
+        'qdrant_url': os.getenv("QDRANT_URL"),
+        'qdrant_api_key': os.getenv("QDRANT_API_KEY"),
+        'collection_name': os.getenv("COLLECTION_NAME", "recipes"),
+        # EMBEDDING_BACKEND selects OpenAI or a local model (see src/rag/embedders.py)
+        'embedder': get_embedder(openai_api_key=os.getenv("OPENAI_API_KEY"))
+    }
+
+
+class RecipePipeline:
+    """
+    Retrieval + generation for an ingredient list, independent of any UI
+    session, shared by the Streamlit app and the HTTP API (src/api/server.py).
+
+    Retrieval results are cached per ingredient set (for every caller of the
+    pipeline), and identical concurrent requests share one in-flight run:
+    the first caller runs it and the others await its result. Queries are
+    counted in query_log, when given, for the cache warmer (src/warming.py).
+    """
+
+    def __init__(self, config, retrieval_cache=None, llm=None, query_log=None):
+        self.config = config
+        self.retrieval_cache = retrieval_cache or TTLCache(
+            ttl=RETRIEVAL_CACHE_TTL, max_entries=RETRIEVAL_CACHE_MAX_ENTRIES)
+        self.llm = llm
+        self.query_log = query_log
+        # (event loop, key) -> future of the run in progress
+        self._in_flight = {}
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        return cls(load_config(), **kwargs)
+
+    async def _coalesced(self, stage, key, run):
+        """Await run(), or the identical run already in progress"""
+        loop = asyncio.get_running_loop()
+        in_flight = self._in_flight.get((loop, key))
+        if in_flight is not None:
+            telemetry.incr("coalesced_requests_total", stage=stage)
+            result = await asyncio.shield(in_flight)
+            # The messages of the run went to the first caller; show them here too
+            telemetry.replay(result.get("logs", []))
+            return result
+
+        future = loop.create_future()
+        self._in_flight[(loop, key)] = future
+        try:
+            result = await run()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                future.exception()  # Retrieved, even when no one else is waiting
+            raise
+        finally:
+            del self._in_flight[(loop, key)]
+
+    async def retrieve_async(self, ingredients, record=True):
+        """
+        Recipes for the ingredients (see retrieve_recipes_async), from the
+        retrieval cache when possible. record=False does not count the query
+        in the query log (e.g. a rerun of one the caller already counted).
+
+        Returns:
+            Dict with 'docs', 'source', 'logs' and 'cached' (True when served
+            from the retrieval cache, in which case no messages are emitted)
+        """
+        if record and self.query_log is not None:
+            self.query_log.record(ingredients)
+        key = ingredients_key(ingredients)
+        cached = self.retrieval_cache.get(key)
+        if cached is not None:
+            telemetry.incr("cache_hits_total", cache="retrieval")
+            if cached.get("warmed"):
+                telemetry.incr("warming_hits_total", cache="retrieval")
+            return {"docs": cached["docs"], "source": cached["source"], "logs": [], "cached": True}
+        telemetry.incr("cache_misses_total", cache="retrieval")
+
+        async def run():
+            result = await retrieve_recipes_async(list(ingredients), self.config)
+            # Empty results are cached for a shorter time since they may be transient
+            self.retrieval_cache.set(
+                key, {"docs": result["docs"], "source": result["source"]},
+                ttl=None if result["docs"] else RETRIEVAL_CACHE_NEGATIVE_TTL)
+            return {**result, "cached": False}
+
+        return await self._coalesced("retrieve", key, run)
+
+    def retrieve(self, ingredients, timeout=None, record=True):
+        """Sync wrapper around retrieve_async, run on the pipeline loop"""
+        return run_sync(self.retrieve_async(ingredients, record), timeout)
+
+    def context_for(self, docs):
+        """Prompt context of the retrieved recipes"""
+        return build_context(docs)
+
+    def context_ids(self, docs):
+        """Ids of the retrieved recipes, which key their generations in the cache"""
+        return context_ids(docs)
+
+    def generate(self, context, ingredients, generated_recipes=[], variant=None, context_ids=None):
+        """Generate one recipe (blocking)"""
+        return generate_recipe(context, ingredients, self.config['openai_api_key'],
+                               list(generated_recipes), self.llm, variant, context_ids)
+
+    def stream(self, context, ingredients, generated_recipes=[], context_ids=None):
+        """Generate one recipe, yielding the events of llm.stream_recipe"""
+        return stream_recipe(context, ingredients, self.config['openai_api_key'],
+                             list(generated_recipes), self.llm, context_ids)
+
+    async def generate_async(self, ingredients, generated_recipes=[], executor=None):
+        """
+        Retrieve recipes for the ingredients and generate a new one from them
+        on executor (by default the shared generation pool). Identical
+        concurrent requests (same ingredients and excluded recipes) share one
+        generation.
+
+        Returns:
+            Dict with 'recipe' (None when no recipes were found), 'docs',
+            'source', 'logs' and 'cached'
+        """
+        retrieval = await self.retrieve_async(ingredients)
+        if not retrieval["docs"]:
+            return {**retrieval, "recipe": None}
+
+        async def run():
+            context = self.context_for(retrieval["docs"])
+            call = contextvars.copy_context().run
+            recipe = await asyncio.get_running_loop().run_in_executor(
+                executor or get_generation_pool(), call, self.generate,
+                context, list(ingredients), generated_recipes, None, self.context_ids(retrieval["docs"]))
+            return {"recipe": recipe}
+
+        key = (ingredients_key(ingredients), tuple(recipe_title(recipe) for recipe in generated_recipes))
+        generation = await self._coalesced("generate", key, run)
+        return {**retrieval, **generation}
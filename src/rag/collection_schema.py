@@ -0,0 +1,185 @@
+"""
+Managed configuration of the recipes collection: vector storage,
+quantization, HNSW parameters and payload indexes.
+
+Settings come from the environment:
+
+    QDRANT_QUANTIZATION      none | scalar | product (default scalar)
+    QDRANT_PQ_COMPRESSION    x4 | x8 | x16 | x32 | x64 (product quantization)
+    QDRANT_ON_DISK           keep original vectors on disk (default true)
+    QDRANT_ON_DISK_PAYLOAD   keep payloads on disk (default true)
+    QDRANT_HNSW_M            HNSW graph degree (default 16)
+    QDRANT_HNSW_EF_CONSTRUCT HNSW build-time beam (default 128)
+    QDRANT_SEARCH_EF         HNSW query-time beam (default: Qdrant's)
+    QDRANT_RESCORE           rescore quantized candidates with the originals
+    QDRANT_OVERSAMPLING      candidates fetched per result before rescoring
+    QDRANT_HYBRID            add the sparse ingredients vector (default true)
+
+With quantization the compressed vectors stay in RAM for the search and the
+originals (on disk) are only read to rescore the best candidates.
+"""
+import os
+
+from qdrant_client.models import (
+    CompressionRatio,
+    Distance,
+    HnswConfigDiff,
+    Modifier,
+    PayloadSchemaType,
+    ProductQuantization,
+    ProductQuantizationConfig,
+    QuantizationSearchParams,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    SearchParams,
+    SparseVectorParams,
+    VectorParams,
+)
+
+from src import telemetry
+from src.rag.sparse import SPARSE_VECTOR_NAME
+
+logger = telemetry.get_logger(__name__)
+
+QUANTIZATION_TYPES = ("none", "scalar", "product")
+
+# Payload indexes of the recipes collection (payload layout of vectorstore.py)
+PAYLOAD_INDEXES = {
+    "metadata.id": PayloadSchemaType.INTEGER,
+    "metadata.title": PayloadSchemaType.TEXT,
+    "metadata.used_ingredients": PayloadSchemaType.KEYWORD,
+    "metadata.canonical_ingredients": PayloadSchemaType.KEYWORD,
+}
+
+
+def _env_flag(name, default):
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
+class CollectionSchema:
+    """Collection settings; see the module docstring for their meaning"""
+
+    def __init__(self, quantization="scalar", pq_compression="x16", scalar_quantile=0.99,
+                 on_disk=True, on_disk_payload=True, hnsw_m=16, hnsw_ef_construct=128,
+                 search_ef=None, rescore=True, oversampling=2.0, distance=Distance.COSINE,
+                 payload_indexes=PAYLOAD_INDEXES, hybrid=True):
+        if quantization not in QUANTIZATION_TYPES:
+            raise ValueError(f"Unknown quantization '{quantization}', expected one of {QUANTIZATION_TYPES}")
+        self.quantization = quantization
+        self.pq_compression = pq_compression
+        self.scalar_quantile = scalar_quantile
+        self.on_disk = on_disk
+        self.on_disk_payload = on_disk_payload
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef_construct = hnsw_ef_construct
+        self.search_ef = search_ef
+        self.rescore = rescore
+        self.oversampling = oversampling
+        self.distance = distance
+        self.payload_indexes = payload_indexes
+        self.hybrid = hybrid
+
+    @classmethod
+    def from_env(cls):
+        search_ef = os.getenv("QDRANT_SEARCH_EF")
+        return cls(
+            quantization=os.getenv("QDRANT_QUANTIZATION", "scalar").lower(),
+            pq_compression=os.getenv("QDRANT_PQ_COMPRESSION", "x16").lower(),
+            on_disk=_env_flag("QDRANT_ON_DISK", "true"),
+            on_disk_payload=_env_flag("QDRANT_ON_DISK_PAYLOAD", "true"),
+            hnsw_m=int(os.getenv("QDRANT_HNSW_M", "16")),
+            hnsw_ef_construct=int(os.getenv("QDRANT_HNSW_EF_CONSTRUCT", "128")),
+            search_ef=int(search_ef) if search_ef else None,
+            rescore=_env_flag("QDRANT_RESCORE", "true"),
+            oversampling=float(os.getenv("QDRANT_OVERSAMPLING", "2.0")),
+            hybrid=_env_flag("QDRANT_HYBRID", "true"),
+        )
+
+    def describe(self):
+        quantization = self.quantization
+        if quantization == "product":
+            quantization = f"product-{self.pq_compression}"
+        return (f"{quantization}, m={self.hnsw_m}, ef_construct={self.hnsw_ef_construct}, "
+                f"on_disk={self.on_disk}, hybrid={self.hybrid}")
+
+    def vectors_config(self, vector_size):
+        return VectorParams(size=vector_size, distance=self.distance, on_disk=self.on_disk)
+
+    def sparse_vectors_config(self):
+        """Sparse ingredients vector, weighted by IDF on the server"""
+        if not self.hybrid:
+            return None
+        return {SPARSE_VECTOR_NAME: SparseVectorParams(modifier=Modifier.IDF)}
+
+    def hnsw_config(self):
+        return HnswConfigDiff(m=self.hnsw_m, ef_construct=self.hnsw_ef_construct)
+
+    def quantization_config(self):
+        if self.quantization == "scalar":
+            return ScalarQuantization(scalar=ScalarQuantizationConfig(
+                type=ScalarType.INT8, quantile=self.scalar_quantile, always_ram=True))
+        if self.quantization == "product":
+            return ProductQuantization(product=ProductQuantizationConfig(
+                compression=CompressionRatio(self.pq_compression), always_ram=True))
+        return None
+
+    def search_params(self):
+        """Query-time parameters matching the collection configuration"""
+        quantization = None
+        if self.quantization != "none":
+            quantization = QuantizationSearchParams(
+                rescore=self.rescore, oversampling=self.oversampling)
+        if quantization is None and self.search_ef is None:
+            return None
+        return SearchParams(hnsw_ef=self.search_ef, quantization=quantization)
+
+    def vector_memory_bytes(self, count, vector_size):
+        """
+        Estimated RAM taken by the vectors of count points (payloads and the
+        HNSW graph excluded). On-disk originals are not counted; only the
+        quantized copies, which always stay in RAM, are.
+        """
+        original = 0 if self.on_disk else count * vector_size * 4
+        if self.quantization == "scalar":
+            return original + count * vector_size
+        if self.quantization == "product":
+            ratio = int(self.pq_compression.lstrip("x"))
+            return original + count * vector_size * 4 // ratio
+        return count * vector_size * 4
+
+
+_schema = None
+
+
+def get_schema():
+    """The collection schema configured for this process"""
+    global _schema
+    if _schema is None:
+        _schema = CollectionSchema.from_env()
+    return _schema
+
+
+def create_payload_indexes(client, collection_name, schema=None):
+    schema = schema or get_schema()
+    for field_name, field_schema in schema.payload_indexes.items():
+        client.create_payload_index(
+            collection_name=collection_name,
+            field_name=field_name,
+            field_schema=field_schema
+        )
+
+
+def create_collection(client, collection_name, vector_size, schema=None):
+    """Create the collection with the schema's storage, HNSW, quantization and payload indexes"""
+    schema = schema or get_schema()
+    client.create_collection(
+        collection_name=collection_name,
+        vectors_config=schema.vectors_config(vector_size),
+        sparse_vectors_config=schema.sparse_vectors_config(),
+        hnsw_config=schema.hnsw_config(),
+        quantization_config=schema.quantization_config(),
+        on_disk_payload=schema.on_disk_payload
+    )
+    create_payload_indexes(client, collection_name, schema)
+    logger.info("Created collection '%s' (%s)", collection_name, schema.describe())
@@ -0,0 +1,138 @@
+import os
+import re
+from functools import lru_cache
+
+import tiktoken
+
+from src import telemetry
+
+logger = telemetry.get_logger(__name__)
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "600"))
+EXCLUSION_TOKEN_BUDGET = int(os.getenv("EXCLUSION_TOKEN_BUDGET", "80"))
+# Instructions of a single recipe never take more than this many tokens
+MAX_INSTRUCTION_TOKENS = 80
+# Don't add a truncated recipe when less than this many tokens are left
+MIN_RECIPE_TOKENS = 24
+
+_INSTRUCTIONS = re.compile(r"Instructions:\s*(.*)", re.DOTALL)
+_HTML_TAG = re.compile(r"<[^>]+>")
+
+
+class _ApproximateEncoding:
+    """Stand-in for a tiktoken encoding when its BPE file cannot be loaded (offline)"""
+
+    name = "approximate"
+    _pieces = re.compile(r"\s*\S{1,4}")
+
+    def encode(self, text):
+        return self._pieces.findall(text)
+
+    def decode(self, tokens):
+        return "".join(tokens)
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model="gpt-4.1-nano"):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logger.warning("Could not load tiktoken encoding, using an approximation: %s", e)
+        return _ApproximateEncoding()
+
+
+def count_tokens(text, model="gpt-4.1-nano"):
+    return len(get_encoding(model).encode(text))
+
+
+def truncate_to_tokens(text, max_tokens, model="gpt-4.1-nano"):
+    """Cut text to at most max_tokens tokens, marking the cut with an ellipsis"""
+    encoding = get_encoding(model)
+    tokens = encoding.encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max(max_tokens - 1, 0)]).rstrip() + "…"
+
+
+def _instructions(doc):
+    match = _INSTRUCTIONS.search(doc.page_content)
+    if not match:
+        return ""
+    text = " ".join(_HTML_TAG.sub(" ", match.group(1)).split())
+    return "" if text == "No instructions provided" else text
+
+
+def compact_recipe(doc, model="gpt-4.1-nano"):
+    """One dense line per recipe: title, ingredients and (truncated) instructions"""
+    metadata = doc.metadata
+    title = metadata.get("title") or doc.page_content.strip().split("\n", 1)[0]
+    ingredients = metadata.get("ingredients") or metadata.get("used_ingredients", [])
+    line = f"- {title}"
+    if ingredients:
+        line += f" | ingredientes: {', '.join(ingredients)}"
+    instructions = _instructions(doc)
+    if instructions:
+        line += f" | preparo: {truncate_to_tokens(instructions, MAX_INSTRUCTION_TOKENS, model)}"
+    return line
+
+
+def relevance(doc):
+    """
+    Ranking score of a retrieved document: the similarity score Qdrant
+    returned, or for Spoonacular results the share of the recipe's
+    ingredients the user has.
+    """
+    metadata = doc.metadata
+    if "_score" in metadata:
+        return metadata["_score"]
+    count = metadata.get("ingredient_count") or 0
+    return len(metadata.get("used_ingredients", [])) / count if count else 0.0
+
+
+def context_ids(docs):
+    """
+    Recipe ids of the retrieved documents (Spoonacular's, or the Qdrant
+    point's), which key cached generations on what was retrieved rather than
+    on how build_context rendered it; None when a document has neither.
+    """
+    ids = [doc.metadata.get("id", doc.metadata.get("_id")) for doc in docs]
+    return None if any(recipe_id is None for recipe_id in ids) else ids
+
+
+def build_context(docs, budget=CONTEXT_TOKEN_BUDGET, model="gpt-4.1-nano"):
+    """
+    Assemble the inspiration recipes for the prompt within a token budget.
+
+    Documents are ranked by relevance and compacted to a dense one-line
+    template; they are added until the budget is used, the last one being
+    truncated if enough room is left for it to be useful.
+    """
+    ranked = sorted(enumerate(docs), key=lambda item: (-relevance(item[1]), item[0]))
+    lines = []
+    remaining = budget
+    for _, doc in ranked:
+        line = compact_recipe(doc, model)
+        tokens = count_tokens(line, model) + 1  # newline
+        if tokens <= remaining:
+            lines.append(line)
+            remaining -= tokens
+        else:
+            if remaining >= MIN_RECIPE_TOKENS:
+                lines.append(truncate_to_tokens(line, remaining - 1, model))
+            break
+    return "\n".join(lines)
+
+
+def build_exclusion_block(titles, budget=EXCLUSION_TOKEN_BUDGET, model="gpt-4.1-nano"):
+    """Comma-separated titles, most recent first, within a token budget"""
+    selected = []
+    remaining = budget
+    for title in reversed(titles):
+        tokens = count_tokens(title, model) + 1
+        if tokens > remaining:
+            break
+        selected.append(title)
+        remaining -= tokens
+    return ", ".join(selected)
@@ -0,0 +1,40 @@
+import re
+
+
+def recipe_title(recipe):
+    """Title of a generated recipe (or the start of the raw text when it is not JSON)"""
+    if isinstance(recipe, dict):
+        return str(recipe.get("title", "")).strip()
+    return str(recipe).strip().split("\n", 1)[0][:80]
+
+
+def _words(text):
+    return set(re.findall(r"\w+", text.lower()))
+
+
+def _jaccard(first, second):
+    if not first or not second:
+        return 0.0
+    return len(first & second) / len(first | second)
+
+
+def _ingredient_words(recipe):
+    if not isinstance(recipe, dict):
+        return set()
+    return _words(" ".join(str(ingredient) for ingredient in recipe.get("ingredients", [])))
+
+
+def is_near_duplicate(recipe, other, title_threshold=0.8, ingredients_threshold=0.9):
+    """Whether two recipes have near-identical titles or ingredient lists"""
+    if _jaccard(_words(recipe_title(recipe)), _words(recipe_title(other))) >= title_threshold:
+        return True
+    return _jaccard(_ingredient_words(recipe), _ingredient_words(other)) >= ingredients_threshold
+
+
+def dedupe_recipes(recipes, seen=[]):
+    """Drop recipes that are near-duplicates of each other or of already seen ones"""
+    unique = []
+    for recipe in recipes:
+        if recipe and not any(is_near_duplicate(recipe, other) for other in [*seen, *unique]):
+            unique.append(recipe)
+    return unique
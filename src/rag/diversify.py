@@ -0,0 +1,65 @@
+import os
+
+import numpy as np
+
+# 0 ranks by relevance only, 1 by novelty only
+RETRIEVAL_DIVERSITY = float(os.getenv("RETRIEVAL_DIVERSITY", "0.3"))
+# Candidates at least this similar (cosine) to a selected one are dropped
+DUPLICATE_THRESHOLD = float(os.getenv("DUPLICATE_THRESHOLD", "0.95"))
+# Candidates fetched per result for the reranking to choose from
+DIVERSITY_FETCH_FACTOR = 2
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def mmr_select(vectors, relevance, k, diversity=RETRIEVAL_DIVERSITY, duplicate_threshold=DUPLICATE_THRESHOLD):
+    """
+    Maximal marginal relevance with near-duplicate collapse.
+
+    Greedily picks k of the candidates, each maximizing
+        (1 - diversity) * relevance - diversity * max similarity to the picked ones
+    and never picks a candidate whose cosine similarity to a picked one is
+    duplicate_threshold or more. relevance (e.g. search scores) is min-max
+    scaled so it is comparable with cosine similarities.
+
+    The pairwise similarities are one matrix product; each step only updates
+    the running max similarity, so selection is O(n * k) after it.
+
+    Returns:
+        Indices of the picked candidates, in pick order
+    """
+    n = len(vectors)
+    if n == 0 or k <= 0:
+        return []
+    vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+    relevance = np.asarray(relevance, dtype=np.float32)
+    spread = relevance.max() - relevance.min()
+    relevance = (relevance - relevance.min()) / spread if spread > 0 else np.ones(n, dtype=np.float32)
+
+    similarity = vectors @ vectors.T
+    max_similarity = np.full(n, -1.0, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    picked = []
+    for _ in range(min(k, n)):
+        scores = (1 - diversity) * relevance - diversity * np.maximum(max_similarity, 0)
+        if picked:
+            scores = np.where(available, scores, -np.inf)
+        else:
+            scores = np.where(available, relevance, -np.inf)
+        best = int(np.argmax(scores))
+        if not np.isfinite(scores[best]):
+            break
+        picked.append(best)
+        available[best] = False
+        max_similarity = np.maximum(max_similarity, similarity[best])
+        available &= max_similarity < duplicate_threshold
+    return picked
+
+
+def diversify(items, vectors, relevance, k, diversity=RETRIEVAL_DIVERSITY, duplicate_threshold=DUPLICATE_THRESHOLD):
+    """The k items picked by mmr_select, near-duplicates collapsed"""
+    return [items[index] for index in mmr_select(vectors, relevance, k, diversity, duplicate_threshold)]
@@ -0,0 +1,234 @@
+"""
+Embedding backends, selected with EMBEDDING_BACKEND:
+
+    openai                 OpenAIEmbeddings (default)
+    sentence-transformers  local model on CPU (EMBEDDING_MODEL)
+    hashing                deterministic feature hashing, no model (tests/offline)
+
+Embedders hand vectors over as float lists (the Embeddings interface);
+storing them with less precision is up to the vector store:
+LOCAL_VECTOR_PRECISION=int8 (src/rag/local_store.py) or
+QDRANT_QUANTIZATION=scalar (src/rag/collection_schema.py).
+
+Switching to a backend with another vector size needs a new collection;
+re-embed the existing one with:
+
+    python -m src.rag.embedders migrate recipes recipes_minilm
+"""
+import argparse
+import hashlib
+import os
+import queue
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from src import telemetry
+from src.rag.embedding_cache import CachedEmbeddings
+
+logger = telemetry.get_logger(__name__)
+
+DEFAULT_SENTENCE_TRANSFORMER = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+
+_WORD = re.compile(r"\w+")
+
+
+class SentenceTransformerEmbeddings(Embeddings):
+    """
+    Local sentence-transformers embedder.
+
+    The model is only loaded on first use. Texts from concurrent callers are
+    queued and encoded together: a batcher thread waits up to max_wait_ms
+    for more requests (up to max_batch_size texts) before handing a batch to
+    a thread pool sized to the CPU cores.
+    """
+
+    def __init__(self, model_name=DEFAULT_SENTENCE_TRANSFORMER, max_batch_size=64, max_wait_ms=5, workers=None,
+                 device="cpu"):
+        self.model_name = model_name
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.workers = workers or os.cpu_count() or 1
+        self.device = device
+        self.batches = 0
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._pool = None
+        self._batcher = None
+        self._start_lock = threading.Lock()
+
+    def _load_model(self):
+        from sentence_transformers import SentenceTransformer
+        import torch
+
+        # The pool already runs one batch per core
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // self.workers))
+        return SentenceTransformer(self.model_name, device=self.device)
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    start = time.perf_counter()
+                    self._model = self._load_model()
+                    logger.info("Loaded embedding model '%s' in %.1fs",
+                                self.model_name, time.perf_counter() - start)
+        return self._model
+
+    def _start(self):
+        with self._start_lock:
+            if self._batcher is None:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="embed")
+                self._batcher = threading.Thread(
+                    target=self._run_batcher, name="embed-batcher", daemon=True)
+                self._batcher.start()
+
+    def _run_batcher(self):
+        while True:
+            requests = [self._queue.get()]
+            size = len(requests[0][0])
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                requests.append(request)
+                size += len(request[0])
+            self._pool.submit(self._encode_requests, requests)
+
+    def _encode_requests(self, requests):
+        texts = [text for request_texts, _ in requests for text in request_texts]
+        try:
+            vectors = self.model.encode(
+                texts, batch_size=len(texts), convert_to_numpy=True, show_progress_bar=False)
+        except Exception as e:
+            for _, future in requests:
+                future.set_exception(e)
+            return
+        self.batches += 1
+        start = 0
+        for request_texts, future in requests:
+            future.set_result(vectors[start:start + len(request_texts)].tolist())
+            start += len(request_texts)
+
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        self._start()
+        futures = []
+        for start in range(0, len(texts), self.max_batch_size):
+            future = Future()
+            self._queue.put((texts[start:start + self.max_batch_size], future))
+            futures.append(future)
+        return [vector for future in futures for vector in future.result()]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic feature-hashing embedder: words and character trigrams are
+    hashed into size signed buckets and the vector is L2-normalized. Texts
+    sharing words get similar vectors, which is enough for tests and offline
+    runs; no model or network is involved.
+    """
+
+    def __init__(self, size=256):
+        self.size = size
+        self.model_name = f"hashing-{size}"
+
+    def _features(self, text):
+        words = _WORD.findall(text.lower())
+        for word in words:
+            yield word
+            padded = f"#{word}#"
+            for start in range(len(padded) - 2):
+                yield padded[start:start + 3]
+
+    def _embed(self, text):
+        vector = np.zeros(self.size, dtype=np.float32)
+        for feature in self._features(text):
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vector[value % self.size] += 1.0 if (value >> 63) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+def get_embedder(backend=None, model=None, openai_api_key=None, cache=None):
+    """
+    Build the configured embedder (see the module docstring), wrapped in
+    CachedEmbeddings unless the cache is disabled (EMBEDDING_CACHE_ENABLED).
+
+    The EMBEDDING_* settings are read here rather than at import, so that
+    the command-line entry points can load .env first.
+    """
+    backend = (backend or os.getenv("EMBEDDING_BACKEND", "openai")).lower()
+    model = model or os.getenv("EMBEDDING_MODEL")
+    if cache is None:
+        cache = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+    if backend == "openai":
+        from langchain_openai import OpenAIEmbeddings
+
+        kwargs = {"model": model} if model else {}
+        embedder = OpenAIEmbeddings(
+            openai_api_key=openai_api_key or os.getenv("OPENAI_API_KEY"), **kwargs)
+        model_name = None
+    elif backend in ("sentence-transformers", "local"):
+        embedder = SentenceTransformerEmbeddings(model or DEFAULT_SENTENCE_TRANSFORMER)
+        model_name = embedder.model_name
+    elif backend == "hashing":
+        embedder = HashingEmbeddings(int(model) if model else 256)
+        model_name = None
+    else:
+        raise ValueError(f"Unknown embedding backend '{backend}'")
+
+    return CachedEmbeddings(embedder, model_name=model_name) if cache else embedder
+
+
+def main():
+    from dotenv import load_dotenv
+
+    # Before importing vectorstore, which reads VECTOR_BACKEND and QDRANT_*
+    load_dotenv()
+    from src.rag.vectorstore import migrate_collection
+
+    telemetry.configure_logging()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    migrate = subparsers.add_parser(
+        "migrate", help="re-embed a collection into a new one with the configured embedder")
+    migrate.add_argument("source")
+    migrate.add_argument("target")
+    migrate.add_argument("--backend")
+    migrate.add_argument("--model")
+    migrate.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    embedder = get_embedder(args.backend, args.model, cache=False)
+    migrated = migrate_collection(embedder, os.getenv("QDRANT_URL"), os.getenv("QDRANT_API_KEY"),
+                                  args.source, args.target, batch_size=args.batch_size)
+    print(f"Migrated {migrated} points from '{args.source}' to '{args.target}'")
+
+
+if __name__ == "__main__":
+    main()
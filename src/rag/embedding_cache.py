@@ -0,0 +1,192 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+from langchain_core.embeddings import Embeddings
+
+from src import telemetry
+
+DEFAULT_CACHE_PATH = os.getenv(
+    "EMBEDDING_CACHE_PATH", os.path.join(".cache", "embeddings.sqlite3"))
+DEFAULT_MEMORY_ENTRIES = 4096
+DEFAULT_MAX_DISK_BYTES = 256 * 1024 * 1024
+
+
+def normalize_text(text):
+    """Normalize text before keying it: collapse whitespace and strip"""
+    return " ".join(text.split())
+
+
+def _model_name(embedder):
+    return getattr(embedder, "model", None) or getattr(embedder, "model_name", None) or type(embedder).__name__
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that caches vectors of any LangChain embedder.
+
+    Vectors are keyed on the model name plus the normalized text and kept in
+    two tiers: an in-process LRU dictionary and a local SQLite database that
+    survives restarts. When the database grows beyond max_disk_bytes the least
+    recently used entries are evicted. Cache misses are sent to the wrapped
+    embedder in a single embed_documents call.
+    """
+
+    def __init__(self, embedder, cache_path=DEFAULT_CACHE_PATH, max_memory_entries=DEFAULT_MEMORY_ENTRIES,
+                 max_disk_bytes=DEFAULT_MAX_DISK_BYTES, model_name=None):
+        self.embedder = embedder
+        self.model_name = model_name or _model_name(embedder)
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.misses = 0
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+        if cache_path != ":memory:":
+            os.makedirs(os.path.dirname(
+                os.path.abspath(cache_path)), exist_ok=True)
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                vector BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access)")
+        self._conn.commit()
+
+    def _key(self, text):
+        payload = f"{self.model_name}\0{normalize_text(text)}".encode("utf-8")
+        return hashlib.sha256(payload).hexdigest()
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _load_from_disk(self, keys):
+        if not keys:
+            return {}
+        found = {}
+        keys = list(keys)
+        # SQLite limits the number of host parameters per statement
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self._conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk)
+            for key, blob in rows:
+                found[key] = array("f", blob).tolist()
+        if found:
+            now = time.time()
+            self._conn.executemany(
+                "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                [(now, key) for key in found])
+            self._conn.commit()
+        return found
+
+    def _save_to_disk(self, items):
+        now = time.time()
+        rows = []
+        for key, vector in items.items():
+            blob = array("f", vector).tobytes()
+            rows.append((key, blob, len(blob), now))
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, vector, size, last_access) VALUES (?, ?, ?, ?)", rows)
+        self._conn.commit()
+        self._evict()
+
+    def _evict(self):
+        """Drop least recently used rows until the store fits in max_disk_bytes"""
+        total = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+        if total <= self.max_disk_bytes:
+            return
+        target = int(self.max_disk_bytes * 0.9)
+        rows = self._conn.execute(
+            "SELECT key, size FROM embeddings ORDER BY last_access ASC")
+        to_delete = []
+        for key, size in rows:
+            if total <= target:
+                break
+            to_delete.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM embeddings WHERE key = ?", to_delete)
+        self._conn.commit()
+
+    def embed_documents(self, texts):
+        keys = [self._key(text) for text in texts]
+        results = {}
+
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    results[key] = self._memory[key]
+
+            disk_hits = self._load_from_disk(
+                {key for key in keys if key not in results})
+            for key, vector in disk_hits.items():
+                self._remember(key, vector)
+            results.update(disk_hits)
+
+        # Embed each missing text once, even if it appears several times
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in results and key not in missing:
+                missing[key] = text
+
+        hits = sum(1 for key in keys if key in results)
+        if missing:
+            with telemetry.span("embedding.embed", model=self.model_name, texts=len(missing)):
+                vectors = self.embedder.embed_documents(list(missing.values()))
+            computed = {key: [float(value) for value in vector]
+                        for key, vector in zip(missing.keys(), vectors)}
+            with self._lock:
+                self._save_to_disk(computed)
+                for key, vector in computed.items():
+                    self._remember(key, vector)
+            results.update(computed)
+
+        with self._lock:
+            self.hits += hits
+            self.misses += len(keys) - hits
+        if hits:
+            telemetry.incr("cache_hits_total", hits, cache="embedding")
+        if len(keys) > hits:
+            telemetry.incr("cache_misses_total", len(keys) - hits, cache="embedding")
+
+        return [results[key] for key in keys]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    def stats(self):
+        """Hit/miss counters and current cache sizes"""
+        with self._lock:
+            disk_entries, disk_bytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM embeddings").fetchone()
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "memory_entries": len(self._memory),
+                "disk_entries": disk_entries,
+                "disk_bytes": disk_bytes,
+            }
+
+    def clear(self):
+        """Remove every cached vector"""
+        with self._lock:
+            self._memory.clear()
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
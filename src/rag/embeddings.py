@@ -1,17 +1,276 @@
-from langchain_openai import OpenAIEmbeddings
-from langchain.document_loaders import JSONLoader
-from langchain.vectorstores import Qdrant
+"""
+Bulk ingestion of a recipe dump (JSON array or JSONL) into Qdrant.
+
+    python -m src.rag.embeddings data/recipes.json [--collection recipes]
+        [--batch-size 64] [--workers 4] [--restart]
+
+Records are stream-parsed (memory does not grow with the file), embedded in
+fixed-size batches on a bounded worker pool and upserted with wait=False so
+Qdrant indexes one batch while the next ones are embedded. Progress is
+checkpointed; re-running the command after an interruption resumes from the
+last checkpoint, and points are keyed like store_recipes does, so unchanged
+recipes that are read again are not re-embedded.
+"""
+import argparse
+import json
 import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+from langchain_core.documents import Document
+
+# A command-line entry point: the src modules read their settings
+# (VECTOR_BACKEND, QDRANT_*, EMBEDDING_*) when imported, so .env is loaded
+# before them
+load_dotenv()
+
+from src import telemetry
+from src.rag.vectorstore import (
+    UPSERT_BATCH_SIZE,
+    content_hash,
+    create_ingredients_index,
+    ensure_collection,
+    fetch_existing_hashes,
+    get_client,
+    is_hybrid_collection,
+    recipe_point,
+    recipe_point_id,
+    with_sparse_vector,
+)
+
+READ_CHUNK_SIZE = 1 << 16
+CHECKPOINT_EVERY = 10  # batches
+
+
+def _iter_json_array(fp, chunk_size=READ_CHUNK_SIZE):
+    """Yield the elements of a top-level JSON array, reading fp chunk by chunk"""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    started = False
+    eof = False
+    while True:
+        # Skip whitespace and separators
+        stripped = buffer.lstrip()
+        if not started and stripped.startswith("["):
+            started = True
+            stripped = stripped[1:].lstrip()
+        if started and stripped.startswith(","):
+            stripped = stripped[1:].lstrip()
+        if started and stripped.startswith("]"):
+            return
+        buffer = stripped
+
+        if buffer and started:
+            try:
+                value, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                # A number at the end of the buffer may be cut, read more first
+                if end < len(buffer) or eof:
+                    yield value
+                    buffer = buffer[end:]
+                    continue
+
+        if eof:
+            if buffer.strip():
+                raise ValueError("Unexpected end of JSON array")
+            return
+        chunk = fp.read(chunk_size)
+        if not chunk:
+            eof = True
+        buffer += chunk
+
+
+def iter_records(path):
+    """Stream the records of a JSON array or JSONL file"""
+    with open(path, encoding="utf-8") as fp:
+        first = ""
+        while not first:
+            char = fp.read(1)
+            if not char:
+                return
+            if not char.isspace():
+                first = char
+        fp.seek(0)
+        if first == "[":
+            yield from _iter_json_array(fp)
+        else:
+            for line in fp:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+def record_to_document(record, source):
+    """
+    Document for a dump record. Spoonacular results are formatted like the
+    live API ones; other records keep JSONLoader's behavior (the record as
+    text) with their id, title and ingredients lifted into the metadata.
+    """
+    if isinstance(record, dict) and "usedIngredients" in record:
+        from src.api.spoonacular_integration import recipes_to_documents
+        doc = recipes_to_documents([record])[0]
+        doc.metadata["source"] = source
+        return doc
+
+    metadata = {"source": source}
+    if isinstance(record, dict):
+        for key in ("id", "title", "ingredients"):
+            if key in record:
+                metadata[key] = record[key]
+        if not all(isinstance(ing, str) for ing in metadata.get("ingredients", [])):
+            del metadata["ingredients"]
+    text = record if isinstance(record, str) else json.dumps(record, ensure_ascii=False)
+    return Document(page_content=text, metadata=metadata)
+
+
+def iter_batches(path, batch_size, skip=0):
+    """Yield (records read so far, documents) batches, skipping the first skip records"""
+    source = os.path.basename(path)
+    batch = []
+    read = 0
+    for record in iter_records(path):
+        read += 1
+        if read <= skip:
+            continue
+        batch.append(record_to_document(record, source))
+        if len(batch) == batch_size:
+            yield read, batch
+            batch = []
+    if batch:
+        yield read, batch
+
+
+def load_checkpoint(checkpoint_path, path, collection_name):
+    """Records already ingested according to the checkpoint (0 if there is none)"""
+    try:
+        with open(checkpoint_path, encoding="utf-8") as fp:
+            checkpoint = json.load(fp)
+    except (OSError, ValueError):
+        return 0
+    if checkpoint.get("source") != os.path.abspath(path) or checkpoint.get("collection") != collection_name:
+        return 0
+    return checkpoint.get("records", 0)
+
+
+def save_checkpoint(checkpoint_path, path, collection_name, records):
+    tmp_path = f"{checkpoint_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as fp:
+        json.dump({"source": os.path.abspath(path), "collection": collection_name,
+                   "records": records, "updated_at": time.time()}, fp)
+    os.replace(tmp_path, checkpoint_path)
+
+
+def _embed_batch(client, url, collection_name, embedder, docs):
+    """Embed the new or changed documents of a batch, returning their points"""
+    pending = {}
+    for doc in docs:
+        digest = content_hash(doc)
+        pending[recipe_point_id(doc, digest)] = (doc, digest)
+    existing = fetch_existing_hashes(client, url, collection_name, list(pending))
+    changed = [(point_id, doc, digest) for point_id, (doc, digest) in pending.items()
+               if existing.get(point_id) != digest]
+    if not changed:
+        return [], len(docs)
+    vectors = embedder.embed_documents([doc.page_content for _, doc, _ in changed])
+    points = [recipe_point(point_id, doc, digest, vector)
+              for (point_id, doc, digest), vector in zip(changed, vectors)]
+    return points, len(docs) - len(points)
+
+
+def ingest(path, embedder, url, api_key, collection_name, batch_size=UPSERT_BATCH_SIZE, workers=4,
+           checkpoint_path=None, resume=True):
+    """
+    Ingest a recipe dump into Qdrant.
+
+    Returns:
+        Dict with the records read, points upserted, unchanged records
+        skipped, elapsed seconds and docs/sec
+    """
+    checkpoint_path = checkpoint_path or f"{path}.checkpoint.json"
+    done = load_checkpoint(checkpoint_path, path, collection_name) if resume else 0
+    if done:
+        print(f"Resuming after {done} records (checkpoint {checkpoint_path})")
+
+    client = get_client(url, api_key)
+    stats = {"read": 0, "upserted": 0, "skipped": 0}
+    start = time.perf_counter()
+    batches_since_checkpoint = 0
+
+    def report(records):
+        elapsed = time.perf_counter() - start
+        rate = stats["read"] / elapsed if elapsed else 0.0
+        print(f"{records} records ({stats['upserted']} upserted, {stats['skipped']} unchanged), "
+              f"{rate:.1f} docs/sec")
+
+    def complete(records, future):
+        nonlocal batches_since_checkpoint
+        points, skipped = future.result()
+        if points:
+            ensure_collection(client, url, collection_name, len(points[0].vector))
+            if is_hybrid_collection(client, url, collection_name):
+                points = [with_sparse_vector(point) for point in points]
+            with telemetry.span("qdrant.upsert", collection=collection_name, points=len(points)):
+                client.upsert(collection_name=collection_name, points=points, wait=False)
+        stats["upserted"] += len(points)
+        stats["skipped"] += skipped
+        batches_since_checkpoint += 1
+        if batches_since_checkpoint >= CHECKPOINT_EVERY:
+            save_checkpoint(checkpoint_path, path, collection_name, records)
+            batches_since_checkpoint = 0
+            report(records)
+
+    # Batches complete in order, so the checkpoint always covers a prefix of the file
+    in_flight = deque()
+    records = done
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest") as pool:
+        for records, docs in iter_batches(path, batch_size, skip=done):
+            stats["read"] += len(docs)
+            in_flight.append((records, pool.submit(
+                _embed_batch, client, url, collection_name, embedder, docs)))
+            if len(in_flight) >= workers * 2:
+                complete(*in_flight.popleft())
+        while in_flight:
+            complete(*in_flight.popleft())
+
+    if stats["upserted"]:
+        create_ingredients_index(url, api_key, collection_name)
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    elapsed = time.perf_counter() - start
+    stats["seconds"] = round(elapsed, 3)
+    stats["docs_per_sec"] = round(stats["read"] / elapsed, 1) if elapsed else 0.0
+    report(records)
+    return stats
+
+
+def main():
+    from src.rag.embedders import get_embedder
+
+    telemetry.configure_logging()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", nargs="?", default="data/recipes.json")
+    parser.add_argument("--collection", default=os.getenv("COLLECTION_NAME", "recipes"))
+    parser.add_argument("--batch-size", type=int, default=UPSERT_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--checkpoint", help="checkpoint file (default: <path>.checkpoint.json)")
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    parser.add_argument("--no-embedding-cache", action="store_true")
+    args = parser.parse_args()
+
+    # EMBEDDING_BACKEND / EMBEDDING_MODEL select the embedder
+    embedder = get_embedder(cache=False if args.no_embedding_cache else None)
 
-loader = JSONLoader(file_path='data/recipes.json', jq_schema='.[]')
-recipes = loader.load()
+    stats = ingest(args.path, embedder, os.getenv("QDRANT_URL"), os.getenv("QDRANT_API_KEY"),
+                   args.collection, batch_size=args.batch_size, workers=args.workers,
+                   checkpoint_path=args.checkpoint, resume=not args.restart)
+    print(json.dumps(stats))
 
-openai_api_key = os.getenv("OPENAI_API_KEY")
-embedder = OpenAIEmbeddings(openai_api_key=openai_api_key)
-recipe_texts = [doc.page_content for doc in recipes]
-embeddings = embedder.embed_documents(recipe_texts)
 
-qdrant_url = os.getenv("QDRANT_URL")
-qdrant_api_key = os.getenv("QDRANT_API_KEY")
-vector_db = Qdrant.from_documents(
-    recipes, embedder, url=qdrant_url, api_key=qdrant_api_key, collection_name="recipes")
+if __name__ == "__main__":
+    main()
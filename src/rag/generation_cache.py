@@ -0,0 +1,212 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from src import telemetry
+from src.rag.cache import ingredients_key
+from src.rag.dedupe import is_near_duplicate
+
+DEFAULT_CACHE_PATH = os.getenv(
+    "GENERATION_CACHE_PATH", os.path.join(".cache", "generations.sqlite3"))
+DEFAULT_TTL = int(os.getenv("GENERATION_CACHE_TTL", str(7 * 24 * 3600)))
+DEFAULT_MAX_ENTRIES = int(os.getenv("GENERATION_CACHE_MAX_ENTRIES", "5000"))
+DEFAULT_SIMILARITY_THRESHOLD = float(
+    os.getenv("GENERATION_CACHE_SIMILARITY", "0.97"))
+
+
+def context_fingerprint(context, context_ids=None):
+    """Hash of the retrieved context: its recipe ids when known, its text otherwise"""
+    items = context_ids if context_ids is not None else context
+    if isinstance(items, str):
+        items = [items]
+    payload = json.dumps(sorted(str(item) for item in items))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def semantic_text(context, ingredients):
+    """The variable part of the prompt, which is what the semantic tier embeds"""
+    if isinstance(context, str):
+        context = [context]
+    return f"{', '.join(ingredients_key(ingredients))}\n{' '.join(str(item) for item in context)}"
+
+
+class GenerationCache:
+    """
+    Local SQLite cache of LLM recipe generations.
+
+    Exact tier: generations keyed on (model, temperature, normalized
+    ingredients, context fingerprint, variant), variant being the style a
+    variant's prompt asks for (None for the plain prompt). Several generations can be stored
+    under the same key, which lets callers skip the recipes a user has already
+    seen.
+
+    Semantic tier (only when an embedder is given): reuse a generation for the
+    same model/temperature/variant whose embedded prompt is within similarity_threshold
+    (cosine) of the new one.
+
+    Entries expire after ttl seconds and the least recently used ones are
+    evicted beyond max_entries.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES,
+                 embedder=None, similarity_threshold=DEFAULT_SIMILARITY_THRESHOLD):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.embedder = embedder
+        self.similarity_threshold = similarity_threshold
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS generations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                key TEXT NOT NULL,
+                model TEXT NOT NULL,
+                temperature REAL NOT NULL,
+                recipe TEXT NOT NULL,
+                prompt_vector BLOB,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                variant TEXT
+            )
+        """)
+        # Caches created before variants were cached apart only hold plain generations
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(generations)")]
+        if "variant" not in columns:
+            self._conn.execute("ALTER TABLE generations ADD COLUMN variant TEXT")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS generations_key ON generations (key)")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS generations_last_access ON generations (last_access)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model, temperature, ingredients, context, context_ids=None, variant=None):
+        fields = [model, float(temperature), ingredients_key(ingredients),
+                  context_fingerprint(context, context_ids)]
+        # Plain generations keep the keys they had before variants were cached
+        payload = json.dumps(fields if variant is None else fields + [variant])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _embed(self, context, ingredients):
+        if self.embedder is None:
+            return None
+        vector = np.asarray(self.embedder.embed_query(
+            semantic_text(context, ingredients)), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _pick(self, rows, exclude):
+        """First cached recipe that is not a near-duplicate of an excluded one"""
+        for row_id, recipe_text in rows:
+            recipe = json.loads(recipe_text)
+            if not any(is_near_duplicate(recipe, other) for other in exclude):
+                self._conn.execute(
+                    "UPDATE generations SET last_access = ? WHERE id = ?", (time.time(), row_id))
+                self._conn.commit()
+                return recipe
+        return None
+
+    def get(self, model, temperature, ingredients, context, exclude=[], context_ids=None, variant=None):
+        """Return a cached recipe the user has not seen yet, or None"""
+        key = self.make_key(model, temperature, ingredients, context, context_ids, variant)
+        min_created = time.time() - self.ttl
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, recipe FROM generations WHERE key = ? AND created_at >= ? "
+                "ORDER BY last_access ASC", (key, min_created)).fetchall()
+            recipe = self._pick(rows, exclude)
+            if recipe is not None:
+                self.exact_hits += 1
+                telemetry.incr("cache_hits_total", cache="generation", tier="exact")
+                return recipe
+
+        vector = self._embed(context, ingredients)
+        if vector is not None:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT id, recipe, prompt_vector FROM generations "
+                    "WHERE model = ? AND temperature = ? AND variant IS ? AND created_at >= ? "
+                    "AND prompt_vector IS NOT NULL",
+                    (model, float(temperature), variant, min_created)).fetchall()
+                # Vectors from another embedder (different size) are ignored
+                rows = [row for row in rows if len(row[2]) == vector.nbytes]
+                if rows:
+                    matrix = np.stack([np.frombuffer(blob, dtype=np.float32)
+                                       for _, _, blob in rows])
+                    scores = matrix @ vector
+                    order = np.argsort(-scores)
+                    candidates = [(rows[i][0], rows[i][1]) for i in order
+                                  if scores[i] >= self.similarity_threshold]
+                    recipe = self._pick(candidates, exclude)
+                    if recipe is not None:
+                        self.semantic_hits += 1
+                        telemetry.incr("cache_hits_total", cache="generation", tier="semantic")
+                        return recipe
+
+        with self._lock:
+            self.misses += 1
+        telemetry.incr("cache_misses_total", cache="generation")
+        return None
+
+    def contains(self, model, temperature, ingredients, context, context_ids=None, variant=None):
+        """Whether a fresh generation is stored for the exact key (not counted as a hit)"""
+        key = self.make_key(model, temperature, ingredients, context, context_ids, variant)
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM generations WHERE key = ? AND created_at >= ? LIMIT 1",
+                (key, time.time() - self.ttl)).fetchone() is not None
+
+    def put(self, model, temperature, ingredients, context, recipe, context_ids=None, variant=None):
+        """Store a generated recipe (only structured, dict recipes are cached)"""
+        if not isinstance(recipe, dict):
+            return
+        key = self.make_key(model, temperature, ingredients, context, context_ids, variant)
+        vector = self._embed(context, ingredients)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO generations (key, model, temperature, recipe, prompt_vector, created_at, "
+                "last_access, variant) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, model, float(temperature), json.dumps(recipe, ensure_ascii=False),
+                 None if vector is None else vector.tobytes(), now, now, variant))
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        self._conn.execute(
+            "DELETE FROM generations WHERE created_at < ?", (now - self.ttl,))
+        count = self._conn.execute(
+            "SELECT COUNT(*) FROM generations").fetchone()[0]
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM generations WHERE id IN "
+                "(SELECT id FROM generations ORDER BY last_access ASC LIMIT ?)",
+                (count - self.max_entries,))
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute(
+                "SELECT COUNT(*) FROM generations").fetchone()[0]
+            return {
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "entries": entries,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM generations")
+            self._conn.commit()
@@ -0,0 +1,111 @@
+import threading
+from collections import defaultdict
+
+from src.rag.ingredients import canonicalize_ingredient, canonicalize_ingredients
+
+
+def _ngrams(text, size):
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def recipe_ingredients(metadata):
+    """All ingredients of a recipe, from its stored metadata"""
+    return (metadata.get("ingredients")
+            or metadata.get("used_ingredients", []))
+
+
+class IngredientIndex:
+    """
+    In-memory inverted index from ingredient names to recipe point IDs.
+
+    Ingredient names are canonicalized and indexed by character n-grams so that
+    partial names ("tomato" in "cherry tomatoes") are resolved with set
+    intersections instead of scanning every recipe. Recipes can be added
+    incrementally; adding a point again replaces its previous ingredients.
+    """
+
+    def __init__(self, ngram_size=3):
+        self.ngram_size = ngram_size
+        self._ingredient_points = defaultdict(set)  # ingredient -> point ids
+        self._point_ingredients = {}  # point id -> ingredients
+        self._ngram_ingredients = defaultdict(set)  # n-gram -> ingredients
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_documents(cls, docs):
+        """Index documents by position, or by their Qdrant point id when present"""
+        index = cls()
+        for position, doc in enumerate(docs):
+            index.add(doc.metadata.get("_id", position),
+                      recipe_ingredients(doc.metadata))
+        return index
+
+    def __len__(self):
+        return len(self._point_ingredients)
+
+    def __contains__(self, point_id):
+        return point_id in self._point_ingredients
+
+    def add(self, point_id, ingredients):
+        normalized = set(canonicalize_ingredients(ingredients))
+        with self._lock:
+            self.remove(point_id)
+            self._point_ingredients[point_id] = normalized
+            for ingredient in normalized:
+                if ingredient not in self._ingredient_points:
+                    for gram in _ngrams(ingredient, self.ngram_size):
+                        self._ngram_ingredients[gram].add(ingredient)
+                self._ingredient_points[ingredient].add(point_id)
+
+    def remove(self, point_id):
+        with self._lock:
+            for ingredient in self._point_ingredients.pop(point_id, ()):
+                points = self._ingredient_points[ingredient]
+                points.discard(point_id)
+                if not points:
+                    del self._ingredient_points[ingredient]
+                    for gram in _ngrams(ingredient, self.ngram_size):
+                        self._ngram_ingredients[gram].discard(ingredient)
+
+    def matching_ingredients(self, term):
+        """Indexed ingredient names that contain the given term"""
+        term = canonicalize_ingredient(term)
+        if not term:
+            return set()
+        with self._lock:
+            if len(term) < self.ngram_size:
+                candidates = self._ingredient_points.keys()
+            else:
+                postings = sorted((self._ngram_ingredients.get(gram, set())
+                                   for gram in _ngrams(term, self.ngram_size)), key=len)
+                candidates = set.intersection(*postings)
+            return {name for name in candidates if term in name}
+
+    def points_for(self, term):
+        """Point IDs of recipes with an ingredient containing the term"""
+        with self._lock:
+            points = set()
+            for ingredient in self.matching_ingredients(term):
+                points |= self._ingredient_points[ingredient]
+            return points
+
+    def match_any(self, terms):
+        """Point IDs of recipes containing at least one of the terms"""
+        points = set()
+        for term in terms:
+            points |= self.points_for(term)
+        return points
+
+    def match_all(self, terms):
+        """Point IDs of recipes containing every one of the terms"""
+        points = None
+        for term in terms:
+            matches = self.points_for(term)
+            points = matches if points is None else points & matches
+            if not points:
+                return set()
+        return points or set()
+
+    def matched_terms(self, terms):
+        """The terms that appear in at least one indexed recipe, in order"""
+        return [term for term in terms if self.matching_ingredients(term)]
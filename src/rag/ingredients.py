@@ -0,0 +1,140 @@
+import re
+
+# Words that describe how an ingredient is prepared or sold, not what it is
+QUALIFIERS = {
+    "fresh", "freshly", "shredded", "grated", "chopped", "finely", "roughly",
+    "diced", "minced", "sliced", "thinly", "crushed", "peeled", "seeded",
+    "pitted", "cubed", "halved", "quartered", "trimmed", "rinsed", "drained",
+    "cooked", "uncooked", "raw", "frozen", "thawed", "canned", "dried",
+    "organic", "large", "medium", "small", "extra", "virgin", "ripe",
+    "boneless", "skinless", "softened", "melted", "room", "temperature",
+    "packed", "optional", "taste", "to", "of", "for", "and", "or", "a", "the",
+}
+
+# Spellings mapped to a single canonical name (singular, lowercase)
+ALIASES = {
+    "scallion": "green onion",
+    "spring onion": "green onion",
+    "capsicum": "bell pepper",
+    "aubergine": "eggplant",
+    "courgette": "zucchini",
+    "garbanzo bean": "chickpea",
+    "garbanzo": "chickpea",
+    "coriander": "cilantro",
+    "prawn": "shrimp",
+    "rocket": "arugula",
+    "cornflour": "cornstarch",
+    "corn starch": "cornstarch",
+    "bicarbonate of soda": "baking soda",
+    "all purpose flour": "flour",
+    "plain flour": "flour",
+    "wheat flour": "flour",
+    "caster sugar": "sugar",
+    "granulated sugar": "sugar",
+    "white sugar": "sugar",
+    "icing sugar": "powdered sugar",
+    "confectioners sugar": "powdered sugar",
+    "double cream": "heavy cream",
+    "heavy whipping cream": "heavy cream",
+    "whipping cream": "heavy cream",
+    "garlic clove": "garlic",
+    "clove garlic": "garlic",
+    "egg white": "egg",
+    "egg yolk": "egg",
+    "minced meat": "ground beef",
+    "beef mince": "ground beef",
+    # Portuguese names users commonly type
+    "tomate": "tomato",
+    "queijo": "cheese",
+    "ovo": "egg",
+    "frango": "chicken",
+    "cebola": "onion",
+    "alho": "garlic",
+    "batata": "potato",
+    "cenoura": "carrot",
+    "arroz": "rice",
+    "feijao": "bean",
+    "leite": "milk",
+    "manteiga": "butter",
+    "farinha": "flour",
+    "acucar": "sugar",
+    "carne moida": "ground beef",
+}
+
+IRREGULAR_SINGULARS = {
+    "leaves": "leaf",
+    "loaves": "loaf",
+    "halves": "half",
+    "knives": "knife",
+    "potatoes": "potato",
+    "tomatoes": "tomato",
+    "mangoes": "mango",
+    "molasses": "molasses",
+}
+
+INVARIANT_WORDS = {"asparagus", "couscous", "hummus", "swiss", "grits", "brussels", "oats"}
+
+_ACCENTS = str.maketrans("áàâãäéèêëíìîïóòôõöúùûüç", "aaaaaeeeeiiiiooooouuuuc")
+_NON_WORD = re.compile(r"[^a-z0-9 ]+")
+_PARENTHETICAL = re.compile(r"\([^)]*\)")
+
+
+def singularize(word):
+    """Naive English singular form, good enough for ingredient names"""
+    if word in IRREGULAR_SINGULARS:
+        return IRREGULAR_SINGULARS[word]
+    if word in INVARIANT_WORDS or len(word) <= 3 or word.endswith(("ss", "us", "is")):
+        return word
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    if word.endswith(("ches", "shes", "xes", "zes")):
+        return word[:-2]
+    if word.endswith("s"):
+        return word[:-1]
+    return word
+
+
+def canonicalize_ingredient(name):
+    """
+    Canonical form of an ingredient name: lowercase, no accents or punctuation,
+    preparation qualifiers removed, singular, with aliases resolved.
+
+    >>> canonicalize_ingredient("Fresh Shredded Tomatoes")
+    'tomato'
+    """
+    text = _PARENTHETICAL.sub(" ", name.lower()).translate(_ACCENTS)
+    text = " ".join(_NON_WORD.sub(" ", text).split())
+    if text in ALIASES:
+        return ALIASES[text]
+
+    words = [singularize(word) for word in text.split()
+             if word not in QUALIFIERS and not word.isdigit()]
+    canonical = " ".join(words)
+    return ALIASES.get(canonical, canonical)
+
+
+def canonicalize_ingredients(names):
+    """Canonical names, deduplicated and in their original order"""
+    canonical = []
+    for name in names:
+        value = canonicalize_ingredient(name)
+        if value and value not in canonical:
+            canonical.append(value)
+    return canonical
+
+
+def ingredient_terms(names):
+    """
+    Keyword terms stored for a recipe: every canonical ingredient name plus
+    its contiguous word spans, so "cheese" also matches "parmesan cheese" and
+    "black pepper" matches "ground black pepper".
+    """
+    terms = []
+    for canonical in canonicalize_ingredients(names):
+        words = canonical.split()
+        for size in range(len(words), 0, -1):
+            for start in range(len(words) - size + 1):
+                term = " ".join(words[start:start + size])
+                if term not in terms:
+                    terms.append(term)
+    return terms
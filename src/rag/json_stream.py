@@ -0,0 +1,137 @@
+import json
+
+
+class IncrementalJSONParser:
+    """
+    Incremental parser for a JSON object that arrives in chunks (e.g. LLM tokens).
+
+    It tracks just enough structure to notice when a top-level value or an
+    element of a top-level array is complete, and returns those as events:
+
+        ("field", key, value)  a top-level value (arrays once they close)
+        ("item", key, value)   one element of the top-level array under key
+
+    Anything before the first '{' (like a ```json fence) is ignored.
+    """
+
+    def __init__(self):
+        self._text = ""
+        self._pos = 0
+        self._stack = []
+        self._started = False
+        self._in_string = False
+        self._escape = False
+        self._expect_key = False
+        self._key = None
+        self._string_start = None
+        self._value_start = None  # start of the current top-level value
+        self._item_start = None  # start of the current top-level array item
+        self.done = False
+
+    @property
+    def text(self):
+        """Everything fed so far"""
+        return self._text
+
+    def _decode(self, start, end):
+        try:
+            return True, json.loads(self._text[start:end])
+        except ValueError:
+            return False, None
+
+    def _emit_field(self, events, end):
+        ok, value = self._decode(self._value_start, end)
+        if ok:
+            events.append(("field", self._key, value))
+        self._value_start = None
+
+    def _emit_item(self, events, end):
+        ok, value = self._decode(self._item_start, end)
+        if ok:
+            events.append(("item", self._key, value))
+        self._item_start = None
+
+    def _in_top_level_array(self):
+        return len(self._stack) == 2 and self._stack[1] == "["
+
+    def _start_value(self, index):
+        depth = len(self._stack)
+        if depth == 1 and not self._expect_key and self._value_start is None:
+            self._value_start = index
+        elif self._in_top_level_array() and self._item_start is None:
+            self._item_start = index
+
+    def feed(self, chunk):
+        """Consume a chunk and return the events it completed"""
+        events = []
+        self._text += chunk
+        text = self._text
+
+        for index in range(self._pos, len(text)):
+            if self.done:
+                break
+            char = text[index]
+
+            if not self._started:
+                if char == "{":
+                    self._started = True
+                    self._stack.append("{")
+                    self._expect_key = True
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    self._end_string(events, index)
+                continue
+
+            depth = len(self._stack)
+            if char == '"':
+                self._in_string = True
+                self._string_start = index
+                self._start_value(index)
+            elif char in "{[":
+                self._start_value(index)
+                self._stack.append(char)
+            elif char in "}]":
+                if self._in_top_level_array() and self._item_start is not None:
+                    # Unquoted last item, e.g. [1, 2]
+                    self._emit_item(events, index)
+                if depth == 1 and self._value_start is not None:
+                    self._emit_field(events, index)
+                self._stack.pop()
+                if not self._stack:
+                    self.done = True
+                elif self._in_top_level_array() and self._item_start is not None:
+                    self._emit_item(events, index + 1)
+                elif len(self._stack) == 1 and self._value_start is not None:
+                    self._emit_field(events, index + 1)
+            elif char == ",":
+                if depth == 1:
+                    if self._value_start is not None:
+                        self._emit_field(events, index)
+                    self._expect_key = True
+                elif self._in_top_level_array() and self._item_start is not None:
+                    self._emit_item(events, index)
+            elif char == ":":
+                if depth == 1:
+                    self._expect_key = False
+            elif not char.isspace():
+                self._start_value(index)
+
+        self._pos = len(text)
+        return events
+
+    def _end_string(self, events, index):
+        depth = len(self._stack)
+        if depth == 1 and self._expect_key:
+            ok, key = self._decode(self._string_start, index + 1)
+            self._key = key if ok else None
+        elif depth == 1 and self._value_start == self._string_start:
+            self._emit_field(events, index + 1)
+        elif self._in_top_level_array() and self._item_start == self._string_start:
+            self._emit_item(events, index + 1)
@@ -1,35 +1,323 @@
-from langchain_openai import ChatOpenAI
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import json
+import os
+import threading
+import time
 
+from src import telemetry
+from src.rag.context import build_exclusion_block, count_tokens
+from src.rag.dedupe import dedupe_recipes, recipe_title
+from src.rag.generation_cache import GenerationCache
+from src.rag.json_stream import IncrementalJSONParser
 
-def generate_recipe(context, ingredients, openai_api_key, generated_recipes=[]):
+logger = telemetry.get_logger(__name__)
+
+LLM_MODEL = "gpt-4.1-nano"
+LLM_TEMPERATURE = 0.7
+# Recipes without the nutrition table (computed by nutrition.py) fit in
+# about 250-500 tokens
+LLM_MAX_TOKENS = 640
+# Max generations running at the same time in this process
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+# Only the most recent recipes are listed in the "be different" block
+MAX_EXCLUDED_RECIPES = 10
+
+# Cooking styles suggested to parallel variants so they do not all converge
+VARIANT_STYLES = [
+    "assada no forno",
+    "refogada na panela",
+    "fria, como uma salada",
+    "em forma de sopa ou caldo",
+    "grelhada ou na chapa",
+    "gratinada",
+]
+
+GENERATION_CACHE_ENABLED = os.getenv(
+    "GENERATION_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+_generation_pool = None
+_generation_pool_lock = threading.Lock()
+# api key -> chat model, shared by every generation of the process
+_llms = {}
+_llms_lock = threading.Lock()
+_UNSET = object()
+_generation_cache = _UNSET
+
+
+def variant_style(variant):
+    """Style variant n (from 1) asks for, cycling through VARIANT_STYLES; None for no variant"""
+    return VARIANT_STYLES[(variant - 1) % len(VARIANT_STYLES)] if variant else None
+
+
+def build_recipe_prompt(context, ingredients, generated_recipes=[], variant=None):
+    if not isinstance(context, str):
+        context = "\n".join(context)
     context_prompt = f"""
-    Usando unica e exclusivamente apenas estes ingredientes: {', '.join(ingredients)}, e considerando as seguintes receitas como inspiração: {context}, crie uma nova receita. Não adicione outros ingredientes, exceto temperos, ervas ou especiarias que possam realçar o sabor, caso faça sentido. Inclua quantidades (em gramas) e instruções passo a passo. Se faltar algum ingrediente, mencione nas instruções, mas não invente ou adicione novos.
+    Usando unica e exclusivamente apenas estes ingredientes: {', '.join(ingredients)}, e considerando as seguintes receitas como inspiração:
+    {context}
+    crie uma nova receita. Não adicione outros ingredientes, exceto temperos, ervas ou especiarias que possam realçar o sabor, caso faça sentido. Inclua instruções passo a passo. Se faltar algum ingrediente, mencione nas instruções, mas não invente ou adicione novos.
     Seja claro e detalhista no passo a passo.
     Retorne a resposta como JSON estruturado:
     {{
         "title": "...",
-        "ingredients": ["ingrediente1", "ingrediente2", ...],
-        "steps": ["passo1", "passo2", ...],
-        "nutrition_markdown": "| Nutriente | Valor |\n|---|---|\n| Calorias | ... | ... | ... | ... |",
+        "ingredients": ["150 g de ingrediente1", "2 ingrediente2 (240 g)", ...],
+        "steps": ["passo1", "passo2", ...]
     }}
-    A receita e todos os campos devem estar em português. A informação nutricional deve ser uma tabela markdown no campo 'nutrition_markdown', e deve conter a quantidade total de calorias, proteinas, carboidratos, gorduras, fibras e sódio, dos ingredientes da receita, e na quantidade total de cada ingrediente.
+    A receita e todos os campos devem estar em português. Cada ingrediente deve trazer a quantidade em gramas (ou ml). Não inclua informação nutricional: ela é calculada à parte.
     """
-    if len(generated_recipes) > 0:
+    if variant:
+        context_prompt += f"""
+        Para variar, prefira uma receita {variant_style(variant)}, se fizer sentido com os ingredientes.
+        """
+    excluded_titles = build_exclusion_block(
+        [title for title in (recipe_title(recipe) for recipe in generated_recipes[-MAX_EXCLUDED_RECIPES:])
+         if title], model=LLM_MODEL)
+    if excluded_titles:
         context_prompt += f"""
         Se possível, a receita deve ser diferente das receitas abaixo:
-        {', '.join(generated_recipes)}
+        {excluded_titles}
         """
-    llm = ChatOpenAI(
-        openai_api_key=openai_api_key,
-        model="gpt-4.1-nano",
-        temperature=0.7,
-        max_tokens=1024
-    )
-    final_recipe = llm.invoke(context_prompt)
+    return context_prompt
+
+
+def get_llm(openai_api_key):
+    """
+    The shared chat model for an API key (one client and connection pool per
+    process). langchain_openai is imported here, on first use: it takes
+    longer to import than the rest of the app.
+    """
+    with _llms_lock:
+        llm = _llms.get(openai_api_key)
+        if llm is None:
+            from langchain_openai import ChatOpenAI
+
+            llm = _llms[openai_api_key] = ChatOpenAI(
+                openai_api_key=openai_api_key,
+                model=LLM_MODEL,
+                temperature=LLM_TEMPERATURE,
+                max_tokens=LLM_MAX_TOKENS,
+                # Report token usage on the last chunk of streamed responses too
+                stream_usage=True
+            )
+        return llm
+
+
+def get_generation_cache():
+    """The process-wide generation cache (exact tier only unless configured otherwise)"""
+    global _generation_cache
+    if _generation_cache is _UNSET:
+        _generation_cache = GenerationCache() if GENERATION_CACHE_ENABLED else None
+    return _generation_cache
+
+
+def set_generation_cache(cache):
+    """Replace the generation cache, e.g. with one that has an embedder; None disables it"""
+    global _generation_cache
+    _generation_cache = cache
+
+
+def is_generation_cached(context, ingredients, llm=None, context_ids=None):
+    """Whether the generation cache already has a recipe for this prompt (e.g. to skip warming it)"""
+    cache = get_generation_cache()
+    if cache is None:
+        return False
+    model, temperature = _model_params(llm)
+    return cache.contains(model, temperature, ingredients, context, context_ids)
+
+
+def _model_params(llm):
+    """(model, temperature) used to key cached generations"""
+    if llm is None:
+        return LLM_MODEL, LLM_TEMPERATURE
+    model = getattr(llm, "model_name", None) or type(llm).__name__
+    return model, getattr(llm, "temperature", None) or 0.0
+
+
+def _record_token_usage(model, prompt, completion, usage=None):
+    """
+    Count the tokens of a generation, from the usage metadata of the response
+    or, when the model did not report it, estimated with the tokenizer
+    """
+    if usage:
+        prompt_tokens = usage.get("input_tokens", 0)
+        completion_tokens = usage.get("output_tokens", 0)
+    else:
+        prompt_tokens = count_tokens(prompt)
+        completion_tokens = count_tokens(completion)
+    telemetry.incr("llm_tokens_total", prompt_tokens, kind="prompt", model=model)
+    telemetry.incr("llm_tokens_total", completion_tokens, kind="completion", model=model)
+
+
+def _strip_code_fence(text):
+    """Remove a surrounding ```json fence, which models sometimes add"""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        text = text.rsplit("```", 1)[0]
+    return text
+
+
+def parse_recipe_response(content):
+    """
+    Parse the model output as JSON (inside a ```json fence or not),
+    returning the raw text if it is not valid JSON
+    """
     try:
-        recipe_json = json.loads(final_recipe.content if hasattr(
-            final_recipe, 'content') else final_recipe)
-        return recipe_json
+        return json.loads(_strip_code_fence(content))
     except Exception:
-        return final_recipe.content if hasattr(final_recipe, 'content') else final_recipe
+        return content
+
+
+def generate_recipe(context, ingredients, openai_api_key, generated_recipes=[], llm=None, variant=None,
+                    context_ids=None):
+    """
+    Generate a recipe from the context (see build_recipe_prompt), or take it
+    from the generation cache. context_ids (see context.context_ids) key the
+    cache on the retrieved recipes instead of the context text.
+    """
+    cache = get_generation_cache()
+    model, temperature = _model_params(llm)
+    # Variants are cached apart: their prompt asks for another style
+    style = variant_style(variant)
+    if cache is not None:
+        cached_recipe = cache.get(model, temperature, ingredients, context,
+                                  exclude=generated_recipes, context_ids=context_ids, variant=style)
+        if cached_recipe is not None:
+            return cached_recipe
+
+    context_prompt = build_recipe_prompt(
+        context, ingredients, generated_recipes, variant)
+    llm = llm or get_llm(openai_api_key)
+    with telemetry.span("llm.generate", model=model, variant=variant or 0):
+        final_recipe = llm.invoke(context_prompt)
+    content = final_recipe.content if hasattr(final_recipe, 'content') else final_recipe
+    _record_token_usage(model, context_prompt, content, getattr(final_recipe, "usage_metadata", None))
+    recipe_json = parse_recipe_response(content)
+
+    if cache is not None:
+        cache.put(model, temperature, ingredients, context, recipe_json, context_ids, variant=style)
+    return recipe_json
+
+
+def _replay_recipe(recipe_json):
+    """Stream events for a recipe that is already complete (e.g. from the cache)"""
+    for key, value in recipe_json.items():
+        if isinstance(value, list):
+            for item in value:
+                yield {"type": "item", "key": key, "value": item}
+        yield {"type": "field", "key": key, "value": value}
+
+
+def stream_recipe(context, ingredients, openai_api_key, generated_recipes=[], llm=None, context_ids=None):
+    """
+    Generate a recipe, yielding events as the tokens arrive.
+
+    Events are dicts with a 'type' key:
+        token: {'text'} - raw text of each chunk
+        field: {'key', 'value'} - a top-level field is complete (e.g. title)
+        item:  {'key', 'value'} - one element of a list field is complete
+               (each ingredient, each step)
+        done:  {'recipe', 'metrics'} - the parsed recipe (or raw text, like
+               generate_recipe) and time_to_first_token_s / total_time_s /
+               cached
+
+    Cached generations (see generate_recipe) are replayed without tokens.
+    """
+    start = time.perf_counter()
+    cache = get_generation_cache()
+    model, temperature = _model_params(llm)
+    if cache is not None:
+        cached_recipe = cache.get(model, temperature, ingredients, context,
+                                  exclude=generated_recipes, context_ids=context_ids)
+        if cached_recipe is not None:
+            yield from _replay_recipe(cached_recipe)
+            elapsed = round(time.perf_counter() - start, 4)
+            yield {"type": "done", "recipe": cached_recipe, "metrics": {
+                "time_to_first_token_s": elapsed, "total_time_s": elapsed, "chunks": 0, "cached": True}}
+            return
+
+    context_prompt = build_recipe_prompt(context, ingredients, generated_recipes)
+    llm = llm or get_llm(openai_api_key)
+    parser = IncrementalJSONParser()
+
+    first_token_at = None
+    chunks = 0
+    usage = None
+    # Like telemetry.span: a stream that raises, or is closed by the
+    # consumer before it ends (GeneratorExit), is recorded as an error
+    status = "error"
+    try:
+        for chunk in llm.stream(context_prompt):
+            usage = getattr(chunk, "usage_metadata", None) or usage
+            text = chunk.content if hasattr(chunk, 'content') else chunk
+            if not text:
+                continue
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            chunks += 1
+            yield {"type": "token", "text": text}
+            for kind, key, value in parser.feed(text):
+                yield {"type": kind, "key": key, "value": value}
+        status = "ok"
+    finally:
+        end = time.perf_counter()
+        metrics = {
+            "time_to_first_token_s": round((first_token_at or end) - start, 4),
+            "total_time_s": round(end - start, 4),
+            "chunks": chunks,
+            "cached": False,
+        }
+        telemetry.record_span("llm.stream", end - start, status, model=model, **metrics)
+    _record_token_usage(model, context_prompt, parser.text, usage)
+    recipe_json = parse_recipe_response(parser.text)
+    if cache is not None:
+        cache.put(model, temperature, ingredients, context, recipe_json, context_ids)
+    yield {"type": "done", "recipe": recipe_json, "metrics": metrics}
+
+
+def get_generation_pool():
+    """Thread pool shared by every concurrent generation in the process"""
+    global _generation_pool
+    with _generation_pool_lock:
+        if _generation_pool is None:
+            _generation_pool = ThreadPoolExecutor(
+                max_workers=LLM_MAX_CONCURRENCY, thread_name_prefix="recipe-llm")
+        return _generation_pool
+
+
+def submit_recipe_generations(context, ingredients, n, openai_api_key=None, generated_recipes=[], llm=None,
+                              first_variant=1, context_ids=None):
+    """Start n generations on the shared pool, each nudged towards a different style"""
+    pool = get_generation_pool()
+    return [
+        pool.submit(generate_recipe, context, ingredients, openai_api_key,
+                    generated_recipes, llm, first_variant + i, context_ids)
+        for i in range(n)
+    ]
+
+
+def generate_recipes(context, ingredients, n, openai_api_key=None, generated_recipes=[], llm=None, timeout=None,
+                     context_ids=None):
+    """
+    Generate n recipe variants concurrently (bounded by LLM_MAX_CONCURRENCY).
+
+    Near-identical results, and results too close to generated_recipes, are
+    dropped, so fewer than n recipes may be returned.
+    """
+    futures = submit_recipe_generations(
+        context, ingredients, n, openai_api_key, generated_recipes, llm, context_ids=context_ids)
+    recipes = []
+    try:
+        for future in as_completed(futures, timeout=timeout):
+            try:
+                recipes.append(future.result())
+            except Exception as e:
+                logger.warning("Recipe generation failed: %s", e)
+    except TimeoutError:
+        # Keep the recipes that did finish
+        logger.warning("%d of %d recipe generations did not finish in %ss",
+                       sum(not future.done() for future in futures), n, timeout)
+    finally:
+        for future in futures:
+            future.cancel()
+    return dedupe_recipes(recipes, generated_recipes)
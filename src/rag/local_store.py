@@ -0,0 +1,1042 @@
+"""
+Embedded vector store: the subset of QdrantClient used by vectorstore.py
+(and langchain's QdrantVectorStore), over memory-mapped numpy arrays. For
+recipe corpora that fit on one machine an exhaustive search costs less
+than a round-trip to a Qdrant server.
+
+Each collection is a directory under the store path:
+
+    meta.json               vector size, distance, precision, sparse vectors,
+                            payload indexes and the current generation
+    vectors-<gen>.f32       row-major matrix of the dense vectors (.i8 with
+                            int8 precision, plus scales-<gen>.f32 holding the
+                            scale of each row), memory-mapped
+    points-<gen>.jsonl      one line per row: point id, payload and sparse
+                            vectors (or a deletion marker)
+
+Rows are only ever appended: upserting an existing point appends a row and
+marks the previous one dead. Once more than COMPACT_DEAD_RATIO of the rows
+are dead the live rows are rewritten into the next generation. Writes
+take an exclusive flock on the collection directory; readers (and writers,
+once they hold the lock) first pick up the rows other processes appended,
+and reload when meta.json names a new generation.
+
+Searches compute the dot products of all the rows (vectors are normalized
+on insert for cosine collections) and keep the top k with argpartition;
+query_batch_points scores several queries in one matrix product. Filters
+on fields with a payload index use in-memory inverted indexes, other
+conditions are evaluated on the payloads.
+
+MirroredClient serves the reads of a remote Qdrant collection from a local
+copy (see vectorstore.get_client for the configuration).
+"""
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are not locked against other processes
+    fcntl = None
+
+import numpy as np
+from qdrant_client.http.models import QueryResponse
+from qdrant_client.hybrid.fusion import distribution_based_score_fusion, reciprocal_rank_fusion
+from qdrant_client.models import (
+    CountResult,
+    Distance,
+    FieldCondition,
+    Filter,
+    Fusion,
+    FusionQuery,
+    HasIdCondition,
+    MatchAny,
+    MatchExcept,
+    MatchValue,
+    Modifier,
+    NearestQuery,
+    PayloadSchemaType,
+    PointIdsList,
+    Record,
+    ScoredPoint,
+    SparseVector,
+    SparseVectorParams,
+    UpdateResult,
+    UpdateStatus,
+    VectorParams,
+)
+
+from src import telemetry
+
+LOCAL_VECTOR_PATH = os.getenv("LOCAL_VECTOR_PATH", ".cache/vectors")
+# float32 or int8 (4x smaller, scores within ~1% of float32)
+LOCAL_VECTOR_PRECISION = os.getenv("LOCAL_VECTOR_PRECISION", "float32").lower()
+COMPACT_DEAD_RATIO = float(os.getenv("LOCAL_COMPACT_DEAD_RATIO", "0.25"))
+# Seconds between two refreshes of a mirrored collection
+MIRROR_REFRESH_SECONDS = float(os.getenv("VECTOR_MIRROR_REFRESH_SECONDS", "300"))
+
+PRECISIONS = {"float32": (np.float32, "f32"), "int8": (np.int8, "i8")}
+# Rows added to the matrix files each time they are full
+GROWTH_ROWS = 1024
+# Rows scored per matrix product (bounds the temporary float32 copies)
+SEARCH_CHUNK_ROWS = 16384
+# Dead rows below which a collection is never compacted
+COMPACT_MIN_DEAD = 256
+# Seconds a write waits for another process to release a collection
+LOCK_TIMEOUT = float(os.getenv("LOCAL_VECTOR_LOCK_TIMEOUT", "10"))
+
+logger = telemetry.get_logger(__name__)
+
+
+def _point_id(point_id):
+    """Point id in the form Qdrant returns it (canonical UUID string or int)"""
+    if isinstance(point_id, str):
+        return str(uuid.UUID(point_id))
+    return int(point_id)
+
+
+def _payload_values(payload, key):
+    """Values of a dotted payload key, arrays flattened (Qdrant's matching semantics)"""
+    values = [payload]
+    for part in key.split("."):
+        nested = []
+        for value in values:
+            if isinstance(value, dict) and part in value:
+                item = value[part]
+                nested.extend(item if isinstance(item, list) else [item])
+        values = nested
+    return values
+
+
+def _select_payload(payload, with_payload):
+    if with_payload is True:
+        return payload
+    if not with_payload:
+        return None
+    selected = {}
+    for key in with_payload:
+        source, target, parts = payload, selected, key.split(".")
+        for part in parts[:-1]:
+            if not isinstance(source, dict) or part not in source:
+                break
+            source = source[part]
+            target = target.setdefault(part, {})
+        else:
+            if isinstance(source, dict) and parts[-1] in source:
+                target[parts[-1]] = source[parts[-1]]
+    return selected
+
+
+class CollectionLockedError(RuntimeError):
+    """Another process kept a collection's write lock for longer than LOCK_TIMEOUT"""
+
+
+class _Collection:
+    """
+    One collection: the matrix files, the payload table and the indexes.
+
+    Writes hold an exclusive flock on the collection directory, so several
+    processes can share a collection: each one catches up with the others'
+    changes (rows appended, a new generation in meta.json) before reading
+    and, under the lock, before writing.
+    """
+
+    def __init__(self, path, meta=None):
+        self.path = path
+        self.meta = meta
+        self._meta_signature = None
+        self._points = None
+        self._lock_depth = 0
+        self._clean_generation = None
+        if meta is None:
+            self._read_meta()
+        self._load()
+
+    # Files
+
+    def _file(self, name, generation=None):
+        generation = self.meta["generation"] if generation is None else generation
+        return os.path.join(self.path, f"{name}-{generation}")
+
+    def _matrix_file(self, generation=None):
+        return self._file("vectors", generation) + f".{self.suffix}"
+
+    def _scales_file(self, generation=None):
+        return self._file("scales", generation) + ".f32"
+
+    def _points_file(self, generation=None):
+        return self._file("points", generation) + ".jsonl"
+
+    @staticmethod
+    def _map(path, dtype, shape):
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        with open(path, "ab") as handle:
+            if handle.tell() < size:
+                handle.truncate(size)
+        return np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+
+    @staticmethod
+    def _map_existing(path, dtype, row_shape):
+        """Map the rows a file already has (another process may be growing it: never resize it)"""
+        row_bytes = int(np.prod(row_shape)) * np.dtype(dtype).itemsize
+        rows = os.path.getsize(path) // row_bytes if os.path.exists(path) else 0
+        if not rows:
+            return np.zeros((0, *row_shape), dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode="r+", shape=(rows, *row_shape))
+
+    def _map_files(self, capacity=None, generation=None):
+        """Map the matrix files, grown to capacity rows (only under the write lock), or as they are"""
+        if capacity is None:
+            self.matrix = self._map_existing(self._matrix_file(generation), self.dtype, (self.dim,))
+            if self.dtype == np.int8:
+                self.scales = self._map_existing(self._scales_file(generation), np.float32, ())
+                self.matrix = self.matrix[:len(self.scales)]
+            capacity = len(self.matrix)
+        else:
+            self.matrix = self._map(self._matrix_file(generation), self.dtype, (capacity, self.dim))
+            if self.dtype == np.int8:
+                self.scales = self._map(self._scales_file(generation), np.float32, (capacity,))
+        live = np.zeros(capacity, dtype=bool)
+        live[:len(self.live)] = self.live[:capacity]
+        self.live = live
+
+    def _read_meta(self):
+        meta_file = os.path.join(self.path, "meta.json")
+        signature = self._stat_meta()
+        with open(meta_file) as handle:
+            self.meta = json.load(handle)
+        self._meta_signature = signature
+
+    def _stat_meta(self):
+        stat = os.stat(os.path.join(self.path, "meta.json"))
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _write_meta(self):
+        temporary = os.path.join(self.path, "meta.json.tmp")
+        with open(temporary, "w") as handle:
+            json.dump(self.meta, handle)
+        os.replace(temporary, os.path.join(self.path, "meta.json"))
+        self._meta_signature = self._stat_meta()
+
+    def _load(self):
+        """Rebuild the in-memory state from the files of the current generation"""
+        meta = self.meta
+        self.dim = meta["size"]
+        self.dtype, self.suffix = PRECISIONS[meta["precision"]]
+        self.cosine = meta["distance"] == Distance.COSINE
+        self.sparse_names = list(meta["sparse_vectors"])
+        self.ids = []
+        self.payloads = []
+        self.sparse = []
+        self.rows = {}
+        self.live = np.zeros(0, dtype=bool)
+        self.live_count = 0
+        # Live rows having each sparse vector (the corpus size of its IDF)
+        self.sparse_counts = dict.fromkeys(self.sparse_names, 0)
+        self.postings = {name: {} for name in self.sparse_names}
+        self._posting_arrays = {}
+        self.keyword_indexes = {field: {} for field in meta["payload_indexes"]}
+        self.matrix = self.scales = None
+        self._points_offset = 0
+        self._close_points()
+        self._read_points()
+
+    def _read_points(self):
+        """Register the complete rows appended to the points file since the last read"""
+        entries = []
+        points_file = self._points_file()
+        try:
+            size = os.path.getsize(points_file)
+        except FileNotFoundError:
+            size = None
+        if size is not None and size > self._points_offset:
+            with open(points_file, "rb") as handle:
+                handle.seek(self._points_offset)
+                for line in handle:
+                    if not line.endswith(b"\n"):
+                        break  # a torn write, or a row another process is writing
+                    entries.append(json.loads(line))
+                    self._points_offset += len(line)
+        elif size is None and self._meta_signature is not None:
+            # Removed by a compaction in another process since meta.json was read
+            raise FileNotFoundError(points_file)
+        if self.matrix is None or len(self.ids) + len(entries) > len(self.matrix):
+            # The vectors of a row are written before the row, so they are in the files by now
+            self._map_files()
+        for entry in entries:
+            self._append_entry(entry)
+
+    def refresh(self):
+        """Catch up with the writes of other processes"""
+        if self._lock_depth:
+            return
+        if self._stat_meta() == self._meta_signature:
+            self._read_points()
+            return
+        for attempt in range(3):
+            self._read_meta()
+            try:
+                self._load()
+                return
+            except FileNotFoundError:
+                if attempt == 2:
+                    raise
+
+    @contextmanager
+    def _writing(self):
+        """
+        Hold the collection's write lock (waiting up to LOCK_TIMEOUT for
+        another process to release it), caught up with the files
+        """
+        if self._lock_depth:
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+            return
+        fd = os.open(self.path, os.O_RDONLY)
+        try:
+            if fcntl is not None:
+                deadline = time.monotonic() + LOCK_TIMEOUT
+                while True:
+                    try:
+                        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        break
+                    except BlockingIOError:
+                        if time.monotonic() > deadline:
+                            raise CollectionLockedError(
+                                f"{self.path} is locked by another process") from None
+                        time.sleep(0.01)
+            if self._meta_signature is not None:  # None while the collection is being created
+                self.refresh()
+            self._lock_depth = 1
+            self._prepare_writes()
+            yield
+        finally:
+            self._lock_depth = 0
+            self._close_points()
+            os.close(fd)  # releases the flock
+
+    def _prepare_writes(self):
+        """Under the write lock: drop a torn last row and the files no generation uses anymore"""
+        points_file = self._points_file()
+        with open(points_file, "ab") as handle:
+            handle.truncate(self._points_offset)
+        self._points = open(points_file, "ab")
+        if self._clean_generation != self.meta["generation"]:
+            # Files of other generations are leftovers of an interrupted (or earlier) compaction
+            current = {os.path.basename(name) for name in
+                       (self._matrix_file(), self._scales_file(), points_file)}
+            for name in os.listdir(self.path):
+                if name != "meta.json" and name not in current:
+                    os.remove(os.path.join(self.path, name))
+            self._clean_generation = self.meta["generation"]
+
+    def _close_points(self):
+        if self._points is not None:
+            self._points.close()
+            self._points = None
+
+    # Writes
+
+    def _append_entry(self, entry):
+        """Register a row of the points file (the vector is already in the matrix)"""
+        point_id = entry["id"]
+        previous = self.rows.pop(point_id, None)
+        if previous is not None:
+            self.live[previous] = False
+            self.live_count -= 1
+            for name, (indices, _) in self.sparse[previous].items():
+                if indices:
+                    self.sparse_counts[name] -= 1
+        row = len(self.ids)
+        self.ids.append(point_id)
+        if entry.get("deleted"):
+            self.payloads.append(None)
+            self.sparse.append(None)
+            return
+        payload = entry.get("payload") or {}
+        self.payloads.append(payload)
+        self.sparse.append(entry.get("sparse") or {})
+        self.rows[point_id] = row
+        self.live[row] = True
+        self.live_count += 1
+        for name, (indices, values) in self.sparse[row].items():
+            if indices:
+                self.sparse_counts[name] = self.sparse_counts.get(name, 0) + 1
+            postings = self.postings.setdefault(name, {})
+            for index, value in zip(indices, values):
+                postings.setdefault(index, ([], []))
+                postings[index][0].append(row)
+                postings[index][1].append(value)
+        for field, index in self.keyword_indexes.items():
+            for value in _payload_values(payload, field):
+                if isinstance(value, (str, int)):
+                    index.setdefault(value, []).append(row)
+        self._posting_arrays.clear()
+
+    def _reserve(self, count):
+        needed = len(self.ids) + count
+        if needed > len(self.matrix):
+            if isinstance(self.matrix, np.memmap):
+                self.matrix.flush()
+            self._map_files(max(needed, len(self.matrix) + GROWTH_ROWS))
+
+    def _encode(self, vectors):
+        if self.cosine:
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.where(norms == 0, 1, norms)
+        if self.dtype != np.int8:
+            return vectors.astype(np.float32), None
+        scales = np.abs(vectors).max(axis=1) / 127
+        scales[scales == 0] = 1
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+    def upsert(self, points):
+        dense, entries = [], []
+        for point in points:
+            vector = point.vector
+            sparse = {}
+            if isinstance(vector, dict):
+                for name, value in vector.items():
+                    if isinstance(value, SparseVector):
+                        sparse[name] = [list(value.indices), list(value.values)]
+                vector = vector.get("")
+            if vector is None or len(vector) != self.dim:
+                raise ValueError(f"Expected a dense vector of size {self.dim}")
+            dense.append(vector)
+            entries.append({"id": _point_id(point.id), "payload": point.payload or {}, "sparse": sparse})
+        if not entries:
+            return
+        encoded, scales = self._encode(np.asarray(dense, dtype=np.float32))
+        with self._writing():
+            self._reserve(len(entries))
+            start = len(self.ids)
+            self.matrix[start:start + len(entries)] = encoded
+            if scales is not None:
+                self.scales[start:start + len(entries)] = scales
+                self.scales.flush()
+            # Vectors first: rows past the end of the points file are ignored on load
+            self.matrix.flush()
+            self._write_entries(entries)
+
+    def delete(self, point_ids):
+        with self._writing():
+            entries = [{"id": point_id, "deleted": True} for point_id in map(_point_id, point_ids)
+                       if point_id in self.rows]
+            if entries:
+                self._reserve(len(entries))
+                self._write_entries(entries)
+
+    def _write_entries(self, entries):
+        data = "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries).encode("utf-8")
+        self._points.write(data)
+        self._points.flush()
+        self._points_offset += len(data)
+        for entry in entries:
+            self._append_entry(entry)
+        dead = len(self.ids) - self.live_count
+        if dead >= COMPACT_MIN_DEAD and dead > COMPACT_DEAD_RATIO * len(self.ids):
+            self.compact()
+
+    def compact(self):
+        """Rewrite the live rows into the next generation of files"""
+        with self._writing():
+            rows = np.flatnonzero(self.live[:len(self.ids)])
+            generation = self.meta["generation"] + 1
+            with telemetry.span("local_store.compact", rows=len(self.ids), live=len(rows)):
+                matrix = self._map(self._matrix_file(generation), self.dtype,
+                                   (max(GROWTH_ROWS, len(rows)), self.dim))
+                matrix[:len(rows)] = self.matrix[rows]
+                matrix.flush()
+                if self.scales is not None:
+                    scales = self._map(self._scales_file(generation), np.float32, (len(matrix),))
+                    scales[:len(rows)] = self.scales[rows]
+                    scales.flush()
+                with open(self._points_file(generation), "w", encoding="utf-8") as handle:
+                    for row in rows:
+                        handle.write(json.dumps({"id": self.ids[row], "payload": self.payloads[row],
+                                                 "sparse": self.sparse[row]}, ensure_ascii=False) + "\n")
+                self.meta["generation"] = generation
+                self._write_meta()
+                self._load()
+                self._prepare_writes()
+
+    def add_keyword_index(self, field):
+        with self._writing():
+            if field in self.keyword_indexes:
+                return
+            index = self.keyword_indexes[field] = {}
+            for row in np.flatnonzero(self.live[:len(self.ids)]):
+                for value in _payload_values(self.payloads[row], field):
+                    if isinstance(value, (str, int)):
+                        index.setdefault(value, []).append(int(row))
+            self.meta["payload_indexes"].append(field)
+            self._write_meta()
+
+    def close(self):
+        if isinstance(self.matrix, np.memmap):
+            self.matrix.flush()
+        self._close_points()
+
+    # Reads
+
+    def vector(self, row):
+        vector = np.asarray(self.matrix[row], dtype=np.float32)
+        if self.scales is not None:
+            vector = vector * self.scales[row]
+        return vector.tolist()
+
+    def vectors_of(self, row):
+        dense = self.vector(row)
+        if not self.sparse_names:
+            return dense
+        vectors = {"": dense}
+        for name in self.sparse_names:
+            indices, values = self.sparse[row].get(name, ([], []))
+            vectors[name] = SparseVector(indices=indices, values=values)
+        return vectors
+
+    def live_rows(self):
+        return np.flatnonzero(self.live[:len(self.ids)])
+
+    def _condition_mask(self, condition):
+        n = len(self.ids)
+        if isinstance(condition, Filter):
+            return self.filter_mask(condition)
+        if isinstance(condition, HasIdCondition):
+            mask = np.zeros(n, dtype=bool)
+            rows = [self.rows[point_id] for point_id in map(_point_id, condition.has_id) if point_id in self.rows]
+            mask[rows] = True
+            return mask
+        if not isinstance(condition, FieldCondition):
+            raise ValueError(f"Condition not supported by the local store: {type(condition).__name__}")
+        match = condition.match
+        if isinstance(match, (MatchValue, MatchAny)):
+            wanted = [match.value] if isinstance(match, MatchValue) else match.any
+            index = self.keyword_indexes.get(condition.key)
+            mask = np.zeros(n, dtype=bool)
+            if index is not None:
+                for value in wanted:
+                    mask[index.get(value, [])] = True
+                return mask
+            wanted = set(wanted)
+            for row in self.live_rows():
+                mask[row] = not wanted.isdisjoint(_payload_values(self.payloads[row], condition.key))
+            return mask
+        if isinstance(match, MatchExcept):
+            excluded = set(match.except_)
+            mask = np.zeros(n, dtype=bool)
+            for row in self.live_rows():
+                values = _payload_values(self.payloads[row], condition.key)
+                mask[row] = any(value not in excluded for value in values)
+            return mask
+        if condition.range is not None:
+            bounds = condition.range
+            mask = np.zeros(n, dtype=bool)
+            for row in self.live_rows():
+                mask[row] = any(
+                    isinstance(value, (int, float))
+                    and (bounds.gt is None or value > bounds.gt) and (bounds.gte is None or value >= bounds.gte)
+                    and (bounds.lt is None or value < bounds.lt) and (bounds.lte is None or value <= bounds.lte)
+                    for value in _payload_values(self.payloads[row], condition.key))
+            return mask
+        raise ValueError(f"Condition on '{condition.key}' not supported by the local store")
+
+    def filter_mask(self, query_filter):
+        """Boolean mask of the live rows matching a Filter (None for no filter)"""
+        mask = self.live[:len(self.ids)].copy()
+        if query_filter is None:
+            return mask
+        for condition in query_filter.must or []:
+            mask &= self._condition_mask(condition)
+        if query_filter.should:
+            should = np.zeros_like(mask)
+            for condition in query_filter.should:
+                should |= self._condition_mask(condition)
+            mask &= should
+        for condition in query_filter.must_not or []:
+            mask &= ~self._condition_mask(condition)
+        return mask
+
+    def dense_scores(self, queries, rows=None):
+        """(rows, queries) dot products of the stored vectors, in chunks"""
+        count = len(self.ids) if rows is None else len(rows)
+        scores = np.empty((count, len(queries)), dtype=np.float32)
+        for start in range(0, count, SEARCH_CHUNK_ROWS):
+            stop = min(start + SEARCH_CHUNK_ROWS, count)
+            selected = slice(start, stop) if rows is None else rows[start:stop]
+            chunk = np.asarray(self.matrix[selected], dtype=np.float32)
+            scores[start:stop] = chunk @ queries.T
+            if self.scales is not None:
+                scores[start:stop] *= np.asarray(self.scales[selected])[:, None]
+        return scores
+
+    def _posting(self, name, index):
+        key = (name, index)
+        arrays = self._posting_arrays.get(key)
+        if arrays is None:
+            rows, values = self.postings.get(name, {}).get(index, ([], []))
+            arrays = self._posting_arrays[key] = (np.asarray(rows, dtype=np.int64),
+                                                  np.asarray(values, dtype=np.float32))
+        return arrays
+
+    def sparse_scores(self, name, query, mask):
+        """
+        Scores of the rows sharing a term with a sparse query, the query
+        weighted by IDF like Qdrant does for Modifier.IDF vectors
+        """
+        live = self.live[:len(self.ids)]
+        corpus = self.sparse_counts.get(name, 0)
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        matched = np.zeros(len(self.ids), dtype=bool)
+        idf = self.meta["sparse_vectors"].get(name) == "idf"
+        for index, value in zip(query.indices, query.values):
+            rows, values = self._posting(name, index)
+            rows_live = live[rows]
+            if idf:
+                frequency = int(rows_live.sum())
+                value *= np.log((corpus - frequency + 0.5) / (frequency + 0.5) + 1)
+            np.add.at(scores, rows, value * values)
+            matched[rows[rows_live]] = True
+        rows = np.flatnonzero(matched & mask)
+        return rows, scores[rows]
+
+
+def _top_k(rows, scores, limit, offset=0, score_threshold=None):
+    """(row, score) of the best scores, best first"""
+    if score_threshold is not None:
+        keep = scores >= score_threshold
+        rows, scores = rows[keep], scores[keep]
+    wanted = min(limit + offset, len(scores))
+    if wanted == 0:
+        return []
+    if wanted < len(scores):
+        best = np.argpartition(-scores, wanted - 1)[:wanted]
+    else:
+        best = np.arange(len(scores))
+    best = best[np.argsort(-scores[best], kind="stable")][offset:]
+    return list(zip(rows[best].tolist(), scores[best].tolist()))
+
+
+class LocalVectorStore:
+    """
+    Collections stored under path, with the QdrantClient methods the repo
+    uses (query_points, query_batch_points, upsert, scroll, retrieve, ...).
+    Calls are serialized with a lock.
+    """
+
+    def __init__(self, path=LOCAL_VECTOR_PATH, precision=LOCAL_VECTOR_PRECISION):
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown precision '{precision}', expected one of {tuple(PRECISIONS)}")
+        self.path = path
+        self.precision = precision
+        self._collections = {}
+        self._lock = threading.RLock()
+        os.makedirs(path, exist_ok=True)
+
+    def _collection_path(self, collection_name):
+        return os.path.join(self.path, collection_name)
+
+    def _get(self, collection_name):
+        """The collection, caught up with the writes of other processes"""
+        collection = self._collections.get(collection_name)
+        try:
+            if collection is None:
+                collection = self._collections[collection_name] = _Collection(
+                    self._collection_path(collection_name))
+            else:
+                collection.refresh()
+        except FileNotFoundError:
+            # Deleted (possibly by another process)
+            self._collections.pop(collection_name, None)
+            raise ValueError(f"Collection {collection_name} not found") from None
+        return collection
+
+    # Collections
+
+    def collection_exists(self, collection_name):
+        with self._lock:
+            return os.path.exists(os.path.join(self._collection_path(collection_name), "meta.json"))
+
+    def create_collection(self, collection_name, vectors_config, sparse_vectors_config=None, **kwargs):
+        """Create a collection (HNSW, quantization and storage options do not apply)"""
+        if isinstance(vectors_config, dict):
+            vectors_config = vectors_config.get("")
+        if vectors_config is None:
+            raise ValueError("The local store needs the unnamed dense vector")
+        if vectors_config.distance not in (Distance.COSINE, Distance.DOT):
+            raise ValueError(f"Distance {vectors_config.distance} is not supported by the local store")
+        with self._lock:
+            if self.collection_exists(collection_name):
+                raise ValueError(f"Collection {collection_name} already exists")
+            sparse_vectors = {name: "idf" if getattr(params, "modifier", None) == "idf" else "none"
+                              for name, params in (sparse_vectors_config or {}).items()}
+            os.makedirs(self._collection_path(collection_name), exist_ok=True)
+            meta = {"size": vectors_config.size, "distance": vectors_config.distance.value,
+                    "precision": self.precision, "sparse_vectors": sparse_vectors,
+                    "payload_indexes": [], "generation": 0}
+            collection = _Collection(self._collection_path(collection_name), meta)
+            with collection._writing():
+                if self.collection_exists(collection_name):
+                    raise ValueError(f"Collection {collection_name} already exists")
+                collection._write_meta()
+            self._collections[collection_name] = collection
+            return True
+
+    def delete_collection(self, collection_name, **kwargs):
+        with self._lock:
+            collection = self._collections.pop(collection_name, None)
+            if collection is not None:
+                collection.close()
+            if not self.collection_exists(collection_name):
+                return False
+            collection = collection or _Collection(self._collection_path(collection_name))
+            with collection._writing():
+                shutil.rmtree(self._collection_path(collection_name))
+            return True
+
+    def get_collection(self, collection_name):
+        """Collection info with the fields read by the repo and langchain (config.params, points_count)"""
+        with self._lock:
+            collection = self._get(collection_name)
+            meta = collection.meta
+            sparse_vectors = {name: SparseVectorParams(modifier=Modifier.IDF if modifier == "idf" else None)
+                              for name, modifier in meta["sparse_vectors"].items()}
+            params = SimpleNamespace(
+                vectors=VectorParams(size=meta["size"], distance=Distance(meta["distance"])),
+                sparse_vectors=sparse_vectors or None)
+            return SimpleNamespace(config=SimpleNamespace(params=params),
+                                   points_count=collection.live_count, payload_schema={
+                                       field: PayloadSchemaType.KEYWORD for field in meta["payload_indexes"]})
+
+    def create_payload_index(self, collection_name, field_name, field_schema=None, **kwargs):
+        """Keyword and integer fields get an inverted index; other schemas are matched on the payloads"""
+        if field_schema not in (PayloadSchemaType.KEYWORD, PayloadSchemaType.INTEGER, "keyword", "integer"):
+            return UpdateResult(status=UpdateStatus.COMPLETED)
+        with self._lock:
+            self._get(collection_name).add_keyword_index(field_name)
+        return UpdateResult(status=UpdateStatus.COMPLETED)
+
+    def compact(self, collection_name):
+        with self._lock:
+            self._get(collection_name).compact()
+
+    def close(self, **kwargs):
+        with self._lock:
+            for collection in self._collections.values():
+                collection.close()
+            self._collections.clear()
+
+    # Points
+
+    def upsert(self, collection_name, points, wait=True, **kwargs):
+        with self._lock:
+            self._get(collection_name).upsert(points)
+        return UpdateResult(status=UpdateStatus.COMPLETED)
+
+    def delete(self, collection_name, points_selector, wait=True, **kwargs):
+        """Delete points by id (a list of ids or PointIdsList)"""
+        if isinstance(points_selector, PointIdsList):
+            points_selector = points_selector.points
+        if not isinstance(points_selector, (list, tuple)):
+            raise ValueError("The local store only deletes points by id")
+        with self._lock:
+            self._get(collection_name).delete(points_selector)
+        return UpdateResult(status=UpdateStatus.COMPLETED)
+
+    def count(self, collection_name, count_filter=None, exact=True, **kwargs):
+        with self._lock:
+            return CountResult(count=int(self._get(collection_name).filter_mask(count_filter).sum()))
+
+    @staticmethod
+    def _record(collection, row, with_payload, with_vectors, score=None):
+        fields = {"id": collection.ids[row],
+                  "payload": _select_payload(collection.payloads[row], with_payload),
+                  "vector": collection.vectors_of(row) if with_vectors else None}
+        if score is None:
+            return Record(**fields)
+        return ScoredPoint(version=0, score=score, **fields)
+
+    def retrieve(self, collection_name, ids, with_payload=True, with_vectors=False, **kwargs):
+        with self._lock:
+            collection = self._get(collection_name)
+            rows = [collection.rows[point_id] for point_id in map(_point_id, ids) if point_id in collection.rows]
+            return [self._record(collection, row, with_payload, with_vectors) for row in rows]
+
+    def scroll(self, collection_name, scroll_filter=None, limit=10, offset=None, with_payload=True,
+               with_vectors=False, **kwargs):
+        """Points in insertion order; the offset is a row number"""
+        with self._lock:
+            collection = self._get(collection_name)
+            rows = np.flatnonzero(collection.filter_mask(scroll_filter))
+            rows = rows[rows >= (offset or 0)]
+            next_offset = int(rows[limit]) if len(rows) > limit else None
+            return ([self._record(collection, int(row), with_payload, with_vectors) for row in rows[:limit]],
+                    next_offset)
+
+    def _search(self, collection, query, using, query_filter, limit, offset=0, score_threshold=None):
+        """[(row, score)] of one dense or sparse query"""
+        if isinstance(query, NearestQuery):
+            query = query.nearest
+        mask = collection.filter_mask(query_filter)
+        if isinstance(query, SparseVector):
+            if using not in collection.sparse_names:
+                raise ValueError(f"Collection has no sparse vector named '{using}'")
+            rows, scores = collection.sparse_scores(using, query, mask)
+            return _top_k(rows, scores, limit, offset, score_threshold)
+        if using not in (None, ""):
+            raise ValueError(f"Collection has no dense vector named '{using}'")
+        return self._dense_search(collection, np.asarray([query], dtype=np.float32), mask,
+                                  limit, offset, score_threshold)[0]
+
+    @staticmethod
+    def _dense_search(collection, queries, mask, limit, offset=0, score_threshold=None):
+        """Top rows of each query: one pass over the rows for the whole batch"""
+        if collection.cosine:
+            norms = np.linalg.norm(queries, axis=1, keepdims=True)
+            queries = queries / np.where(norms == 0, 1, norms)
+        if mask.all():
+            rows, scores = np.arange(len(mask)), collection.dense_scores(queries)
+        else:
+            rows = np.flatnonzero(mask)
+            scores = collection.dense_scores(queries, rows)
+        return [_top_k(rows, scores[:, column], limit, offset, score_threshold)
+                for column in range(len(queries))]
+
+    @staticmethod
+    def _merge_filters(*filters):
+        filters = [query_filter for query_filter in filters if query_filter is not None]
+        if len(filters) < 2:
+            return filters[0] if filters else None
+        return Filter(must=filters)
+
+    def _query(self, collection, query=None, using=None, prefetch=None, query_filter=None, limit=10,
+               offset=None, with_payload=True, with_vectors=False, score_threshold=None, **kwargs):
+        offset = offset or 0
+        if prefetch:
+            if not isinstance(query, FusionQuery):
+                raise ValueError("The local store only combines prefetches with a fusion query")
+            prefetches = prefetch if isinstance(prefetch, list) else [prefetch]
+            responses = []
+            for branch in prefetches:
+                if branch.prefetch:
+                    raise ValueError("Nested prefetches are not supported by the local store")
+                results = self._search(collection, branch.query, branch.using,
+                                       self._merge_filters(query_filter, branch.filter), branch.limit or 10)
+                responses.append([ScoredPoint(id=row, version=0, score=score) for row, score in results])
+            fuse = reciprocal_rank_fusion if query.fusion == Fusion.RRF else distribution_based_score_fusion
+            fused = fuse(responses, limit=limit + offset)[offset:]
+            results = [(point.id, point.score) for point in fused
+                       if score_threshold is None or point.score >= score_threshold]
+        else:
+            results = self._search(collection, query, using, query_filter, limit, offset, score_threshold)
+        return QueryResponse(points=[self._record(collection, row, with_payload, with_vectors, score)
+                                     for row, score in results])
+
+    def query_points(self, collection_name, query=None, **kwargs):
+        """Dense, sparse or fused (RRF/DBSF over prefetches) search; search_params are ignored"""
+        with self._lock:
+            return self._query(self._get(collection_name), query, **kwargs)
+
+    def query_batch_points(self, collection_name, requests, **kwargs):
+        """
+        Run QueryRequests; the unfiltered dense ones with the same parameters
+        are scored together in one matrix product
+        """
+        with self._lock:
+            collection = self._get(collection_name)
+            responses = [None] * len(requests)
+            groups = {}
+            for position, request in enumerate(requests):
+                query = request.query.nearest if isinstance(request.query, NearestQuery) else request.query
+                if (isinstance(query, list) and not request.prefetch and request.filter is None
+                        and request.using in (None, "")):
+                    key = (request.limit or 10, request.offset or 0, request.score_threshold)
+                    groups.setdefault(key, []).append((position, query))
+                    continue
+                responses[position] = self._query(
+                    collection, request.query, using=request.using, prefetch=request.prefetch,
+                    query_filter=request.filter, limit=request.limit or 10, offset=request.offset,
+                    with_payload=request.with_payload if request.with_payload is not None else False,
+                    with_vectors=request.with_vector or False, score_threshold=request.score_threshold)
+            mask = collection.filter_mask(None)
+            for (limit, offset, threshold), batch in groups.items():
+                queries = np.asarray([query for _, query in batch], dtype=np.float32)
+                for (position, _), results in zip(batch, self._dense_search(
+                        collection, queries, mask, limit, offset, threshold)):
+                    request = requests[position]
+                    responses[position] = QueryResponse(points=[
+                        self._record(collection, row, request.with_payload or False,
+                                     request.with_vector or False, score) for row, score in results])
+            return responses
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def open_store(path=LOCAL_VECTOR_PATH, precision=LOCAL_VECTOR_PRECISION):
+    """The shared LocalVectorStore of a directory (one writer per path)"""
+    key = os.path.realpath(path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = LocalVectorStore(path, precision)
+        return store
+
+
+class MirroredClient:
+    """
+    Read-through mirror of a remote Qdrant client. Writes go to the remote
+    and then to the local copy; reads of a collection are served locally
+    once it has been copied (on its first read), and the copy is refreshed
+    in the background every refresh_seconds. Points whose content hash did
+    not change are not transferred again. While the remote is unreachable
+    the local copy keeps serving reads.
+    """
+
+    READS = ("query_points", "query_batch_points", "scroll", "retrieve", "count", "get_collection")
+
+    def __init__(self, remote, local, refresh_seconds=MIRROR_REFRESH_SECONDS, hash_key="content_hash",
+                 batch_size=256):
+        self.remote = remote
+        self.local = local
+        self.refresh_seconds = refresh_seconds
+        self.hash_key = hash_key
+        self.batch_size = batch_size
+        self._synced = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        if name not in self.READS:
+            return getattr(self.remote, name)
+
+        def read(collection_name, *args, **kwargs):
+            client = self.local if self._ensure_mirrored(collection_name) else self.remote
+            return getattr(client, name)(collection_name, *args, **kwargs)
+        return read
+
+    def _ensure_mirrored(self, collection_name):
+        """Whether reads of the collection can be served locally"""
+        synced_at = self._synced.get(collection_name)
+        if synced_at is None:
+            with self._lock:
+                if collection_name not in self._synced:
+                    try:
+                        self.sync(collection_name)
+                    except Exception as e:
+                        if not self.local.collection_exists(collection_name):
+                            raise
+                        logger.warning("Serving '%s' from the local mirror, sync failed: %s", collection_name, e)
+                        telemetry.incr("vector_mirror_stale_reads_total", collection=collection_name)
+                        return True
+            return collection_name in self._synced
+        if time.monotonic() - synced_at > self.refresh_seconds and collection_name not in self._refreshing:
+            self._refreshing.add(collection_name)
+            threading.Thread(target=self._refresh, args=(collection_name,),
+                             name=f"vector-mirror-{collection_name}", daemon=True).start()
+        return True
+
+    def _refresh(self, collection_name):
+        try:
+            with self._lock:
+                self.sync(collection_name)
+        except Exception as e:
+            logger.warning("Refreshing the mirror of '%s' failed: %s", collection_name, e)
+        finally:
+            self._refreshing.discard(collection_name)
+
+    def _remote_hashes(self, collection_name):
+        hashes, offset = {}, None
+        while True:
+            points, offset = self.remote.scroll(collection_name=collection_name, limit=self.batch_size,
+                                                offset=offset, with_payload=[self.hash_key], with_vectors=False)
+            for point in points:
+                hashes[_point_id(point.id)] = (point.payload or {}).get(self.hash_key)
+            if offset is None:
+                return hashes
+
+    def _local_hashes(self, collection_name):
+        collection = self.local._get(collection_name)
+        return {collection.ids[row]: collection.payloads[row].get(self.hash_key)
+                for row in collection.live_rows()}
+
+    def _create_local(self, collection_name):
+        params = self.remote.get_collection(collection_name).config.params
+        if self.local.collection_exists(collection_name):
+            local_params = self.local.get_collection(collection_name).config.params
+            if (local_params.vectors.size == params.vectors.size
+                    and set(local_params.sparse_vectors or {}) == set(params.sparse_vectors or {})):
+                return
+            self.local.delete_collection(collection_name)
+        self.local.create_collection(collection_name, vectors_config=params.vectors,
+                                     sparse_vectors_config=params.sparse_vectors)
+
+    def sync(self, collection_name):
+        """Copy the new and changed points of the remote collection, and drop the deleted ones"""
+        with telemetry.span("vector_mirror.sync", collection=collection_name) as sync:
+            if not self.remote.collection_exists(collection_name):
+                self._synced.pop(collection_name, None)
+                return
+            self._create_local(collection_name)
+            remote = self._remote_hashes(collection_name)
+            local = self._local_hashes(collection_name)
+            changed = [point_id for point_id, digest in remote.items()
+                       if point_id not in local or digest is None or local[point_id] != digest]
+            for start in range(0, len(changed), self.batch_size):
+                points = self.remote.retrieve(collection_name, changed[start:start + self.batch_size],
+                                              with_payload=True, with_vectors=True)
+                self.local.upsert(collection_name, points)
+            deleted = [point_id for point_id in local if point_id not in remote]
+            self.local.delete(collection_name, deleted)
+            payload_schema = self.remote.get_collection(collection_name).payload_schema or {}
+            for field, info in payload_schema.items():
+                self.local.create_payload_index(collection_name, field, getattr(info, "data_type", info))
+            sync.set(points=len(remote), copied=len(changed), deleted=len(deleted))
+            self._synced[collection_name] = time.monotonic()
+
+    def upsert(self, collection_name, points, **kwargs):
+        result = self.remote.upsert(collection_name=collection_name, points=points, **kwargs)
+        if collection_name in self._synced:
+            self.local.upsert(collection_name, points)
+        return result
+
+    def delete(self, collection_name, points_selector, **kwargs):
+        result = self.remote.delete(collection_name=collection_name, points_selector=points_selector, **kwargs)
+        if collection_name in self._synced:
+            self.local.delete(collection_name, points_selector)
+        return result
+
+    def create_payload_index(self, collection_name, field_name, field_schema=None, **kwargs):
+        result = self.remote.create_payload_index(collection_name=collection_name, field_name=field_name,
+                                                  field_schema=field_schema, **kwargs)
+        if collection_name in self._synced:
+            self.local.create_payload_index(collection_name, field_name, field_schema)
+        return result
+
+    def delete_collection(self, collection_name, **kwargs):
+        self._synced.pop(collection_name, None)
+        if self.local.collection_exists(collection_name):
+            self.local.delete_collection(collection_name)
+        return self.remote.delete_collection(collection_name=collection_name, **kwargs)
+
+    def collection_exists(self, collection_name):
+        if collection_name in self._synced:
+            return True
+        try:
+            return self.remote.collection_exists(collection_name)
+        except Exception:
+            if self.local.collection_exists(collection_name):
+                return True
+            raise
+
+    def close(self, **kwargs):
+        self.remote.close()
@@ -0,0 +1,292 @@
+"""
+Nutrition facts of generated recipes, computed from a local nutrient table
+(nutrition_data.py) instead of asking the model for them.
+
+Each ingredient line of a recipe ("150 g de tomate picado", "3 ovos
+(150 g)", "2 colheres de sopa de azeite") is parsed into a weight in grams
+and a food of the table. Foods are resolved through an index built once
+with the table: exact names and aliases, the longest known phrase in the
+line, then character-trigram similarity for misspellings and variants.
+The nutrients of every line are then computed in one matrix product.
+
+NUTRITION_TABLE can point to a CSV file with the columns of
+nutrition_data.py (aliases separated by '|') to use a larger table.
+"""
+import csv
+import os
+import re
+import threading
+from functools import lru_cache
+
+import numpy as np
+
+from src import telemetry
+from src.rag.nutrition_data import NUTRIENT_FOODS
+
+NUTRITION_TABLE = os.getenv("NUTRITION_TABLE")
+
+# (key, label, unit) of each nutrient column, in table order
+NUTRIENTS = [
+    ("calories_kcal", "Calorias", "kcal"),
+    ("protein_g", "Proteínas", "g"),
+    ("carbs_g", "Carboidratos", "g"),
+    ("fat_g", "Gorduras", "g"),
+    ("fiber_g", "Fibras", "g"),
+    ("sodium_mg", "Sódio", "mg"),
+]
+
+# Minimum trigram (Dice) similarity of a fuzzy match
+FUZZY_THRESHOLD = 0.6
+
+# Grams per unit of weight or volume (liquids counted at 1 g/ml)
+WEIGHT_UNITS = {"mg": 0.001, "g": 1, "grama": 1, "kg": 1000, "quilo": 1000,
+                "ml": 1, "l": 1000, "litro": 1000}
+# Approximate grams of household measures, for lines the model did not weigh
+MEASURES = {"colher de sopa": 15, "colher de cha": 5, "colher de sobremesa": 10,
+            "xicara": 240, "copo": 200, "pitada": 0.5, "fatia": 25, "lata": 300}
+
+# Words that say how an ingredient is prepared or measured, not what it is
+QUALIFIERS = {
+    "de", "do", "da", "dos", "das", "em", "com", "a", "o", "e", "para", "ou",
+    "picado", "picada", "ralado", "ralada", "fatiado", "fatiada", "cortado",
+    "cortada", "cubo", "cubinho", "rodela", "tira", "pedaco", "fresco",
+    "fresca", "maduro", "madura", "grande", "medio", "media", "pequeno",
+    "pequena", "gosto", "opcional", "aproximadamente", "cerca", "unidade",
+    "inteiro", "inteira", "amassado", "amassada", "derretido", "derretida",
+    "escorrido", "escorrida", "lavado", "lavada", "descascado", "descascada",
+    "moida", "fino", "fina", "bem", "untar", "polvilhar", "servir", "dente",
+    "folha", "ramo", "maco", "punhado", "colher", "sopa", "cha", "xicara",
+    "copo", "pitada", "fatia", "lata", *WEIGHT_UNITS,
+}
+
+_ACCENTS = str.maketrans("áàâãäéèêëíìîïóòôõöúùûüç", "aaaaaeeeeiiiiooooouuuuc")
+_NUMBER = r"(\d+(?:[.,]\d+)?(?:\s*/\s*\d+)?)"
+_WEIGHT = re.compile(_NUMBER + r"\s*(mg|kg|g|gramas?|quilos?|ml|l|litros?)\b")
+_LEADING_COUNT = re.compile(r"^\s*" + _NUMBER + r"\b")
+_WORD_NUMBERS = {"meio": 0.5, "meia": 0.5, "um": 1, "uma": 1, "dois": 2, "duas": 2, "tres": 3}
+_PARENTHETICAL = re.compile(r"\([^)]*\)")
+# A comma that is not a decimal separator ("1,5 kg")
+_LIST_COMMA = re.compile(r",(?!\d)")
+_NON_WORD = re.compile(r"[^a-z0-9 ]+")
+
+logger = telemetry.get_logger(__name__)
+
+
+def _number(text):
+    text = text.replace(",", ".").replace(" ", "")
+    if "/" in text:
+        numerator, denominator = text.split("/")
+        return float(numerator) / float(denominator) if float(denominator) else 0.0
+    return float(text)
+
+
+def _singular(word):
+    """Naive Portuguese singular (ovos -> ovo, limoes -> limao, colheres -> colher)"""
+    if len(word) <= 3:
+        return word
+    if word.endswith(("oes", "aes")):
+        return word[:-3] + "ao"
+    if word.endswith("es") and word[-3] in "rz":
+        return word[:-2]
+    if word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def normalize_food_name(name):
+    """Lowercase words without accents, punctuation, plurals or qualifiers"""
+    text = _PARENTHETICAL.sub(" ", name.lower()).translate(_ACCENTS)
+    words = [_singular(word) for word in _NON_WORD.sub(" ", text.replace("-", " ")).split()
+             if not word.isdigit()]
+    return " ".join(word for word in words if word not in QUALIFIERS)
+
+
+def _trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def parse_quantity(line):
+    """
+    Grams (or None) and count of units (or None) of an ingredient line:
+    "150 g de tomate" -> (150.0, None), "3 ovos" -> (None, 3.0)
+    """
+    text = line.lower().translate(_ACCENTS)
+    weight = _WEIGHT.search(text)
+    if weight:
+        unit = weight.group(2)
+        unit = unit if unit in WEIGHT_UNITS else _singular(unit)
+        return _number(weight.group(1)) * WEIGHT_UNITS[unit], None
+    count = _LEADING_COUNT.match(text)
+    quantity = _number(count.group(1)) if count else None
+    if quantity is None:
+        first_word = text.split()[0] if text.split() else ""
+        quantity = _WORD_NUMBERS.get(first_word)
+    words = " ".join(_singular(word) for word in _NON_WORD.sub(" ", text).split())
+    for measure, grams in MEASURES.items():
+        if measure in words:
+            return (quantity or 1) * grams, None
+    return None, quantity
+
+
+class NutritionTable:
+    """
+    Nutrients per 100 g of each food (one numpy row per food) and the name
+    index used to resolve ingredient lines to rows
+    """
+
+    def __init__(self, foods):
+        self.names = [food[0] for food in foods]
+        self.unit_grams = np.array([food[2] for food in foods], dtype=np.float64)
+        self.values = np.array([food[3:3 + len(NUTRIENTS)] for food in foods], dtype=np.float64)
+        self._keys = {}
+        for row, (name, aliases, *_) in enumerate(foods):
+            for key in (name, *aliases):
+                self._keys.setdefault(normalize_food_name(key), row)
+        self._key_list = list(self._keys)
+        self._key_rows = np.array([self._keys[key] for key in self._key_list])
+        self._longest_key = max(len(key.split()) for key in self._key_list)
+        # trigram -> indices of the keys containing it
+        postings = {}
+        for position, key in enumerate(self._key_list):
+            for gram in _trigrams(key):
+                postings.setdefault(gram, []).append(position)
+        self._postings = {gram: np.array(positions) for gram, positions in postings.items()}
+        self._key_sizes = np.array([len(_trigrams(key)) for key in self._key_list])
+        self.lookup = lru_cache(maxsize=4096)(self._lookup)
+
+    @classmethod
+    def from_csv(cls, path):
+        """Table from a CSV file with the columns of nutrition_data.py"""
+        foods = []
+        with open(path, newline="", encoding="utf-8") as handle:
+            for row in csv.DictReader(handle):
+                foods.append((row["name"], [alias for alias in row.get("aliases", "").split("|") if alias],
+                              float(row.get("unit_g") or 0),
+                              *(float(row[key] or 0) for key, _, _ in NUTRIENTS)))
+        return cls(foods)
+
+    def _phrase(self, words):
+        """(row, words covered) of the longest known phrase ("queijo mucarela" in "queijo mucarela light")"""
+        for size in range(min(len(words), self._longest_key), 0, -1):
+            for start in range(len(words) - size + 1):
+                row = self._keys.get(" ".join(words[start:start + size]))
+                if row is not None:
+                    return row, size
+        return None, 0
+
+    def _fuzzy(self, normalized):
+        """(row, similarity) of the key sharing the most trigrams with the name"""
+        grams = _trigrams(normalized)
+        matches = [self._postings[gram] for gram in grams if gram in self._postings]
+        if not matches:
+            return None, 0.0
+        shared = np.bincount(np.concatenate(matches), minlength=len(self._key_list))
+        similarity = 2 * shared / (self._key_sizes + len(grams))
+        best = int(similarity.argmax())
+        return int(self._key_rows[best]), float(similarity[best])
+
+    def _lookup(self, normalized):
+        """Row of the food named in a normalized ingredient name, or None"""
+        if not normalized:
+            return None
+        row = self._keys.get(normalized)
+        if row is not None:
+            return row
+        words = normalized.split()
+        row, covered = self._phrase(words)
+        # A close spelling of the whole name beats a phrase covering part of
+        # it ("queijo parmezao" is parmesan, not any cheese)
+        fuzzy_row, similarity = self._fuzzy(normalized)
+        if similarity >= FUZZY_THRESHOLD and similarity > covered / len(words):
+            return fuzzy_row
+        return row
+
+    def resolve(self, line):
+        """(row or None, grams or None) of an ingredient line"""
+        # The food is named before the first comma ("1 tomate (120 g), picado")
+        row = self.lookup(normalize_food_name(_LIST_COMMA.split(_PARENTHETICAL.sub(" ", line))[0]))
+        grams, count = parse_quantity(line)
+        if row is not None and grams is None and count is not None and self.unit_grams[row]:
+            grams = count * float(self.unit_grams[row])
+        return row, grams
+
+    def compute(self, ingredients):
+        """
+        Nutrition of a list of ingredient lines:
+            items    [{ingredient, food, grams, <nutrient keys>}] of the lines counted
+            total    {grams, <nutrient keys>}
+            skipped  lines without a known food or quantity
+        """
+        rows, grams, counted, skipped = [], [], [], []
+        for line in ingredients:
+            if not isinstance(line, str):
+                continue
+            row, weight = self.resolve(line)
+            if row is None or not weight:
+                skipped.append(line)
+                continue
+            rows.append(row)
+            grams.append(weight)
+            counted.append(line)
+        telemetry.incr("nutrition_lines_total", len(counted), result="counted")
+        telemetry.incr("nutrition_lines_total", len(skipped), result="skipped")
+
+        grams = np.array(grams, dtype=np.float64)
+        per_line = self.values[np.array(rows, dtype=np.intp)] * (grams / 100)[:, None]
+        totals = per_line.sum(axis=0) if len(rows) else np.zeros(len(NUTRIENTS))
+        keys = [key for key, _, _ in NUTRIENTS]
+        items = [{"ingredient": line, "food": self.names[row], "grams": round(float(weight), 1),
+                  **{key: round(float(value), 1) for key, value in zip(keys, values)}}
+                 for line, row, weight, values in zip(counted, rows, grams, per_line)]
+        total = {"grams": round(float(grams.sum()), 1),
+                 **{key: round(float(value), 1) for key, value in zip(keys, totals)}}
+        return {"items": items, "total": total, "skipped": skipped}
+
+
+_table = None
+_table_lock = threading.Lock()
+
+
+def get_nutrition_table():
+    """The process-wide nutrient table (NUTRITION_TABLE or the built-in one), loaded once"""
+    global _table
+    with _table_lock:
+        if _table is None:
+            _table = NutritionTable.from_csv(NUTRITION_TABLE) if NUTRITION_TABLE else NutritionTable(NUTRIENT_FOODS)
+        return _table
+
+
+def recipe_nutrition(recipe_json):
+    """Nutrition of a generated recipe (None when it has no ingredient list)"""
+    if not isinstance(recipe_json, dict) or not isinstance(recipe_json.get("ingredients"), list):
+        return None
+    return get_nutrition_table().compute(recipe_json["ingredients"])
+
+
+def _format(value, unit):
+    if unit in ("kcal", "mg") or value >= 10:
+        text = f"{value:.0f}"
+    else:
+        text = f"{value:.1f}".replace(".", ",")
+    return f"{text} {unit}"
+
+
+def nutrition_markdown(nutrition):
+    """Markdown table of recipe_nutrition: one row per ingredient and the total"""
+    if not nutrition or not nutrition["items"]:
+        return ""
+    header = ["Ingrediente", "Quantidade", *(label for _, label, _ in NUTRIENTS)]
+    lines = ["| " + " | ".join(header) + " |", "|" + "---|" * len(header)]
+    for item in nutrition["items"]:
+        cells = [item["food"].capitalize(), _format(item["grams"], "g"),
+                 *(_format(item[key], unit) for key, _, unit in NUTRIENTS)]
+        lines.append("| " + " | ".join(cells) + " |")
+    total = nutrition["total"]
+    cells = ["**Total**", _format(total["grams"], "g"),
+             *(f"**{_format(total[key], unit)}**" for key, _, unit in NUTRIENTS)]
+    lines.append("| " + " | ".join(cells) + " |")
+    markdown = "\n".join(lines)
+    if nutrition["skipped"]:
+        markdown += "\n\n_Não contabilizados: " + "; ".join(nutrition["skipped"]) + "_"
+    return markdown
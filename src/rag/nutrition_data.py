@@ -0,0 +1,146 @@
+"""
+Nutrient table used by nutrition.py: approximate values per 100 g of the
+edible part (USDA FoodData Central / TACO), raw unless the name says
+otherwise. Liquids are per 100 ml.
+
+Each row is (name, aliases, unit_g, calories_kcal, protein_g, carbs_g,
+fat_g, fiber_g, sodium_mg). name is displayed in the nutrition table;
+aliases are other Portuguese spellings and English names. unit_g is the
+weight of one unit ("3 ovos", "2 dentes de alho"), 0 when the ingredient
+is not counted in units.
+"""
+
+NUTRIENT_FOODS = [
+    # Eggs and dairy
+    ("ovo", ["ovos", "egg", "eggs"], 50, 143, 12.6, 0.7, 9.5, 0, 142),
+    ("clara de ovo", ["claras", "egg white"], 33, 52, 10.9, 0.7, 0.2, 0, 166),
+    ("gema de ovo", ["gemas", "egg yolk"], 17, 322, 15.9, 3.6, 26.5, 0, 48),
+    ("leite", ["leite integral", "milk", "whole milk"], 0, 61, 3.2, 4.8, 3.3, 0, 43),
+    ("leite desnatado", ["skim milk"], 0, 34, 3.4, 5.0, 0.1, 0, 42),
+    ("creme de leite", ["nata", "cream"], 0, 221, 1.5, 4.5, 22.5, 0, 50),
+    ("creme de leite fresco", ["heavy cream", "whipping cream"], 0, 340, 2.8, 2.7, 36.1, 0, 27),
+    ("leite condensado", ["condensed milk"], 0, 321, 7.9, 54.4, 8.7, 0, 127),
+    ("iogurte natural", ["iogurte", "yogurt", "yoghurt"], 0, 61, 3.5, 4.7, 3.3, 0, 46),
+    ("manteiga", ["butter"], 0, 717, 0.9, 0.1, 81.1, 0, 643),
+    ("manteiga sem sal", ["unsalted butter"], 0, 717, 0.9, 0.1, 81.1, 0, 11),
+    ("margarina", ["margarine"], 0, 717, 0.2, 0.7, 80.0, 0, 700),
+    ("queijo", ["cheese"], 0, 370, 23.0, 2.0, 30.0, 0, 620),
+    ("queijo muçarela", ["muçarela", "mussarela", "mozarela", "mozzarella", "mozzarella cheese"],
+     0, 300, 22.2, 2.2, 22.4, 0, 627),
+    ("queijo parmesão", ["parmesão", "parmesan", "parmesan cheese"], 0, 392, 35.8, 3.2, 25.8, 0, 1602),
+    ("queijo cheddar", ["cheddar", "cheddar cheese"], 0, 404, 22.9, 3.1, 33.3, 0, 653),
+    ("queijo minas", ["queijo minas frescal", "queijo branco", "queijo fresco"], 0, 264, 17.4, 3.2, 20.2, 0, 346),
+    ("queijo prato", ["prato"], 0, 360, 22.7, 1.9, 29.1, 0, 580),
+    ("queijo gorgonzola", ["gorgonzola", "blue cheese"], 0, 353, 21.4, 2.3, 28.7, 0, 1146),
+    ("ricota", ["ricotta"], 0, 174, 11.3, 3.0, 13.0, 0, 84),
+    ("requeijão", ["requeijão cremoso"], 0, 257, 9.6, 2.4, 23.4, 0, 558),
+    ("cream cheese", [], 0, 350, 6.2, 5.5, 34.4, 0, 314),
+    # Meat and fish
+    ("peito de frango", ["frango", "filé de frango", "chicken", "chicken breast"], 0, 120, 22.5, 0, 2.6, 0, 45),
+    ("coxa de frango", ["sobrecoxa", "chicken thigh", "chicken thighs"], 0, 121, 19.7, 0, 4.1, 0, 95),
+    ("carne moída", ["patinho moído", "ground beef", "minced beef"], 0, 254, 17.2, 0, 20.0, 0, 66),
+    ("carne bovina", ["carne", "bife", "alcatra", "patinho", "beef", "steak"], 0, 180, 21.0, 0, 10.5, 0, 60),
+    ("carne de porco", ["lombo", "lombo de porco", "pork", "pork loin"], 0, 143, 21.0, 0, 5.9, 0, 50),
+    ("bacon", ["toucinho"], 0, 417, 13.7, 1.4, 39.7, 0, 833),
+    ("presunto", ["ham"], 0, 145, 21.0, 1.5, 5.5, 0, 1200),
+    ("peito de peru", ["turkey breast"], 0, 104, 17.0, 3.5, 1.9, 0.5, 1000),
+    ("linguiça", ["linguiça calabresa", "calabresa", "sausage"], 0, 301, 16.0, 2.0, 25.0, 0, 800),
+    ("camarão", ["shrimp", "prawn", "prawns"], 0, 85, 20.1, 0, 0.5, 0, 119),
+    ("salmão", ["salmon"], 0, 208, 20.4, 0, 13.4, 0, 59),
+    ("atum em lata", ["atum", "tuna", "canned tuna"], 0, 116, 25.5, 0, 0.8, 0, 338),
+    ("peixe branco", ["peixe", "tilápia", "filé de tilápia", "merluza", "fish", "white fish", "cod"],
+     0, 96, 20.1, 0, 1.7, 0, 52),
+    ("tofu", [], 0, 76, 8.1, 1.9, 4.8, 0.3, 7),
+    # Vegetables
+    ("tomate", ["tomato", "tomatoes"], 120, 18, 0.9, 3.9, 0.2, 1.2, 5),
+    ("tomate-cereja", ["tomatinho", "cherry tomato", "cherry tomatoes"], 15, 18, 0.9, 3.9, 0.2, 1.2, 5),
+    ("molho de tomate", ["passata", "tomato sauce"], 0, 29, 1.3, 6.7, 0.2, 1.5, 470),
+    ("extrato de tomate", ["massa de tomate", "tomato paste"], 0, 82, 4.3, 18.9, 0.5, 4.1, 59),
+    ("cebola", ["onion", "onions"], 110, 40, 1.1, 9.3, 0.1, 1.7, 4),
+    ("cebola roxa", ["red onion"], 110, 40, 1.1, 9.3, 0.1, 1.7, 4),
+    ("cebolinha", ["cebolinha verde", "green onion", "scallion", "spring onion", "chives"], 15, 32, 1.8, 7.3, 0.2, 2.6, 16),
+    ("alho", ["dente de alho", "garlic", "garlic cloves"], 5, 149, 6.4, 33.1, 0.5, 2.1, 17),
+    ("batata", ["batata inglesa", "potato", "potatoes"], 150, 77, 2.0, 17.5, 0.1, 2.2, 6),
+    ("batata-doce", ["sweet potato", "sweet potatoes"], 130, 86, 1.6, 20.1, 0.1, 3.0, 55),
+    ("mandioca", ["aipim", "macaxeira", "cassava"], 0, 160, 1.4, 38.1, 0.3, 1.8, 14),
+    ("cenoura", ["carrot", "carrots"], 70, 41, 0.9, 9.6, 0.2, 2.8, 69),
+    ("beterraba", ["beet", "beetroot"], 130, 43, 1.6, 9.6, 0.2, 2.8, 78),
+    ("salsão", ["aipo", "celery"], 40, 16, 0.7, 3.0, 0.2, 1.6, 80),
+    ("pimentão", ["pimentão vermelho", "pimentão verde", "pimentão amarelo", "bell pepper", "red bell pepper"],
+     150, 26, 1.0, 6.0, 0.3, 2.1, 4),
+    ("pimenta dedo-de-moça", ["pimenta vermelha", "chili", "chili pepper", "jalapeno"], 10, 40, 1.9, 8.8, 0.4, 1.5, 9),
+    ("espinafre", ["spinach"], 0, 23, 2.9, 3.6, 0.4, 2.2, 79),
+    ("couve", ["couve-manteiga", "kale"], 0, 49, 4.3, 8.8, 0.9, 3.6, 38),
+    ("repolho", ["cabbage"], 0, 25, 1.3, 5.8, 0.1, 2.5, 18),
+    ("alface", ["lettuce"], 0, 15, 1.4, 2.9, 0.2, 1.3, 28),
+    ("rúcula", ["arugula", "rocket"], 0, 25, 2.6, 3.7, 0.7, 1.6, 27),
+    ("cogumelo", ["champignon", "cogumelos paris", "shimeji", "mushroom", "mushrooms"], 0, 22, 3.1, 3.3, 0.3, 1.0, 5),
+    ("abobrinha", ["zucchini", "courgette"], 200, 17, 1.2, 3.1, 0.3, 1.0, 8),
+    ("berinjela", ["eggplant", "aubergine"], 250, 25, 1.0, 5.9, 0.2, 3.0, 2),
+    ("abóbora", ["abóbora cabotiá", "jerimum", "pumpkin", "squash"], 0, 26, 1.0, 6.5, 0.1, 0.5, 1),
+    ("brócolis", ["brocolis", "broccoli"], 0, 34, 2.8, 6.6, 0.4, 2.6, 33),
+    ("couve-flor", ["cauliflower"], 0, 25, 1.9, 5.0, 0.3, 2.0, 30),
+    ("pepino", ["cucumber"], 200, 15, 0.7, 3.6, 0.1, 0.5, 2),
+    ("vagem", ["green beans"], 0, 31, 1.8, 7.0, 0.2, 2.7, 6),
+    ("aspargo", ["aspargos", "asparagus"], 16, 20, 2.2, 3.9, 0.1, 2.1, 2),
+    ("palmito", ["hearts of palm"], 0, 28, 2.5, 4.6, 0.6, 2.4, 426),
+    ("milho verde", ["milho", "corn", "sweet corn"], 0, 86, 3.3, 19.0, 1.4, 2.7, 15),
+    ("ervilha", ["ervilhas", "peas", "green peas"], 0, 81, 5.4, 14.5, 0.4, 5.1, 5),
+    ("azeitona", ["azeitonas", "olives"], 4, 145, 1.0, 3.8, 15.3, 3.3, 1556),
+    # Fruit
+    ("limão", ["lemon", "lime"], 60, 29, 1.1, 9.3, 0.3, 2.8, 2),
+    ("suco de limão", ["lemon juice", "lime juice"], 0, 22, 0.4, 6.9, 0.2, 0.3, 1),
+    ("laranja", ["orange"], 180, 47, 0.9, 11.8, 0.1, 2.4, 0),
+    ("banana", [], 100, 89, 1.1, 22.8, 0.3, 2.6, 1),
+    ("maçã", ["apple"], 150, 52, 0.3, 13.8, 0.2, 2.4, 1),
+    ("morango", ["strawberry", "strawberries"], 12, 32, 0.7, 7.7, 0.3, 2.0, 1),
+    ("abacate", ["avocado"], 200, 160, 2.0, 8.5, 14.7, 6.7, 7),
+    ("coco ralado", ["coconut", "shredded coconut"], 0, 660, 6.9, 23.7, 64.5, 16.3, 37),
+    ("leite de coco", ["coconut milk"], 0, 230, 2.3, 5.5, 23.8, 2.2, 15),
+    ("uva-passa", ["passas", "raisins"], 0, 299, 3.1, 79.2, 0.5, 3.7, 11),
+    # Grains, legumes and nuts
+    ("arroz", ["arroz branco", "rice", "white rice"], 0, 365, 7.1, 80.0, 0.7, 1.3, 5),
+    ("arroz cozido", ["cooked rice"], 0, 130, 2.7, 28.2, 0.3, 0.4, 1),
+    ("arroz integral", ["brown rice"], 0, 370, 7.9, 77.2, 2.9, 3.5, 7),
+    ("macarrão", ["massa", "espaguete", "talharim", "penne", "pasta", "spaghetti"], 0, 371, 13.0, 74.7, 1.5, 3.2, 6),
+    ("farinha de trigo", ["farinha", "flour", "all purpose flour", "wheat flour"], 0, 364, 10.3, 76.3, 1.0, 2.7, 2),
+    ("amido de milho", ["maisena", "cornstarch"], 0, 381, 0.3, 91.3, 0.1, 0.9, 9),
+    ("aveia", ["aveia em flocos", "oats", "rolled oats"], 0, 389, 16.9, 66.3, 6.9, 10.6, 2),
+    ("quinoa", [], 0, 368, 14.1, 64.2, 6.1, 7.0, 5),
+    ("pão", ["pão francês", "pão de forma", "bread"], 50, 265, 9.0, 49.0, 3.2, 2.7, 491),
+    ("feijão", ["feijão carioca", "beans"], 0, 76, 4.8, 13.6, 0.5, 8.5, 2),
+    ("feijão preto", ["black beans"], 0, 132, 8.9, 23.7, 0.5, 8.7, 1),
+    ("grão-de-bico", ["grao de bico", "chickpea", "chickpeas"], 0, 164, 8.9, 27.4, 2.6, 7.6, 7),
+    ("lentilha", ["lentilhas", "lentils"], 0, 116, 9.0, 20.1, 0.4, 7.9, 2),
+    ("amendoim", ["peanut", "peanuts"], 0, 567, 25.8, 16.1, 49.2, 8.5, 18),
+    ("castanha de caju", ["cashew", "cashews"], 0, 553, 18.2, 30.2, 43.9, 3.3, 12),
+    ("nozes", ["walnut", "walnuts"], 0, 654, 15.2, 13.7, 65.2, 6.7, 2),
+    ("amêndoa", ["amêndoas", "almond", "almonds"], 0, 579, 21.2, 21.6, 49.9, 12.5, 1),
+    # Fats, sugars and condiments
+    ("azeite", ["azeite de oliva", "olive oil"], 0, 884, 0, 0, 100.0, 0, 2),
+    ("óleo", ["óleo de soja", "óleo vegetal", "vegetable oil", "oil"], 0, 884, 0, 0, 100.0, 0, 0),
+    ("açúcar", ["açúcar refinado", "sugar"], 0, 387, 0, 100.0, 0, 0, 1),
+    ("açúcar mascavo", ["brown sugar"], 0, 380, 0.1, 98.1, 0, 0, 28),
+    ("mel", ["honey"], 0, 304, 0.3, 82.4, 0, 0.2, 4),
+    ("chocolate", ["chocolate meio amargo", "dark chocolate"], 0, 546, 4.9, 61.2, 31.3, 7.0, 24),
+    ("cacau em pó", ["cacau", "cocoa", "cocoa powder"], 0, 228, 19.6, 57.9, 13.7, 37.0, 21),
+    ("fermento em pó", ["fermento", "baking powder"], 0, 53, 0, 27.7, 0, 0.2, 10600),
+    ("sal", ["salt"], 0, 0, 0, 0, 0, 0, 38758),
+    ("molho shoyu", ["shoyu", "molho de soja", "soy sauce"], 0, 53, 8.1, 4.9, 0.6, 0.8, 5493),
+    ("vinagre", ["vinegar"], 0, 18, 0, 0, 0, 0, 2),
+    ("maionese", ["mayonnaise"], 0, 680, 1.0, 0.6, 75.0, 0, 635),
+    ("mostarda", ["mustard"], 0, 60, 3.7, 5.8, 3.3, 4.0, 1104),
+    ("ketchup", [], 0, 101, 1.0, 27.4, 0.1, 0.3, 907),
+    ("caldo de legumes", ["caldo de galinha", "caldo", "broth", "stock"], 0, 6, 0.6, 0.4, 0.2, 0, 371),
+    ("água", ["water"], 0, 0, 0, 0, 0, 0, 0),
+    # Herbs and spices
+    ("pimenta-do-reino", ["pimenta", "black pepper", "pepper"], 0, 251, 10.4, 64.0, 3.3, 25.3, 20),
+    ("manjericão", ["basil", "fresh basil"], 0, 23, 3.2, 2.7, 0.6, 1.6, 4),
+    ("salsinha", ["salsa", "cheiro-verde", "parsley"], 0, 36, 3.0, 6.3, 0.8, 3.3, 56),
+    ("coentro", ["cilantro", "coriander"], 0, 23, 2.1, 3.7, 0.5, 2.8, 46),
+    ("orégano", ["oregano"], 0, 265, 9.0, 68.9, 4.3, 42.5, 25),
+    ("cominho", ["cumin"], 0, 375, 17.8, 44.2, 22.3, 10.5, 168),
+    ("páprica", ["colorau", "paprika"], 0, 282, 14.1, 54.0, 12.9, 34.9, 68),
+    ("canela", ["cinnamon"], 0, 247, 4.0, 80.6, 1.2, 53.1, 10),
+    ("gengibre", ["ginger"], 0, 80, 1.8, 17.8, 0.8, 2.0, 13),
+]
@@ -0,0 +1,117 @@
+import os
+import threading
+from collections import deque
+from concurrent.futures import wait, FIRST_COMPLETED
+
+from src import telemetry
+from src.rag.dedupe import dedupe_recipes, is_near_duplicate
+from src.rag.llm import submit_recipe_generations
+
+logger = telemetry.get_logger(__name__)
+
+# Variants generated ahead of the user asking for them; each is a paid LLM
+# call that may never be shown, so one by default (0 disables prefetching)
+PREFETCH_DEPTH = int(os.getenv("PREFETCH_DEPTH", "1"))
+
+
+class RecipePrefetcher:
+    """
+    Queue of recipe variants generated ahead of time for one ingredient query.
+
+    Variants are generated in the background on the shared generation pool so
+    that asking for "another recipe" can be answered straight from the queue.
+    Calling cancel() (e.g. when the ingredient set changes) stops pending
+    generations and discards whatever is still running.
+    """
+
+    def __init__(self, context, ingredients, openai_api_key=None, depth=PREFETCH_DEPTH, llm=None,
+                 context_ids=None):
+        self.context = context
+        self.context_ids = context_ids
+        self.ingredients = ingredients
+        self.openai_api_key = openai_api_key
+        self.depth = depth
+        self.llm = llm
+        self.cancelled = False
+        self._ready = deque()
+        self._in_flight = set()
+        self._next_variant = 1
+        # Re-entrant: cancelling a future runs its done callback synchronously
+        self._lock = threading.RLock()
+
+    def _on_done(self, future):
+        with self._lock:
+            if future not in self._in_flight:
+                return  # Already handled
+            self._in_flight.discard(future)
+            if self.cancelled or future.cancelled():
+                return
+            try:
+                recipe = future.result()
+            except Exception as e:
+                logger.warning("Prefetched generation failed: %s", e)
+                return
+            if dedupe_recipes([recipe], list(self._ready)):
+                self._ready.append(recipe)
+
+    def fill(self, seen=[]):
+        """Start generations until depth variants are ready or in flight"""
+        with self._lock:
+            if self.cancelled:
+                return
+            missing = self.depth - len(self._ready) - len(self._in_flight)
+            if missing <= 0:
+                return
+            futures = submit_recipe_generations(
+                self.context, self.ingredients, missing, self.openai_api_key,
+                [*seen, *self._ready], self.llm, first_variant=self._next_variant,
+                context_ids=self.context_ids)
+            self._next_variant += missing
+            self._in_flight.update(futures)
+        for future in futures:
+            future.add_done_callback(self._on_done)
+
+    def _pop_unseen(self, seen):
+        with self._lock:
+            while self._ready:
+                recipe = self._ready.popleft()
+                if not any(is_near_duplicate(recipe, other) for other in seen):
+                    return recipe
+        return None
+
+    def next(self, seen=[], timeout=None):
+        """
+        Return the next variant that is not a near-duplicate of seen, waiting
+        for an in-flight generation if none is ready. Returns None when nothing
+        arrives in time (or the prefetcher was cancelled). Refills the queue.
+        """
+        recipe = self._pop_unseen(seen)
+        while recipe is None and not self.cancelled:
+            with self._lock:
+                in_flight = set(self._in_flight)
+            if not in_flight:
+                break
+            done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                # The done callback may not have run yet
+                self._on_done(future)
+            recipe = self._pop_unseen(seen)
+
+        if recipe is not None:
+            self.fill([*seen, recipe])
+        return recipe
+
+    def pending(self):
+        """Number of variants ready plus in flight"""
+        with self._lock:
+            return len(self._ready) + len(self._in_flight)
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            for future in list(self._in_flight):
+                future.cancel()
+            self._in_flight.clear()
+            self._ready.clear()
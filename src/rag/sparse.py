@@ -0,0 +1,47 @@
+import hashlib
+
+from qdrant_client.models import SparseVector
+
+from src.rag.ingredients import canonicalize_ingredients, ingredient_terms
+
+# Name of the sparse vector next to the (unnamed) dense one in hybrid collections
+SPARSE_VECTOR_NAME = "ingredients"
+
+# BM25 term-frequency saturation and length normalization. Every term occurs
+# once per recipe, so only the length part matters: recipes with many
+# ingredients weigh each of them a bit less. IDF is applied by Qdrant.
+BM25_K1 = 1.2
+BM25_B = 0.75
+AVERAGE_TERMS = 12
+
+
+def term_index(term):
+    """Stable 32-bit index of a term in the sparse vector space"""
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=4).digest(), "little")
+
+
+def _sparse_vector(weights):
+    indices = sorted(weights)
+    return SparseVector(indices=indices, values=[weights[index] for index in indices])
+
+
+def document_sparse_vector(terms):
+    """BM25-weighted sparse vector of a recipe's canonical ingredient terms"""
+    terms = set(terms)
+    if not terms:
+        return SparseVector(indices=[], values=[])
+    norm = 1 - BM25_B + BM25_B * len(terms) / AVERAGE_TERMS
+    weight = (BM25_K1 + 1) / (1 + BM25_K1 * norm)
+    return _sparse_vector({term_index(term): weight for term in terms})
+
+
+def query_sparse_vector(ingredients):
+    """Sparse query vector of the user's ingredients (canonical names only)"""
+    return _sparse_vector({term_index(term): 1.0 for term in canonicalize_ingredients(ingredients)})
+
+
+def recipe_terms(metadata):
+    """Canonical ingredient terms of stored recipe metadata"""
+    if "canonical_ingredients" in metadata:
+        return metadata["canonical_ingredients"]
+    return ingredient_terms(metadata.get("ingredients") or metadata.get("used_ingredients", []))
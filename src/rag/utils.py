@@ -1,2 +1,6 @@
+from src.rag.ingredients import canonicalize_ingredients
+
+
 def parse_ingredients(ingredients_str):
-    return [x.strip() for x in ingredients_str.split(",") if x.strip()]
+    """Split the user input on commas and canonicalize each ingredient"""
+    return canonicalize_ingredients(x for x in ingredients_str.split(",") if x.strip())
@@ -1,156 +1,660 @@
-from langchain.vectorstores import Qdrant
-from langchain_qdrant import QdrantVectorStore
-from qdrant_client.models import Filter, FieldCondition, MatchAny, PayloadSchemaType
+import hashlib
+import json
+import os
+import threading
+import uuid
+
+import httpx
+from langchain_core.documents import Document
+from qdrant_client.models import (
+    FieldCondition,
+    Filter,
+    Fusion,
+    FusionQuery,
+    HasIdCondition,
+    MatchAny,
+    PointStruct,
+    Prefetch,
+)
 from qdrant_client import QdrantClient
 
+from src import telemetry
+from src.rag.collection_schema import create_collection, get_schema
+from src.rag.diversify import DIVERSITY_FETCH_FACTOR, RETRIEVAL_DIVERSITY, diversify
+from src.rag.ingredient_index import IngredientIndex, recipe_ingredients
+from src.rag.ingredients import canonicalize_ingredients, ingredient_terms
+from src.rag.local_store import LOCAL_VECTOR_PATH, MirroredClient, open_store
+from src.rag.sparse import SPARSE_VECTOR_NAME, document_sparse_vector, query_sparse_vector, recipe_terms
+
+# Payload layout used by langchain's Qdrant integrations, kept so that
+# QdrantVectorStore can keep reading the points we write directly.
+CONTENT_PAYLOAD_KEY = "page_content"
+METADATA_PAYLOAD_KEY = "metadata"
+CONTENT_HASH_PAYLOAD_KEY = "content_hash"
+
+# Keyword-indexed payload field used for server-side ingredient filtering
+# (see collection_schema.PAYLOAD_INDEXES)
+CANONICAL_INGREDIENTS_KEY = f"{METADATA_PAYLOAD_KEY}.canonical_ingredients"
+
+logger = telemetry.get_logger(__name__)
+
+UPSERT_BATCH_SIZE = 64
+# Candidates each branch of a hybrid query contributes to the fusion
+HYBRID_PREFETCH_LIMIT = 20
+# Name of the dense vector (langchain's default, the unnamed vector)
+DENSE_VECTOR_NAME = ""
+
+QDRANT_PREFER_GRPC = os.getenv("QDRANT_PREFER_GRPC", "").lower() in ("1", "true", "yes")
+QDRANT_TIMEOUT = int(os.getenv("QDRANT_TIMEOUT", "30"))
+QDRANT_KEEPALIVE_CONNECTIONS = int(os.getenv("QDRANT_KEEPALIVE_CONNECTIONS", "20"))
+QDRANT_KEEPALIVE_EXPIRY = float(os.getenv("QDRANT_KEEPALIVE_EXPIRY", "300"))
+
+# Where the collections live (see local_store.py):
+#   qdrant  the Qdrant server at the URL (default)
+#   local   the embedded store at LOCAL_VECTOR_PATH, whatever the URL
+#   mirror  the Qdrant server, with reads served from a local copy
+# URLs of the form local://<path> always use the embedded store.
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "qdrant").lower()
+VECTOR_BACKENDS = ("qdrant", "local", "mirror")
+LOCAL_URL_PREFIX = "local://"
+
+# Process-wide registry: one client per (URL, backend), plus the results of
+# collection/index checks so they only run once per process.
+_clients = {}
+_ready_collections = set()
+_indexed_fields = set()
+_ingredient_indexes = {}
+_hybrid_collections = {}
+_registry_lock = threading.RLock()
+
+
+class _SerializedClient:
+    """
+    QdrantClient proxy calling one method at a time. The local (:memory:)
+    mode keeps points in numpy arrays that are not safe to search while
+    another thread upserts.
+    """
+
+    def __init__(self, client):
+        self._client = client
+        self._lock = threading.RLock()
+
+    def __getattr__(self, name):
+        attribute = getattr(self._client, name)
+        if not callable(attribute):
+            return attribute
+
+        def call(*args, **kwargs):
+            with self._lock:
+                return attribute(*args, **kwargs)
+        return call
+
+
+def get_client(url, api_key=None, backend=None):
+    """
+    Return the shared client for this URL and backend, creating it on first
+    use: a QdrantClient, or the embedded store when the backend
+    (VECTOR_BACKEND by default) or the URL says so
+    """
+    backend = backend or VECTOR_BACKEND
+    if backend not in VECTOR_BACKENDS:
+        raise ValueError(f"Unknown vector backend '{backend}', expected one of {VECTOR_BACKENDS}")
+    # :memory: and local:// URLs name their store whatever the backend
+    key = (url, None if url == ":memory:" or (url or "").startswith(LOCAL_URL_PREFIX) else backend)
+    with _registry_lock:
+        client = _clients.get(key)
+        if client is None:
+            if url == ":memory:":
+                client = _SerializedClient(QdrantClient(location=":memory:"))
+            elif (url or "").startswith(LOCAL_URL_PREFIX):
+                client = open_store(url[len(LOCAL_URL_PREFIX):] or LOCAL_VECTOR_PATH)
+            elif backend == "local":
+                client = open_store(LOCAL_VECTOR_PATH)
+            else:
+                client = QdrantClient(
+                    url=url,
+                    api_key=api_key,
+                    prefer_grpc=QDRANT_PREFER_GRPC,
+                    timeout=QDRANT_TIMEOUT,
+                    # Keep HTTP connections alive between requests
+                    limits=httpx.Limits(
+                        max_keepalive_connections=QDRANT_KEEPALIVE_CONNECTIONS,
+                        keepalive_expiry=QDRANT_KEEPALIVE_EXPIRY
+                    )
+                )
+                if backend == "mirror":
+                    client = MirroredClient(client, open_store(LOCAL_VECTOR_PATH))
+            _clients[key] = client
+        return client
+
+
+def collection_exists(client, url, collection_name):
+    """Check whether a collection exists, caching positive answers"""
+    if (url, collection_name) in _ready_collections:
+        return True
+    if client.collection_exists(collection_name):
+        _ready_collections.add((url, collection_name))
+        return True
+    return False
+
+
+def is_hybrid_collection(client, url, collection_name):
+    """Whether the collection has the sparse ingredients vector (cached)"""
+    key = (url, collection_name)
+    if key not in _hybrid_collections:
+        if not collection_exists(client, url, collection_name):
+            return False
+        sparse_vectors = client.get_collection(
+            collection_name).config.params.sparse_vectors or {}
+        _hybrid_collections[key] = SPARSE_VECTOR_NAME in sparse_vectors
+    return _hybrid_collections[key]
+
+
+def reset_registry():
+    """Close and forget every pooled client (e.g. after the collection was recreated)"""
+    with _registry_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+        _ready_collections.clear()
+        _indexed_fields.clear()
+        _ingredient_indexes.clear()
+        _hybrid_collections.clear()
+
+
+def _load_ingredient_index(client, collection_name, index, batch_size=1024):
+    """Fill an ingredient index from the payloads already stored in a collection"""
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection_name,
+            limit=batch_size,
+            offset=offset,
+            with_payload=[METADATA_PAYLOAD_KEY],
+            with_vectors=False
+        )
+        for point in points:
+            metadata = (point.payload or {}).get(METADATA_PAYLOAD_KEY) or {}
+            index.add(str(point.id), recipe_ingredients(metadata))
+        if offset is None:
+            break
 
-def get_vectorstore(embedder, url, api_key, collection_name):
-    return QdrantVectorStore.from_existing_collection(
-        embedding=embedder,
-        collection_name=collection_name,
-        url=url,
-        api_key=api_key
-    )
+
+def get_ingredient_index(url, api_key, collection_name):
+    """
+    Return the local ingredient index of (url, collection).
+
+    The index is loaded from the collection payloads the first time it is
+    needed and then kept up to date by store_recipes.
+    """
+    key = (url, collection_name)
+    with _registry_lock:
+        index = _ingredient_indexes.get(key)
+        if index is None:
+            index = IngredientIndex()
+            client = get_client(url, api_key)
+            if collection_exists(client, url, collection_name):
+                _load_ingredient_index(client, collection_name, index)
+            _ingredient_indexes[key] = index
+        return index
 
 
 def create_ingredients_index(url, api_key, collection_name):
-    """Create index for ingredients field to enable filtering"""
-    try:
-        client = QdrantClient(url=url, api_key=api_key)
+    """
+    Create the payload indexes of the collection schema (ingredients, id,
+    title) on collections that predate them
+    """
+    payload_indexes = get_schema().payload_indexes
+    missing_fields = [field_name for field_name in payload_indexes
+                      if (url, collection_name, field_name) not in _indexed_fields]
+    if not missing_fields:
+        return True
 
-        # Check if collection exists
-        collections = client.get_collections()
-        collection_exists = any(
-            col.name == collection_name for col in collections.collections)
+    try:
+        client = get_client(url, api_key)
 
-        if collection_exists:
-            # Create index for ingredients field
-            client.create_payload_index(
-                collection_name=collection_name,
-                field_name="used_ingredients",
-                field_schema=PayloadSchemaType.KEYWORD
-            )
-            print(
-                f"Index created for 'ingredients' field in collection '{collection_name}'")
+        if collection_exists(client, url, collection_name):
+            for field_name in missing_fields:
+                client.create_payload_index(
+                    collection_name=collection_name,
+                    field_name=field_name,
+                    field_schema=payload_indexes[field_name]
+                )
+                _indexed_fields.add((url, collection_name, field_name))
+                logger.info("Index created for '%s' field in collection '%s'", field_name, collection_name)
             return True
     except Exception as e:
-        print(f"Error creating index: {e}")
+        logger.warning("Error creating index: %s", e)
         return False
 
 
-def store_recipes(recipes, embedder, url, api_key, collection_name):
-    """Store recipes with enhanced metadata and create necessary indexes"""
-    # Store documents first
-    Qdrant.from_documents(
-        recipes,
-        embedder,
-        url=url,
-        api_key=api_key,
-        collection_name=collection_name
+def _stored_metadata(doc):
+    """Metadata that is persisted, without the runtime keys added by Qdrant (_id, ...)"""
+    metadata = {key: value for key, value in doc.metadata.items()
+                if not key.startswith("_")}
+    if "canonical_ingredients" not in metadata:
+        metadata["canonical_ingredients"] = ingredient_terms(
+            recipe_ingredients(metadata))
+    return metadata
+
+
+def content_hash(doc):
+    """Stable hash of a document's content and metadata"""
+    hasher = hashlib.sha256()
+    hasher.update(doc.page_content.encode("utf-8"))
+    hasher.update(json.dumps(_stored_metadata(doc), sort_keys=True,
+                  default=str).encode("utf-8"))
+    return hasher.hexdigest()
+
+
+def recipe_point_id(doc, digest=None):
+    """
+    Deterministic point ID for a recipe document.
+
+    Recipes coming from Spoonacular are keyed on their recipe id, so the same
+    recipe always lands on the same point. Documents without an id are keyed
+    on their content hash instead.
+    """
+    recipe_id = doc.metadata.get("id")
+    if recipe_id is not None:
+        key = f"recipe:{recipe_id}"
+    else:
+        key = f"content:{digest or content_hash(doc)}"
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, key))
+
+
+def with_sparse_vector(point):
+    """Add the sparse ingredients vector (from the payload) to a dense point"""
+    metadata = (point.payload or {}).get(METADATA_PAYLOAD_KEY) or {}
+    point.vector = {
+        DENSE_VECTOR_NAME: point.vector,
+        SPARSE_VECTOR_NAME: document_sparse_vector(recipe_terms(metadata)),
+    }
+    return point
+
+
+def recipe_point(point_id, doc, digest, vector, sparse=False):
+    """
+    PointStruct for a recipe, in the payload layout QdrantVectorStore reads.
+    With sparse=True (hybrid collections) the point also gets the sparse
+    ingredients vector.
+    """
+    point = PointStruct(
+        id=point_id,
+        vector=vector,
+        payload={
+            CONTENT_PAYLOAD_KEY: doc.page_content,
+            METADATA_PAYLOAD_KEY: _stored_metadata(doc),
+            CONTENT_HASH_PAYLOAD_KEY: digest,
+        }
     )
+    return with_sparse_vector(point) if sparse else point
+
+
+def ensure_collection(client, url, collection_name, vector_size):
+    """Create the collection as configured by the collection schema"""
+    if not collection_exists(client, url, collection_name):
+        schema = get_schema()
+        create_collection(client, collection_name, vector_size, schema)
+        _ready_collections.add((url, collection_name))
+        _hybrid_collections[(url, collection_name)] = schema.hybrid
+        for field_name in schema.payload_indexes:
+            _indexed_fields.add((url, collection_name, field_name))
+
+
+def fetch_existing_hashes(client, url, collection_name, point_ids, batch_size=UPSERT_BATCH_SIZE):
+    """Return {point_id: content_hash} for the points that already exist"""
+    if not point_ids or not collection_exists(client, url, collection_name):
+        return {}
+
+    existing = {}
+    for start in range(0, len(point_ids), batch_size):
+        points = client.retrieve(
+            collection_name=collection_name,
+            ids=point_ids[start:start + batch_size],
+            with_payload=[CONTENT_HASH_PAYLOAD_KEY],
+            with_vectors=False
+        )
+        for point in points:
+            existing[str(point.id)] = (point.payload or {}).get(
+                CONTENT_HASH_PAYLOAD_KEY)
+    return existing
+
+
+def store_recipes(recipes, embedder, url, api_key, collection_name, batch_size=UPSERT_BATCH_SIZE):
+    """
+    Idempotently store recipes and create necessary indexes.
+
+    Each recipe is written under a deterministic point ID together with a hash
+    of its content. Recipes whose hash is already stored are skipped, so only
+    new or changed recipes are embedded and upserted (in batches).
+
+    Returns:
+        Dict with the number of inserted, updated and skipped recipes
+    """
+    stats = {"inserted": 0, "updated": 0, "skipped": 0}
+    client = get_client(url, api_key)
+
+    # Deduplicate the incoming batch itself (last occurrence wins)
+    pending = {}
+    for doc in recipes:
+        digest = content_hash(doc)
+        point_id = recipe_point_id(doc, digest)
+        if point_id in pending:
+            stats["skipped"] += 1
+        pending[point_id] = (doc, digest)
+
+    existing = fetch_existing_hashes(
+        client, url, collection_name, list(pending))
+
+    to_embed = []
+    for point_id, (doc, digest) in pending.items():
+        if point_id not in existing:
+            stats["inserted"] += 1
+        elif existing[point_id] != digest:
+            stats["updated"] += 1
+        else:
+            stats["skipped"] += 1
+            continue
+        to_embed.append((point_id, doc, digest))
+
+    for start in range(0, len(to_embed), batch_size):
+        batch = to_embed[start:start + batch_size]
+        vectors = embedder.embed_documents(
+            [doc.page_content for _, doc, _ in batch])
+        ensure_collection(client, url, collection_name, len(vectors[0]))
+        sparse = is_hybrid_collection(client, url, collection_name)
+        with telemetry.span("qdrant.upsert", collection=collection_name, points=len(batch)):
+            client.upsert(
+                collection_name=collection_name,
+                points=[
+                    recipe_point(point_id, doc, digest, vector, sparse)
+                    for (point_id, doc, digest), vector in zip(batch, vectors)
+                ]
+            )
+
+    index = get_ingredient_index(url, api_key, collection_name)
+    for point_id, (doc, _) in pending.items():
+        index.add(point_id, recipe_ingredients(doc.metadata))
+
+    logger.info("Stored recipes in '%s': %d inserted, %d updated, %d skipped",
+                collection_name, stats["inserted"], stats["updated"], stats["skipped"])
 
     # Create index for ingredients field after storing documents
-    create_ingredients_index(url, api_key, collection_name)
+    if to_embed:
+        create_ingredients_index(url, api_key, collection_name)
+
+    return stats
+
+
+def migrate_collection(embedder, url, api_key, source_collection, target_collection,
+                       batch_size=UPSERT_BATCH_SIZE):
+    """
+    Re-embed every point of source_collection into target_collection.
+
+    Used when switching embedding backends: the target collection is created
+    with the new embedder's vector size, and points keep their ids and
+    payloads (so content hashes and ingredient filters carry over). It also
+    upgrades older collections to hybrid search, as the sparse ingredients
+    vectors are built from the payloads.
+
+    Returns:
+        Number of points migrated
+    """
+    client = get_client(url, api_key)
+    if not collection_exists(client, url, source_collection):
+        raise ValueError(f"Collection '{source_collection}' does not exist")
+
+    migrated = 0
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=source_collection,
+            limit=batch_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=False
+        )
+        if points:
+            vectors = embedder.embed_documents(
+                [(point.payload or {}).get(CONTENT_PAYLOAD_KEY, "") for point in points])
+            ensure_collection(client, url, target_collection, len(vectors[0]))
+            targets = [PointStruct(id=point.id, vector=vector, payload=point.payload)
+                       for point, vector in zip(points, vectors)]
+            if is_hybrid_collection(client, url, target_collection):
+                targets = [with_sparse_vector(point) for point in targets]
+            with telemetry.span("qdrant.upsert", collection=target_collection, points=len(targets)):
+                client.upsert(
+                    collection_name=target_collection,
+                    points=targets,
+                    wait=offset is None
+                )
+            migrated += len(points)
+            logger.info("Migrated %d points to '%s'", migrated, target_collection)
+        if offset is None:
+            break
+
+    create_ingredients_index(url, api_key, target_collection)
+    return migrated
 
 
 def create_ingredients_filter(ingredients_list):
     """Create Qdrant filter for recipes containing any of the specified ingredients"""
-    if not ingredients_list:
-        print("DEBUG: No ingredients provided for filter")
+    canonical_ingredients = canonicalize_ingredients(ingredients_list)
+    if not canonical_ingredients:
+        logger.debug("No ingredients provided for filter")
         return None
 
-    # Normalize ingredients to lowercase
-    normalized_ingredients = [ing.lower().strip() for ing in ingredients_list]
-    print(
-        f"DEBUG: Normalized ingredients for filter: {normalized_ingredients}")
+    logger.debug("Canonical ingredients for filter: %s", canonical_ingredients)
 
-    try:
-        # Create filter to match recipes that contain any of the user ingredients
-        ingredients_filter = Filter(
-            must=[
-                FieldCondition(
-                    key="used_ingredients",
-                    match=MatchAny(any=normalized_ingredients)
-                )
-            ]
-        )
-        print(f"DEBUG: Filter created successfully")
-        return ingredients_filter
-    except Exception as e:
-        print(f"DEBUG: Error creating filter: {e}")
-        return None
+    # Match recipes that contain any of the user ingredients
+    return Filter(
+        must=[
+            FieldCondition(
+                key=CANONICAL_INGREDIENTS_KEY,
+                match=MatchAny(any=canonical_ingredients)
+            )
+        ]
+    )
+
+
+def search_params_for(url):
+    """Search parameters of the collection schema (local mode only does exact search)"""
+    return None if url == ":memory:" else get_schema().search_params()
+
+
+def _dense_vector(point):
+    vector = point.vector
+    return vector.get(DENSE_VECTOR_NAME) if isinstance(vector, dict) else vector
+
+
+def _points_to_documents(points, collection_name):
+    """Documents like QdrantVectorStore returns them, with the score in metadata['_score']"""
+    docs = []
+    for point in points:
+        payload = point.payload or {}
+        metadata = dict(payload.get(METADATA_PAYLOAD_KEY) or {})
+        metadata.update({"_id": str(point.id), "_collection_name": collection_name,
+                         "_score": point.score})
+        docs.append(Document(page_content=payload.get(CONTENT_PAYLOAD_KEY, ""), metadata=metadata))
+    return docs
 
 
-def retrieve_similar_recipes(query, embedder, url, api_key, collection_name, k=5, ingredients_filter=None):
-    """Retrieve similar recipes with optional ingredient filtering"""
-    vector_db = get_vectorstore(embedder, url, api_key, collection_name)
+def _fetch_size(k, diversity):
+    """
+    (limit, with_vectors) of a search for k results: the MMR reranking
+    needs extra candidates and their vectors, a plain relevance order
+    (diversity=0) neither
+    """
+    return (k * DIVERSITY_FETCH_FACTOR, True) if diversity > 0 else (k, False)
+
+
+def _diversified_documents(points, collection_name, k, diversity):
+    """
+    Rerank search results (fetched with their vectors) with MMR, collapsing
+    near-duplicates, and return the top k as Documents
+    """
+    if diversity > 0 and len(points) > 1:
+        points = diversify(points, [_dense_vector(point) for point in points],
+                           [point.score for point in points], k, diversity)
+    return _points_to_documents(points[:k], collection_name)
+
+
+def _search(embedder, url, api_key, collection_name, query, k, filter=None, diversity=RETRIEVAL_DIVERSITY):
+    """
+    Dense similarity search. For the diversity reranking the candidates
+    come back with their vectors, so that it needs no extra embedding calls.
+    """
+    client = get_client(url, api_key)
+    query_vector = embedder.embed_query(query)
+    limit, with_vectors = _fetch_size(k, diversity)
+    with telemetry.span("qdrant.search", collection=collection_name, mode="dense", k=k,
+                        filtered=filter is not None) as search:
+        response = client.query_points(
+            collection_name=collection_name,
+            query=query_vector,
+            query_filter=filter,
+            limit=limit,
+            with_payload=True,
+            with_vectors=with_vectors,
+            search_params=search_params_for(url)
+        )
+        search.set(candidates=len(response.points))
+    return _diversified_documents(response.points, collection_name, k, diversity)
+
 
+def retrieve_similar_recipes(query, embedder, url, api_key, collection_name, k=5, ingredients_filter=None,
+                             diversity=RETRIEVAL_DIVERSITY):
+    """
+    Retrieve similar recipes with optional ingredient filtering, diversified
+    with MMR (diversity=0 keeps the relevance order and skips the reranking,
+    so near-duplicates are kept)
+    """
     if ingredients_filter:
         try:
             # Use filtered similarity search
-            return vector_db.similarity_search(
+            return _search(
+                embedder, url, api_key, collection_name,
                 query,
                 k=k,
-                filter=ingredients_filter
+                filter=ingredients_filter,
+                diversity=diversity
             )
         except Exception as e:
-            print(f"Filtered search failed: {e}")
+            logger.warning("Filtered search failed: %s", e)
             # Fallback to regular search if filtering fails
-            return vector_db.similarity_search(query, k=k)
+            return _search(embedder, url, api_key, collection_name, query, k=k, diversity=diversity)
     else:
         # Standard similarity search
-        return vector_db.similarity_search(query, k=k)
+        return _search(embedder, url, api_key, collection_name, query, k=k, diversity=diversity)
 
 
-def retrieve_recipes_by_ingredients_fallback(ingredients_list, embedder, url, api_key, collection_name, k=10):
-    """Fallback method: retrieve all recipes and filter in memory"""
+def create_ids_filter(point_ids):
+    """Create Qdrant filter restricting a search to the given point IDs"""
+    return Filter(must=[HasIdCondition(has_id=list(point_ids))])
+
+
+def retrieve_recipes_by_ingredients_fallback(ingredients_list, embedder, url, api_key, collection_name, k=10,
+                                             diversity=RETRIEVAL_DIVERSITY):
+    """
+    Fallback method: resolve the recipes containing any of the ingredients
+    (with partial-name matching) in the local ingredient index, then let Qdrant
+    rank only those candidates.
+    """
     try:
-        vector_db = get_vectorstore(embedder, url, api_key, collection_name)
+        index = get_ingredient_index(url, api_key, collection_name)
+        candidate_ids = index.match_any(ingredients_list)
+        logger.debug("Ingredient index matched %d recipes", len(candidate_ids))
+        if not candidate_ids:
+            return []
 
-        # Get more documents to filter locally
         query = f"receita com {', '.join(ingredients_list)}"
-        all_docs = vector_db.similarity_search(
-            query, k=k*3)  # Get 3x more to filter
-        print(f"DEBUG: Fallback retrieved {len(all_docs)} docs for filtering")
-
-        # Filter in memory by checking metadata
-        filtered_docs = []
-        normalized_user_ingredients = [
-            ing.lower().strip() for ing in ingredients_list]
-        print(
-            f"DEBUG: Filtering for ingredients: {normalized_user_ingredients}")
-
-        for i, doc in enumerate(all_docs):
-            used_ingredients = doc.metadata.get('used_ingredients', [])
-            print(f"DEBUG: Doc {i} used_ingredients: {used_ingredients}")
-
-            # Check if any user ingredient is contained in any recipe ingredient
-            matches = []
-            for user_ing in normalized_user_ingredients:
-                for recipe_ing in used_ingredients:
-                    if user_ing in recipe_ing.lower():
-                        matches.append(f"{user_ing} -> {recipe_ing}")
-                        break  # Found match for this user ingredient
-
-            if matches:
-                print(f"DEBUG: Doc {i} matches: {matches}")
-                filtered_docs.append(doc)
-
-        print(f"DEBUG: Fallback filtered to {len(filtered_docs)} docs")
-        return filtered_docs[:k]  # Return only requested number
+        return _search(
+            embedder, url, api_key, collection_name, query, k=k,
+            filter=create_ids_filter(candidate_ids), diversity=diversity)
 
     except Exception as e:
-        print(f"Fallback search failed: {e}")
+        logger.warning("Fallback search failed: %s", e)
+        return []
+
+
+def retrieve_recipes_hybrid(ingredients_list, embedder, url, api_key, collection_name, k=5,
+                            query_filter=None, prefetch_limit=HYBRID_PREFETCH_LIMIT,
+                            diversity=RETRIEVAL_DIVERSITY):
+    """
+    Hybrid retrieval in a single Qdrant request: a dense search on the
+    "receita com ..." query and a sparse search on the canonical ingredients
+    (BM25 weights, IDF on the server) are fused with reciprocal-rank fusion.
+
+    The sparse branch ranks recipes by ingredient overlap, which the dense
+    embedding captures poorly, so the top k are good without over-fetching.
+    The fused results are then diversified like the dense ones (unless
+    diversity=0).
+    """
+    sparse_query = query_sparse_vector(ingredients_list)
+    if not sparse_query.indices:
         return []
+    client = get_client(url, api_key)
+    dense_query = embedder.embed_query(f"receita com {', '.join(ingredients_list)}")
+    limit, with_vectors = _fetch_size(k, diversity)
+    prefetch_limit = max(limit, prefetch_limit)
+    with telemetry.span("qdrant.search", collection=collection_name, mode="hybrid", k=k,
+                        filtered=query_filter is not None) as search:
+        response = client.query_points(
+            collection_name=collection_name,
+            prefetch=[
+                Prefetch(query=dense_query, using=DENSE_VECTOR_NAME, limit=prefetch_limit,
+                         filter=query_filter, params=search_params_for(url)),
+                Prefetch(query=sparse_query, using=SPARSE_VECTOR_NAME, limit=prefetch_limit,
+                         filter=query_filter),
+            ],
+            query=FusionQuery(fusion=Fusion.RRF),
+            limit=limit,
+            with_payload=True,
+            with_vectors=with_vectors
+        )
+        search.set(candidates=len(response.points))
+    return _diversified_documents(response.points, collection_name, k, diversity)
+
 
+def retrieve_recipes_by_ingredients(ingredients_list, embedder, url, api_key, collection_name, k=10,
+                                    hybrid=None, diversity=RETRIEVAL_DIVERSITY):
+    """
+    Retrieve recipes specifically filtered by ingredients.
 
-def retrieve_recipes_by_ingredients(ingredients_list, embedder, url, api_key, collection_name, k=10):
-    """Retrieve recipes specifically filtered by ingredients with fallback"""
+    Hybrid collections are searched with retrieve_recipes_hybrid (unless
+    hybrid=False). Otherwise the fast path is a server-side filtered dense
+    search on the canonical ingredients keyword index. Collections written
+    before that field existed (or a failing search) fall back to the local
+    ingredient index. Every path reranks its results with MMR (see
+    diversify.mmr_select).
+    """
+    ingredients_filter = create_ingredients_filter(ingredients_list)
+    if ingredients_filter is not None and hybrid is not False:
+        try:
+            client = get_client(url, api_key)
+            if is_hybrid_collection(client, url, collection_name):
+                docs = retrieve_recipes_hybrid(
+                    ingredients_list, embedder, url, api_key, collection_name, k,
+                    query_filter=ingredients_filter, diversity=diversity)
+                if docs:
+                    return docs
+                logger.debug("Hybrid search returned no docs, using fallback")
+        except Exception as e:
+            logger.warning("Hybrid search failed: %s", e)
 
-    # Since Qdrant filtering requires exact matches and our ingredients are complex strings,
-    # we'll skip the Qdrant filter and use the fallback method directly
-    print(f"DEBUG: Using fallback method directly due to complex ingredient names")
+    if ingredients_filter is not None:
+        try:
+            query = f"receita com {', '.join(ingredients_list)}"
+            docs = _search(
+                embedder, url, api_key, collection_name, query, k=k,
+                filter=ingredients_filter, diversity=diversity)
+            if docs:
+                return docs
+            logger.debug("Filtered search returned no docs, using fallback")
+        except Exception as e:
+            logger.warning("Filtered search failed: %s", e)
 
     return retrieve_recipes_by_ingredients_fallback(
-        ingredients_list, embedder, url, api_key, collection_name, k
+        ingredients_list, embedder, url, api_key, collection_name, k, diversity
     )
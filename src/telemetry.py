@@ -0,0 +1,355 @@
+"""
+Instrumentation shared by the app, the pipeline and the CLIs.
+
+Everything goes through one event stream:
+
+    span(name, **attrs)      times a stage (spoonacular.fetch, embedding.embed,
+                             qdrant.search, qdrant.upsert, llm.generate, ...)
+    incr(name, value, **labels)
+                             counters (cache hits, tokens, documents retrieved)
+    ui(type, message)        user-facing messages (info/success/warning/error)
+
+Events update the in-process metrics registry, are written to the
+"recipe_gen" logger (spans and counters at DEBUG, so nothing is formatted
+unless LOG_LEVEL=DEBUG) and are delivered to the capture() lists active in
+the current context, which is how the Streamlit AppLogger gets the messages
+of its session.
+
+Metrics are exposed in the Prometheus text format by render_prometheus()
+and, when METRICS_PORT is set, by start_metrics_server() (on METRICS_HOST,
+127.0.0.1 by default). With
+OTEL_ENABLED=true and opentelemetry installed, spans are also sent to its
+tracer.
+"""
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# json or text
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+METRICS_PORT = os.getenv("METRICS_PORT")
+# Set to 0.0.0.0 for a scraper on another host
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+OTEL_ENABLED = os.getenv("OTEL_ENABLED", "").lower() in ("1", "true", "yes")
+METRICS_PREFIX = "recipe_gen"
+
+# Histogram buckets (seconds) for stage durations
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+UI_LOG_LEVELS = {
+    "info": logging.INFO,
+    "success": logging.INFO,
+    "warning": logging.WARNING,
+    "error": logging.ERROR,
+}
+
+_root_logger = logging.getLogger("recipe_gen")
+_events_logger = logging.getLogger("recipe_gen.events")
+_recorders = contextvars.ContextVar("telemetry_recorders", default=())
+_configured = False
+_configure_lock = threading.Lock()
+
+
+def get_logger(name):
+    """Logger under the 'recipe_gen' hierarchy (name is usually __name__)"""
+    return logging.getLogger(f"recipe_gen.{name}")
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including the event fields of the record"""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        event = getattr(record, "event", None)
+        if event:
+            entry.update(event)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def configure_logging(level=None, fmt=None):
+    """Attach a stderr handler to the 'recipe_gen' logger (once per process)"""
+    global _configured
+    with _configure_lock:
+        if _configured:
+            return
+        handler = logging.StreamHandler()
+        if (fmt or LOG_FORMAT) == "json":
+            handler.setFormatter(JsonFormatter())
+        else:
+            handler.setFormatter(logging.Formatter(
+                "%(asctime)s %(levelname)s %(name)s: %(message)s"))
+        _root_logger.addHandler(handler)
+        _root_logger.setLevel(level or LOG_LEVEL)
+        _root_logger.propagate = False
+        _configured = True
+
+
+def _escape_label(value):
+    """Label value escaped as the text exposition format requires (labels may come from user input)"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsRegistry:
+    """Thread-safe counters and duration histograms, keyed on (name, labels)"""
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def incr(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {
+                    "buckets": [0] * len(self.buckets), "count": 0, "sum": 0.0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram["buckets"][index] += 1
+            histogram["count"] += 1
+            histogram["sum"] += value
+
+    def counter(self, name, **labels):
+        with self._lock:
+            return self._counters.get(self._key(name, labels), 0)
+
+    def histogram(self, name, **labels):
+        """count and sum of a histogram (zeros when nothing was observed)"""
+        with self._lock:
+            histogram = self._histograms.get(self._key(name, labels))
+            if histogram is None:
+                return {"count": 0, "sum": 0.0}
+            return {"count": histogram["count"], "sum": histogram["sum"]}
+
+    def snapshot(self):
+        """Counters and histogram count/sum, as plain dicts (e.g. for JSON)"""
+        def label_str(labels):
+            return ",".join(f"{key}={value}" for key, value in labels)
+
+        with self._lock:
+            return {
+                "counters": {f"{name}{{{label_str(labels)}}}": value
+                             for (name, labels), value in self._counters.items()},
+                "histograms": {f"{name}{{{label_str(labels)}}}": {
+                    "count": histogram["count"], "sum": round(histogram["sum"], 6)}
+                    for (name, labels), histogram in self._histograms.items()},
+            }
+
+    def render_prometheus(self, prefix=METRICS_PREFIX):
+        """Prometheus text exposition format"""
+        def labels_text(labels, extra=()):
+            pairs = [*labels, *extra]
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{key}="{_escape_label(value)}"' for key, value in pairs) + "}"
+
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items())
+        typed = set()
+        for (name, labels), value in counters:
+            metric = f"{prefix}_{name}"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} counter")
+                typed.add(metric)
+            lines.append(f"{metric}{labels_text(labels)} {value}")
+        for (name, labels), histogram in histograms:
+            metric = f"{prefix}_{name}"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} histogram")
+                typed.add(metric)
+            for bound, count in zip(self.buckets, histogram["buckets"]):
+                lines.append(f"{metric}_bucket{labels_text(labels, [('le', bound)])} {count}")
+            lines.append(f"{metric}_bucket{labels_text(labels, [('le', '+Inf')])} {histogram['count']}")
+            lines.append(f"{metric}_sum{labels_text(labels)} {histogram['sum']}")
+            lines.append(f"{metric}_count{labels_text(labels)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+REGISTRY = MetricsRegistry()
+
+
+def _deliver(event):
+    for recorder, kinds in _recorders.get():
+        if kinds is None or event["kind"] in kinds:
+            recorder.append(event)
+
+
+@contextmanager
+def capture(target=None, kinds=None):
+    """
+    Record the events emitted in the current context (and in the tasks and
+    threads started from it with a copy of the context) into target.
+    kinds restricts the recorded event kinds, e.g. ("ui",).
+    """
+    target = [] if target is None else target
+    token = _recorders.set((*_recorders.get(), (target, kinds)))
+    try:
+        yield target
+    finally:
+        _recorders.reset(token)
+
+
+def replay(events):
+    """
+    Deliver events emitted elsewhere (e.g. by a run another request is
+    sharing) to the current capture() lists, without logging them again
+    """
+    for event in events:
+        _deliver(event)
+
+
+def incr(name, value=1, **labels):
+    """Increment a counter (e.g. cache_hits_total, cache='embedding')"""
+    REGISTRY.incr(name, value, **labels)
+    if _recorders.get() or _events_logger.isEnabledFor(logging.DEBUG):
+        event = {"kind": "counter", "name": name, "value": value, "labels": labels}
+        _deliver(event)
+        _events_logger.debug("%s += %s %s", name, value, labels, extra={"event": event})
+
+
+def ui(log_type, message):
+    """User-facing message (info, success, warning or error)"""
+    event = {"kind": "ui", "type": log_type, "message": message}
+    _deliver(event)
+    level = UI_LOG_LEVELS.get(log_type, logging.INFO)
+    if _events_logger.isEnabledFor(level):
+        _events_logger.log(level, "%s", message, extra={"event": event})
+    return event
+
+
+_tracer = None
+
+
+def _otel_tracer():
+    global _tracer
+    if _tracer is None:
+        try:
+            from opentelemetry import trace
+            _tracer = trace.get_tracer("recipe_gen")
+        except ImportError:
+            _tracer = False
+    return _tracer
+
+
+class Span:
+    """A timed stage; attributes can be added while it runs with set()"""
+
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = attributes
+        self.duration_s = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+
+def record_span(name, duration_s, status="ok", otel_span=None, /, **attributes):
+    """
+    Record a stage timed by the caller (e.g. across the yields of a
+    generator, where span() cannot be used)
+    """
+    REGISTRY.observe("stage_duration_seconds", duration_s, stage=name)
+    if status != "ok":
+        REGISTRY.incr("stage_errors_total", stage=name)
+    if otel_span is not None:
+        for key, value in attributes.items():
+            otel_span.set_attribute(key, value if isinstance(value, (bool, int, float, str)) else str(value))
+        otel_span.end()
+    if _recorders.get() or _events_logger.isEnabledFor(logging.DEBUG):
+        event = {"kind": "span", "name": name, "duration_ms": round(duration_s * 1000, 3),
+                 "status": status, **attributes}
+        _deliver(event)
+        _events_logger.debug("%s took %.1f ms (%s)", name, duration_s * 1000, status,
+                             extra={"event": event})
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Time a stage. The duration goes to the stage_duration_seconds histogram
+    (and stage_errors_total when it raises), and the span is logged at DEBUG.
+    """
+    current = Span(name, attributes)
+    tracer = _otel_tracer() if OTEL_ENABLED else None
+    otel_span = tracer.start_span(name) if tracer else None
+    status = "ok"
+    start = time.perf_counter()
+    try:
+        yield current
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        current.duration_s = time.perf_counter() - start
+        record_span(name, current.duration_s, status, otel_span, **current.attributes)
+
+
+def render_prometheus():
+    return REGISTRY.render_prometheus()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+_metrics_server = None
+
+
+def start_metrics_server(port=None, host=None):
+    """Serve /metrics in a daemon thread (once per process); returns the server or None"""
+    global _metrics_server
+    port = port if port is not None else METRICS_PORT
+    if port is None:
+        return None
+    host = host or METRICS_HOST
+    with _configure_lock:
+        if _metrics_server is None:
+            _metrics_server = ThreadingHTTPServer((host, int(port)), _MetricsHandler)
+            threading.Thread(target=_metrics_server.serve_forever,
+                             name="metrics-exporter", daemon=True).start()
+            _root_logger.info("Serving metrics on %s:%s/metrics", host, _metrics_server.server_port)
+        return _metrics_server
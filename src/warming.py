@@ -0,0 +1,500 @@
+"""
+Background warming of the caches for the ingredient sets users ask for most.
+
+The pipeline records every query in a QueryLog (decayed counts per
+normalized ingredient set, in SQLite so that they survive restarts and are
+shared by the app and the API). A CacheWarmer then periodically takes the
+most frequent sets and, on a small rate-limited worker pool:
+
+    fetches them from Spoonacular (filling its response cache),
+    stores the recipes in Qdrant with store_recipes,
+    puts them in the pipeline's retrieval cache, and
+    optionally, in the off-peak hours, pre-generates a recipe for each
+    (filling the generation cache the app's first recipe comes from).
+
+Spoonacular calls and LLM tokens are capped per sliding hour. Sets whose
+Spoonacular response is still cached cost no call.
+
+Settings come from the environment:
+
+    WARMING_ENABLED             run the warmer in the app / API (default false)
+    WARMING_LOG_PATH            query log (default .cache/warming.sqlite3)
+    WARMING_HALF_LIFE_HOURS     half-life of the query counts (default 72)
+    WARMING_MAX_SETS            sets kept in the query log (default 5000)
+    WARMING_TOP_N               sets warmed per pass (default 200)
+    WARMING_MIN_SCORE           decayed count a set needs to be warmed (default 2)
+    WARMING_INTERVAL            seconds between passes (default 600)
+    WARMING_START_DELAY         seconds before the first pass (default 60)
+    WARMING_WORKERS             worker threads (default 2)
+    WARMING_RATE                sets started per second (default 0.5)
+    WARMING_API_CALLS_PER_HOUR  Spoonacular calls per hour (default 100)
+    WARMING_TOKENS_PER_HOUR     LLM tokens per hour (default 50000)
+    WARMING_PREGENERATE         pre-generate recipes (default false)
+    WARMING_OFF_PEAK_HOURS      local hours for pre-generation, e.g. "1-6" or
+                                "22-24,0-5" (default 1-6; empty: any time)
+
+Metrics: warming_sets_total{result}, warming_generations_total{result},
+warming_budget_spent_total{resource} and warming_hits_total{cache}, the
+retrieval cache hits served by warmed entries (next to cache_hits_total).
+
+    python -m src.warming [--top 20]              most frequent sets
+    python -m src.warming run [--pregenerate]     one warming pass now (e.g. from cron)
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from src import telemetry
+from src.rag.cache import ingredients_key
+from src.rag.context import count_tokens
+from src.rag.llm import LLM_MAX_TOKENS, build_recipe_prompt, get_generation_cache, is_generation_cached
+
+logger = telemetry.get_logger(__name__)
+
+WARMING_ENABLED = os.getenv("WARMING_ENABLED", "").lower() in ("1", "true", "yes")
+WARMING_LOG_PATH = os.getenv("WARMING_LOG_PATH", os.path.join(".cache", "warming.sqlite3"))
+WARMING_HALF_LIFE = float(os.getenv("WARMING_HALF_LIFE_HOURS", "72")) * 3600
+WARMING_MAX_SETS = int(os.getenv("WARMING_MAX_SETS", "5000"))
+WARMING_TOP_N = int(os.getenv("WARMING_TOP_N", "200"))
+WARMING_MIN_SCORE = float(os.getenv("WARMING_MIN_SCORE", "2"))
+WARMING_INTERVAL = float(os.getenv("WARMING_INTERVAL", "600"))
+WARMING_START_DELAY = float(os.getenv("WARMING_START_DELAY", "60"))
+WARMING_WORKERS = int(os.getenv("WARMING_WORKERS", "2"))
+WARMING_RATE = float(os.getenv("WARMING_RATE", "0.5"))
+WARMING_API_CALLS_PER_HOUR = int(os.getenv("WARMING_API_CALLS_PER_HOUR", "100"))
+WARMING_TOKENS_PER_HOUR = int(os.getenv("WARMING_TOKENS_PER_HOUR", "50000"))
+WARMING_PREGENERATE = os.getenv("WARMING_PREGENERATE", "").lower() in ("1", "true", "yes")
+WARMING_OFF_PEAK_HOURS = os.getenv("WARMING_OFF_PEAK_HOURS", "1-6")
+
+# As many recipes as the pipeline asks Spoonacular for (fetch_recipes_by_ingredients)
+SPOONACULAR_RECIPES = 10
+# No Spoonacular calls for this long after the daily quota was exceeded
+QUOTA_PAUSE = 3600.0
+# Half-lives after which the stored scores are rescaled (see QueryLog)
+REBASE_HALF_LIVES = 32
+
+
+def parse_hours(spec):
+    """Hours of the day in comma-separated "start-end" windows (end exclusive, may wrap midnight)"""
+    hours = set()
+    for window in filter(None, (part.strip() for part in spec.split(","))):
+        start, _, end = window.partition("-")
+        start = int(start) % 24
+        length = ((int(end) - start) % 24 or 24) if end else 1
+        hours.update((start + offset) % 24 for offset in range(length))
+    return frozenset(hours)
+
+
+class QueryLog:
+    """
+    Exponentially decayed count of the queries per ingredient set (halved
+    every half_life seconds), in SQLite.
+
+    Scores are stored multiplied by 2 ** ((t - epoch) / half_life), so that
+    recording is a plain addition (safe with several processes) and the
+    order of the stored scores is the order of the decayed ones; the epoch
+    is moved forward, and the scores rescaled, every REBASE_HALF_LIVES.
+    Counts are buffered in memory and written every flush_interval seconds,
+    in a background thread: record() is called on the event loop of
+    RecipePipeline.retrieve_async and must not wait for SQLite.
+    """
+
+    def __init__(self, path=WARMING_LOG_PATH, half_life=WARMING_HALF_LIFE, max_entries=WARMING_MAX_SETS,
+                 flush_interval=30.0):
+        self.half_life = half_life
+        self.max_entries = max_entries
+        self.flush_interval = flush_interval
+        self._pending = {}
+        self._flushed_at = time.monotonic()
+        self._flushing = False
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS query_sets (
+                key TEXT PRIMARY KEY,
+                ingredients TEXT NOT NULL,
+                score REAL NOT NULL,
+                last_seen REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS query_sets_score ON query_sets (score)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS query_log_epoch (epoch REAL NOT NULL)")
+        self._conn.commit()
+
+    def _scale(self, now):
+        """Factor of the scores stored at now; call within a write transaction"""
+        row = self._conn.execute("SELECT epoch FROM query_log_epoch").fetchone()
+        if row is None:
+            self._conn.execute("INSERT INTO query_log_epoch (epoch) VALUES (?)", (now,))
+            return 1.0
+        half_lives = (now - row[0]) / self.half_life
+        if half_lives > REBASE_HALF_LIVES:
+            self._conn.execute("UPDATE query_sets SET score = score * ?", (2.0 ** -half_lives,))
+            self._conn.execute("UPDATE query_log_epoch SET epoch = ?", (now,))
+            return 1.0
+        return 2.0 ** half_lives
+
+    def record(self, ingredients, count=1):
+        """Count a query for the ingredient set"""
+        key = ingredients_key(ingredients)
+        if not key:
+            return
+        with self._lock:
+            pending = self._pending.get(key)
+            self._pending[key] = [list(ingredients), count + (pending[1] if pending else 0)]
+            due = not self._flushing and time.monotonic() - self._flushed_at >= self.flush_interval
+            if due:
+                self._flushing = True
+        if due:
+            threading.Thread(target=self._flush_in_background, name="query-log-flush", daemon=True).start()
+
+    def _flush_in_background(self):
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error("Query log flush failed: %s", e)
+        finally:
+            with self._lock:
+                self._flushing = False
+
+    def flush(self):
+        """Write the buffered counts (they are kept for the next flush if this one fails)"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._flushed_at = time.monotonic()
+            if not pending:
+                return
+            now = time.time()
+            try:
+                self._conn.execute("BEGIN IMMEDIATE")
+                scale = self._scale(now)
+                self._conn.executemany(
+                    "INSERT INTO query_sets (key, ingredients, score, last_seen) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (key) DO UPDATE SET score = score + excluded.score, "
+                    "ingredients = excluded.ingredients, last_seen = excluded.last_seen",
+                    [(json.dumps(key), json.dumps(ingredients), count * scale, now)
+                     for key, (ingredients, count) in pending.items()])
+                # Forget the least frequent sets beyond max_entries
+                self._conn.execute(
+                    "DELETE FROM query_sets WHERE key IN (SELECT key FROM query_sets "
+                    "ORDER BY score DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                for key, (ingredients, count) in pending.items():
+                    recorded = self._pending.get(key)
+                    self._pending[key] = [ingredients, count + (recorded[1] if recorded else 0)]
+                raise
+
+    def top(self, n, min_score=0.0):
+        """The n most frequent sets as (ingredients, decayed count), most frequent first"""
+        self.flush()
+        with self._lock:
+            try:
+                self._conn.execute("BEGIN IMMEDIATE")
+                scale = self._scale(time.time())
+                rows = self._conn.execute(
+                    "SELECT ingredients, score FROM query_sets WHERE score >= ? ORDER BY score DESC LIMIT ?",
+                    (min_score * scale, n)).fetchall()
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+        return [(json.loads(ingredients), score / scale) for ingredients, score in rows]
+
+    def clear(self):
+        with self._lock:
+            self._pending.clear()
+            self._conn.execute("DELETE FROM query_sets")
+            self._conn.commit()
+
+
+class HourlyBudget:
+    """
+    Amount that can be spent over any sliding window (an hour by default);
+    limit None means no limit. reserve() takes an estimate up front, so
+    that concurrent workers cannot overshoot, and settle() replaces it with
+    the actual amount once known.
+    """
+
+    def __init__(self, limit, resource, window=3600.0):
+        self.limit = limit
+        self.resource = resource
+        self.window = window
+        self._spent = deque()
+        self._lock = threading.Lock()
+
+    def _used(self, now):
+        while self._spent and self._spent[0][0] <= now - self.window:
+            self._spent.popleft()
+        return sum(amount for _, amount in self._spent)
+
+    def used(self):
+        with self._lock:
+            return self._used(time.monotonic())
+
+    def reserve(self, amount):
+        """Take amount from the budget; returns the reservation, or None if it does not fit"""
+        with self._lock:
+            now = time.monotonic()
+            if self.limit is not None and self._used(now) + amount > self.limit:
+                return None
+            reservation = [now, amount]
+            self._spent.append(reservation)
+            return reservation
+
+    def settle(self, reservation, amount):
+        """Replace a reservation by the amount actually spent"""
+        with self._lock:
+            reservation[1] = amount
+        telemetry.incr("warming_budget_spent_total", amount, resource=self.resource)
+
+
+class CacheWarmer:
+    """
+    Warms the caches of pipeline (a RecipePipeline) for the most frequent
+    sets of query_log, in passes run by a scheduler thread (start/stop) or
+    directly with run_once. client is the Spoonacular client (default: the
+    process-wide one).
+    """
+
+    def __init__(self, pipeline, query_log, top_n=WARMING_TOP_N, min_score=WARMING_MIN_SCORE,
+                 interval=WARMING_INTERVAL, start_delay=WARMING_START_DELAY, workers=WARMING_WORKERS,
+                 rate=WARMING_RATE, api_calls_per_hour=WARMING_API_CALLS_PER_HOUR,
+                 tokens_per_hour=WARMING_TOKENS_PER_HOUR, pregenerate=WARMING_PREGENERATE,
+                 off_peak_hours=WARMING_OFF_PEAK_HOURS, client=None):
+        from src.api.spoonacular_integration import TokenBucket
+
+        self.pipeline = pipeline
+        self.query_log = query_log
+        self.top_n = top_n
+        self.min_score = min_score
+        self.interval = interval
+        self.start_delay = start_delay
+        self.pregenerate = pregenerate
+        self.off_peak_hours = parse_hours(off_peak_hours)
+        self.client = client
+        self.api_calls = HourlyBudget(api_calls_per_hour, "spoonacular_calls")
+        self.tokens = HourlyBudget(tokens_per_hour, "llm_tokens")
+        self.limiter = TokenBucket(rate, 1)
+        self.passes = 0
+        self.results = Counter()
+        self._paused_until = 0.0
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cache-warmer")
+        self._stop = threading.Event()
+        self._thread = None
+
+    def off_peak(self, now=None):
+        """Whether pre-generation is allowed at now (a timestamp; default: now)"""
+        if not self.off_peak_hours:
+            return True
+        return time.localtime(now).tm_hour in self.off_peak_hours
+
+    def _spoonacular_client(self):
+        from src.api.spoonacular_integration import get_client
+
+        return self.client or get_client()
+
+    def _fetch(self, ingredients):
+        """(docs, result) of fetching a set from Spoonacular and storing it in Qdrant"""
+        from src.api.spoonacular_integration import QuotaExceededError, ResponseCache, SpoonacularError
+        from src.rag.vectorstore import store_recipes
+
+        if time.monotonic() < self._paused_until:
+            return None, "quota"
+        client = self._spoonacular_client()
+        cached = None
+        if client.cache is not None:
+            cached = client.cache.get(ResponseCache.make_key(ingredients, SPOONACULAR_RECIPES))
+        reservation = None
+        if cached is None or not cached[2]:
+            reservation = self.api_calls.reserve(1)
+            if reservation is None:
+                return None, "budget"
+        try:
+            docs = client.fetch_recipes(ingredients, SPOONACULAR_RECIPES)
+        except QuotaExceededError:
+            # Leave what is left of the day's quota to the users
+            self._paused_until = time.monotonic() + QUOTA_PAUSE
+            return None, "quota"
+        except SpoonacularError as e:
+            logger.warning("Warming %s failed: %s", ingredients, e)
+            return None, "error"
+        finally:
+            if reservation is not None:
+                self.api_calls.settle(reservation, 1)
+        if not docs:
+            return None, "empty"
+
+        config = self.pipeline.config
+        try:
+            store_recipes(docs, config['embedder'], config['qdrant_url'], config['qdrant_api_key'],
+                          config['collection_name'])
+        except Exception as e:
+            logger.warning("Storing warmed recipes for %s failed: %s", ingredients, e)
+        self.pipeline.retrieval_cache.set(
+            ingredients_key(ingredients), {"docs": docs, "source": "spoonacular", "warmed": True})
+        return docs, "warmed"
+
+    def _pregenerate(self, ingredients, docs):
+        """Generate (and cache) the first recipe the app would show for a set, within the token budget"""
+        if get_generation_cache() is None:
+            # Nowhere to keep the recipe: generating it would only spend tokens
+            return "disabled"
+        context, context_ids = self.pipeline.context_for(docs), self.pipeline.context_ids(docs)
+        if is_generation_cached(context, ingredients, self.pipeline.llm, context_ids):
+            return "cached"
+        prompt_tokens = count_tokens(build_recipe_prompt(context, ingredients))
+        reservation = self.tokens.reserve(prompt_tokens + LLM_MAX_TOKENS)
+        if reservation is None:
+            return "budget"
+        try:
+            recipe = self.pipeline.generate(context, ingredients, context_ids=context_ids)
+        except Exception as e:
+            self.tokens.settle(reservation, prompt_tokens)
+            logger.warning("Pre-generating a recipe for %s failed: %s", ingredients, e)
+            return "error"
+        self.tokens.settle(reservation, prompt_tokens + count_tokens(json.dumps(recipe, ensure_ascii=False)))
+        return "ok"
+
+    def warm_set(self, ingredients, pregenerate=False):
+        """Warm the caches for one ingredient set; returns the result (warmed, fresh, budget, ...)"""
+        key = ingredients_key(ingredients)
+        with telemetry.span("warming.set", ingredients=len(key)) as warm_span:
+            cached = self.pipeline.retrieval_cache.get(key) if key in self.pipeline.retrieval_cache else None
+            if cached is not None:
+                docs, result = cached["docs"], "fresh"
+            else:
+                docs, result = self._fetch(ingredients)
+            warm_span.set(result=result)
+            telemetry.incr("warming_sets_total", result=result)
+            if docs and pregenerate:
+                generation = self._pregenerate(ingredients, docs)
+                warm_span.set(generation=generation)
+                telemetry.incr("warming_generations_total", result=generation)
+        return result
+
+    def run_once(self, now=None):
+        """One pass over the most frequent sets; returns the count of each result"""
+        sets = self.query_log.top(self.top_n, self.min_score)
+        pregenerate = self.pregenerate and self.off_peak(now)
+        results = Counter()
+        with telemetry.span("warming.pass", sets=len(sets), pregenerate=pregenerate):
+            futures = []
+            for ingredients, _ in sets:
+                self.limiter.acquire()
+                if self._stop.is_set():
+                    break
+                futures.append(self._pool.submit(self.warm_set, ingredients, pregenerate))
+            for future in futures:
+                try:
+                    results[future.result()] += 1
+                except Exception as e:
+                    logger.warning("Warming task failed: %s", e)
+                    results["error"] += 1
+        self.passes += 1
+        self.results.update(results)
+        logger.info("Warming pass %d: %s", self.passes, dict(results))
+        return dict(results)
+
+    def _run(self):
+        delay = self.start_delay
+        while not self._stop.wait(delay):
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error("Warming pass failed: %s", e)
+            delay = self.interval
+
+    def start(self):
+        """Run passes in a daemon thread, the first one after start_delay"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="cache-warmer", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        return {
+            "passes": self.passes,
+            "results": dict(self.results),
+            "spoonacular_calls_last_hour": self.api_calls.used(),
+            "llm_tokens_last_hour": self.tokens.used(),
+        }
+
+
+_query_log = None
+_warmer = None
+_warming_lock = threading.Lock()
+
+
+def get_query_log():
+    """The process-wide query log"""
+    global _query_log
+    with _warming_lock:
+        if _query_log is None:
+            _query_log = QueryLog()
+        return _query_log
+
+
+def start_warmer(pipeline, enabled=None):
+    """
+    Start the process-wide warmer for pipeline (once per process) when
+    WARMING_ENABLED; returns it, or None when warming is disabled.
+    """
+    global _warmer
+    if not (WARMING_ENABLED if enabled is None else enabled):
+        return None
+    query_log = pipeline.query_log or get_query_log()
+    with _warming_lock:
+        if _warmer is None:
+            _warmer = CacheWarmer(pipeline, query_log).start()
+        return _warmer
+
+
+def main():
+    import argparse
+
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    telemetry.configure_logging()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", nargs="?", choices=["top", "run"], default="top")
+    parser.add_argument("--top", type=int, default=20, help="sets to show (top) or warm (run)")
+    parser.add_argument("--min-score", type=float, default=WARMING_MIN_SCORE)
+    parser.add_argument("--pregenerate", action="store_true",
+                        help="also pre-generate recipes, whatever the time of day")
+    args = parser.parse_args()
+
+    query_log = get_query_log()
+    if args.command == "top":
+        for ingredients, score in query_log.top(args.top, args.min_score):
+            print(f"{score:8.1f}  {', '.join(ingredients)}")
+        return
+
+    from src.pipeline import RecipePipeline
+
+    # The retrieval cache of this process is discarded on exit; Spoonacular's
+    # response cache, Qdrant and the generation cache keep what was warmed
+    warmer = CacheWarmer(RecipePipeline.from_env(query_log=query_log), query_log, top_n=args.top,
+                         min_score=args.min_score, pregenerate=args.pregenerate,
+                         off_peak_hours="" if args.pregenerate else WARMING_OFF_PEAK_HOURS)
+    print(warmer.run_once())
+    print(warmer.stats())
+    warmer.stop()
+
+
+if __name__ == "__main__":
+    main()
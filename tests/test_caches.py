@@ -0,0 +1,152 @@
+import json
+import sqlite3
+import time
+
+import pytest
+
+from src.api.spoonacular_integration import TokenBucket
+from src.rag.cache import TTLCache, ingredients_key
+from src.rag.embedders import HashingEmbeddings
+from src.rag.generation_cache import GenerationCache
+
+RECIPE = {"title": "Omelete de tomate", "ingredients": ["2 ovos", "1 tomate"], "steps": ["Bata.", "Frite."]}
+OTHER_RECIPE = {"title": "Tomates recheados com ovo", "ingredients": ["4 tomates", "3 ovos cozidos"],
+                "steps": ["Recheie.", "Asse."]}
+
+
+def test_ingredients_key_is_normalized():
+    assert ingredients_key([" Tomato", "cheese", "tomato ", ""]) == ("cheese", "tomato")
+
+
+class TestTTLCache:
+    def test_hit_and_miss(self):
+        cache = TTLCache()
+        cache.set("a", 1)
+        assert cache.get("a") == 1
+        assert cache.get("b", "default") == "default"
+        assert "a" in cache and "b" not in cache
+        assert cache.stats() == {"hits": 1, "misses": 1, "entries": 1}
+
+    def test_expired_entries_are_dropped(self):
+        cache = TTLCache(ttl=60)
+        cache.set("a", 1, ttl=-1)
+        assert "a" not in cache
+        assert cache.get("a") is None
+        assert len(cache) == 0
+
+    def test_least_recently_used_is_evicted(self):
+        cache = TTLCache(max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        assert "a" in cache and "c" in cache and "b" not in cache
+
+    def test_pop_and_clear(self):
+        cache = TTLCache()
+        cache.set("a", 1)
+        cache.set("b", 2)
+        assert cache.pop("a") == 1
+        assert cache.pop("a", "gone") == "gone"
+        cache.clear()
+        assert len(cache) == 0
+
+
+class TestGenerationCache:
+    def test_exact_hit_ignores_ingredient_order(self):
+        cache = GenerationCache(":memory:")
+        cache.put("model", 0.7, ["tomato", "egg"], "context", RECIPE)
+        assert cache.get("model", 0.7, ["Egg", "tomato"], "context") == RECIPE
+        assert cache.get("model", 0.7, ["tomato", "egg"], "other context") is None
+        assert cache.get("other-model", 0.7, ["tomato", "egg"], "context") is None
+        assert cache.get("model", 0.2, ["tomato", "egg"], "context") is None
+        assert cache.stats() == {"exact_hits": 1, "semantic_hits": 0, "misses": 3, "entries": 1}
+
+    def test_variants_are_cached_apart(self):
+        cache = GenerationCache(":memory:", embedder=HashingEmbeddings(256))
+        cache.put("model", 0.7, ["egg"], "context", RECIPE)
+        cache.put("model", 0.7, ["egg"], "context", OTHER_RECIPE, variant="vegetariana")
+        assert cache.get("model", 0.7, ["egg"], "context") == RECIPE
+        assert cache.get("model", 0.7, ["egg"], "context", variant="vegetariana") == OTHER_RECIPE
+        # Not even from the semantic tier
+        assert cache.get("model", 0.7, ["egg"], "context", variant="rápida") is None
+        assert not cache.contains("model", 0.7, ["egg"], "context", variant="rápida")
+
+    def test_older_caches_get_the_variant_column(self, tmp_path):
+        path = str(tmp_path / "generations.sqlite3")
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE generations (id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL, "
+                     "model TEXT NOT NULL, temperature REAL NOT NULL, recipe TEXT NOT NULL, "
+                     "prompt_vector BLOB, created_at REAL NOT NULL, last_access REAL NOT NULL)")
+        conn.execute("INSERT INTO generations (key, model, temperature, recipe, created_at, last_access) "
+                     "VALUES (?, 'model', 0.7, ?, ?, ?)",
+                     (GenerationCache.make_key("model", 0.7, ["egg"], "context"), json.dumps(RECIPE),
+                      time.time(), time.time()))
+        conn.commit()
+        conn.close()
+        cache = GenerationCache(path)
+        assert cache.get("model", 0.7, ["egg"], "context") == RECIPE
+        cache.put("model", 0.7, ["egg"], "context", OTHER_RECIPE, variant="vegetariana")
+        assert cache.get("model", 0.7, ["egg"], "context", variant="vegetariana") == OTHER_RECIPE
+
+    def test_context_ids_replace_the_context_text(self):
+        cache = GenerationCache(":memory:")
+        cache.put("model", 0.7, ["egg"], "first wording", RECIPE, context_ids=[2, 1])
+        assert cache.get("model", 0.7, ["egg"], "second wording", context_ids=[1, 2]) == RECIPE
+
+    def test_excluded_recipes_are_skipped(self):
+        cache = GenerationCache(":memory:")
+        cache.put("model", 0.7, ["tomato", "egg"], "context", RECIPE)
+        cache.put("model", 0.7, ["tomato", "egg"], "context", OTHER_RECIPE)
+        assert cache.get("model", 0.7, ["tomato", "egg"], "context", exclude=[RECIPE]) == OTHER_RECIPE
+        assert cache.get("model", 0.7, ["tomato", "egg"], "context", exclude=[RECIPE, OTHER_RECIPE]) is None
+
+    def test_contains_is_not_a_hit(self):
+        cache = GenerationCache(":memory:")
+        assert not cache.contains("model", 0.7, ["egg"], "context")
+        cache.put("model", 0.7, ["egg"], "context", RECIPE)
+        assert cache.contains("model", 0.7, ["egg"], "context")
+        assert cache.stats()["exact_hits"] == 0
+
+    def test_only_structured_recipes_are_stored(self):
+        cache = GenerationCache(":memory:")
+        cache.put("model", 0.7, ["egg"], "context", "not JSON")
+        assert cache.stats()["entries"] == 0
+
+    def test_expired_entries_are_ignored(self):
+        cache = GenerationCache(":memory:", ttl=-1)
+        cache.put("model", 0.7, ["egg"], "context", RECIPE)
+        assert cache.get("model", 0.7, ["egg"], "context") is None
+
+    def test_least_recently_used_is_evicted(self):
+        cache = GenerationCache(":memory:", max_entries=2)
+        for index in range(3):
+            cache.put("model", 0.7, [f"ingredient {index}"], "context", RECIPE)
+            time.sleep(0.01)
+        assert cache.stats()["entries"] == 2
+        assert cache.get("model", 0.7, ["ingredient 0"], "context") is None
+        assert cache.get("model", 0.7, ["ingredient 2"], "context") == RECIPE
+
+    def test_semantic_tier(self):
+        cache = GenerationCache(":memory:", embedder=HashingEmbeddings(256), similarity_threshold=0.9)
+        context = "- Tomato omelette | ingredientes: tomato, egg, salt, black pepper, olive oil"
+        cache.put("model", 0.7, ["tomato", "egg"], context, RECIPE)
+        # Same prompt up to one trailing word: a different exact key, a similar embedding
+        assert cache.get("model", 0.7, ["tomato", "egg"], context + ", chives") == RECIPE
+        assert cache.get("model", 0.7, ["banana", "oats"], "- Banana porridge | ingredientes: banana, oats") is None
+        stats = cache.stats()
+        assert (stats["exact_hits"], stats["semantic_hits"], stats["misses"]) == (0, 1, 1)
+
+
+class TestTokenBucket:
+    def test_burst_then_timeout(self):
+        bucket = TokenBucket(rate=1, capacity=3)
+        assert all(bucket.acquire(timeout=0) for _ in range(3))
+        assert bucket.acquire(timeout=0.1) is False
+
+    def test_refills_at_rate(self):
+        bucket = TokenBucket(rate=50, capacity=1)
+        assert bucket.acquire(timeout=0)
+        start = time.monotonic()
+        assert bucket.acquire(timeout=1)
+        assert time.monotonic() - start == pytest.approx(0.02, abs=0.015)
@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+
+from src.rag.embedders import HashingEmbeddings, get_embedder
+
+TEXTS = ["tomato and cheese salad", "tomato soup with basil", "chocolate cake"]
+
+
+def test_hashing_embeddings():
+    embedder = get_embedder("hashing", "64", cache=False)
+    first, second, third = np.array(embedder.embed_documents(TEXTS))
+    assert first.shape == (64,) and np.linalg.norm(first) == pytest.approx(1.0)
+    assert embedder.embed_query(TEXTS[0]) == first.tolist()
+    # Sharing a word makes texts closer
+    assert first @ second > first @ third
+
+
+def test_settings_are_read_when_the_embedder_is_built(monkeypatch):
+    monkeypatch.setenv("EMBEDDING_BACKEND", "hashing")
+    monkeypatch.setenv("EMBEDDING_MODEL", "32")
+    monkeypatch.setenv("EMBEDDING_CACHE_ENABLED", "false")
+    embedder = get_embedder()
+    assert isinstance(embedder, HashingEmbeddings) and embedder.size == 32
@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+from src.rag.json_stream import IncrementalJSONParser
+
+RECIPE = {
+    "title": "Omelete de \"tomate\" com queijo",
+    "ingredients": ["2 ovos (100 g)", "1 tomate, picado (120 g)", "50 g de queijo \\ ralado"],
+    "steps": ["Bata os ovos.", "Junte o tomate e o queijo.\nMexa bem."],
+    "servings": 2,
+    "notes": {"vegetariana": True, "tags": ["rápida", "fácil"]},
+    "rating": 4.5,
+    "source": None,
+}
+
+
+def feed_in_chunks(text, size):
+    parser = IncrementalJSONParser()
+    events = []
+    for start in range(0, len(text), size):
+        events.extend(parser.feed(text[start:start + size]))
+    return parser, events
+
+
+def expected_events(recipe):
+    events = []
+    for key, value in recipe.items():
+        if isinstance(value, list):
+            events.extend(("item", key, item) for item in value)
+        events.append(("field", key, value))
+    return events
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 16, 1000])
+def test_events_do_not_depend_on_chunk_boundaries(size):
+    text = json.dumps(RECIPE, ensure_ascii=False)
+    parser, events = feed_in_chunks(text, size)
+    assert events == expected_events(RECIPE)
+    assert parser.done
+    assert parser.text == text
+
+
+@pytest.mark.parametrize("size", [1, 2, 5])
+def test_ascii_escapes_split_across_chunks(size):
+    # \uXXXX escapes and escaped quotes/backslashes end up cut in every position
+    text = json.dumps(RECIPE, ensure_ascii=True)
+    _, events = feed_in_chunks(text, size)
+    assert events == expected_events(RECIPE)
+
+
+def test_chunk_ending_in_backslash():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"title": "a \\') == []
+    assert parser.feed('"quoted\\" b", "steps": ["x"]}') == [
+        ("field", "title", 'a "quoted" b'),
+        ("item", "steps", "x"),
+        ("field", "steps", ["x"]),
+    ]
+
+
+def test_code_fence_and_trailing_text_are_ignored():
+    parser = IncrementalJSONParser()
+    events = parser.feed('```json\n{"title": "Sopa", "servings": 4}\n```')
+    assert events == [("field", "title", "Sopa"), ("field", "servings", 4)]
+    assert parser.done
+    assert parser.feed("more text") == []
+
+
+def test_nested_arrays_are_single_items():
+    _, events = feed_in_chunks('{"steps": [[1, 2], {"a": [3]}, 4]}', 1)
+    assert events == [
+        ("item", "steps", [1, 2]),
+        ("item", "steps", {"a": [3]}),
+        ("item", "steps", 4),
+        ("field", "steps", [[1, 2], {"a": [3]}, 4]),
+    ]
+
+
+def test_incomplete_object_is_not_done():
+    parser = IncrementalJSONParser()
+    events = parser.feed('{"title": "Bolo", "steps": ["Misture", "Asse')
+    assert events == [("field", "title", "Bolo"), ("item", "steps", "Misture")]
+    assert not parser.done
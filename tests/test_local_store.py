@@ -0,0 +1,120 @@
+import fcntl
+import os
+
+import numpy as np
+import pytest
+from qdrant_client.models import Distance, FieldCondition, Filter, MatchValue, PointStruct, VectorParams
+
+from src.rag import local_store
+from src.rag.local_store import CollectionLockedError, LocalVectorStore
+
+
+def points(start, stop, seed=0):
+    rng = np.random.default_rng(seed)
+    return [PointStruct(id=index, vector=rng.normal(size=8).tolist(), payload={"n": index, "even": index % 2 == 0})
+            for index in range(start, stop)]
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "vectors")
+
+
+def create(path, precision="float32"):
+    store = LocalVectorStore(path, precision)
+    store.create_collection("recipes", VectorParams(size=8, distance=Distance.COSINE))
+    return store
+
+
+@pytest.mark.parametrize("precision", ["float32", "int8"])
+def test_search_and_filters(path, precision):
+    store = create(path, precision)
+    stored = points(0, 50)
+    store.upsert("recipes", stored)
+    top = store.query_points("recipes", query=stored[7].vector, limit=3).points
+    assert top[0].id == 7 and top[0].score == pytest.approx(1.0, abs=0.02)
+    only_odd = Filter(must=[FieldCondition(key="even", match=MatchValue(value=False))])
+    assert all(point.id % 2 for point in
+               store.query_points("recipes", query=stored[8].vector, query_filter=only_odd, limit=5).points)
+    assert store.count("recipes").count == 50
+
+
+def test_reopen(path):
+    store = create(path, "int8")
+    store.upsert("recipes", points(0, 20))
+    store.delete("recipes", [3, 4])
+    store.close()
+    reopened = LocalVectorStore(path)
+    assert reopened.count("recipes").count == 18
+    assert [record.id for record in reopened.retrieve("recipes", [2, 3])] == [2]
+
+
+def test_other_process_writes_are_picked_up(path):
+    writer = create(path)
+    reader = LocalVectorStore(path)
+    writer.upsert("recipes", points(0, 10))
+    assert reader.count("recipes").count == 10
+    # Grows the files past what the reader has mapped
+    writer.upsert("recipes", points(10, 3000))
+    assert reader.count("recipes").count == 3000
+    # Either side can write
+    reader.upsert("recipes", points(3000, 3001))
+    assert writer.count("recipes").count == 3001
+
+
+def test_compaction_reloads_the_other_stores(path):
+    writer = create(path)
+    reader, stale = LocalVectorStore(path), LocalVectorStore(path)
+    writer.upsert("recipes", points(0, 1000))
+    assert reader.count("recipes").count == stale.count("recipes").count == 1000
+    updated = points(0, 600, seed=1)
+    writer.upsert("recipes", updated)
+    assert sorted(os.listdir(os.path.join(path, "recipes"))) == ["meta.json", "points-1.jsonl", "vectors-1.f32"]
+
+    assert reader.count("recipes").count == 1000
+    assert reader.query_points("recipes", query=updated[5].vector, limit=1).points[0].id == 5
+    # A store still on the old generation writes to the current one
+    stale.upsert("recipes", points(1000, 1001))
+    assert "points-1.jsonl" in os.listdir(os.path.join(path, "recipes"))
+    assert writer.count("recipes").count == reader.count("recipes").count == 1001
+
+
+def test_writes_fail_fast_while_another_process_holds_the_lock(path, monkeypatch):
+    store = create(path)
+    monkeypatch.setattr(local_store, "LOCK_TIMEOUT", 0.05)
+    fd = os.open(os.path.join(path, "recipes"), os.O_RDONLY)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        with pytest.raises(CollectionLockedError):
+            store.upsert("recipes", points(0, 1))
+        # Reads do not need the lock
+        assert store.count("recipes").count == 0
+    finally:
+        os.close(fd)
+    store.upsert("recipes", points(0, 1))
+    assert store.count("recipes").count == 1
+
+
+def test_torn_last_row_is_ignored_and_dropped_by_the_next_write(path):
+    store = create(path)
+    store.upsert("recipes", points(0, 5))
+    points_file = os.path.join(path, "recipes", "points-0.jsonl")
+    with open(points_file, "a") as handle:
+        handle.write('{"id": 99, "payl')
+    reader = LocalVectorStore(path)
+    assert reader.count("recipes").count == 5
+    reader.upsert("recipes", points(5, 6))
+    with open(points_file) as handle:
+        assert len(handle.read().splitlines()) == 6
+    assert store.count("recipes").count == 6
+
+
+def test_collection_deleted_by_another_store(path):
+    store = create(path)
+    other = LocalVectorStore(path)
+    store.upsert("recipes", points(0, 5))
+    assert other.count("recipes").count == 5
+    store.delete_collection("recipes")
+    assert not other.collection_exists("recipes")
+    with pytest.raises(ValueError):
+        other.count("recipes")
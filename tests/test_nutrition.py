@@ -0,0 +1,46 @@
+import pytest
+
+from src.rag.nutrition import get_nutrition_table, nutrition_markdown, parse_quantity, recipe_nutrition
+
+
+@pytest.fixture(scope="module")
+def table():
+    return get_nutrition_table()
+
+
+@pytest.mark.parametrize("line, food, grams", [
+    ("150 g de tomate", "tomate", 150),
+    ("1 tomate (120 g), picado", "tomate", 120),
+    ("2 ovos", "ovo", 100),
+    # Decimal commas are not where the food name ends
+    ("1,5 kg de batata", "batata", 1500),
+    ("0,5 l de leite", "leite", 500),
+    ("2,5 xícaras de farinha", "farinha de trigo", 600),
+    ("1,5 kg de batata, descascada", "batata", 1500),
+])
+def test_resolve(table, line, food, grams):
+    row, weight = table.resolve(line)
+    assert row is not None and table.names[row] == food
+    assert weight == pytest.approx(grams)
+
+
+@pytest.mark.parametrize("line, expected", [
+    ("150 g de tomate", (150.0, None)),
+    ("1,5 kg de batata", (1500.0, None)),
+    ("3 ovos", (None, 3.0)),
+    ("meia cebola", (None, 0.5)),
+    ("sal a gosto", (None, None)),
+])
+def test_parse_quantity(line, expected):
+    assert parse_quantity(line) == expected
+
+
+def test_recipe_nutrition(table):
+    nutrition = recipe_nutrition({"ingredients": ["0,5 l de leite", "2 ovos", "sal a gosto"]})
+    assert [item["food"] for item in nutrition["items"]] == ["leite", "ovo"]
+    assert nutrition["total"]["grams"] == 600
+    assert nutrition["skipped"] == ["sal a gosto"]
+    markdown = nutrition_markdown(nutrition)
+    assert "| **Total** | 600 g |" in markdown
+    assert "Não contabilizados: sal a gosto" in markdown
+    assert recipe_nutrition("texto livre") is None
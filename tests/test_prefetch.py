@@ -0,0 +1,47 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from src.rag import llm as llm_module
+from src.rag.prefetch import RecipePrefetcher
+
+RECIPE = {"title": "Omelete", "ingredients": ["2 ovos"], "steps": ["Bata e frite."]}
+
+
+class FakeModel:
+    model_name = "fake-model"
+    temperature = 0.0
+
+    def __init__(self):
+        self.prompts = []
+
+    def invoke(self, prompt):
+        self.prompts.append(prompt)
+        return SimpleNamespace(content=json.dumps(RECIPE), usage_metadata=None)
+
+
+@pytest.fixture(autouse=True)
+def no_generation_cache():
+    previous = llm_module.get_generation_cache()
+    llm_module.set_generation_cache(None)
+    yield
+    llm_module.set_generation_cache(previous)
+
+
+def test_depth_zero_generates_nothing_ahead():
+    model = FakeModel()
+    prefetcher = RecipePrefetcher("- Omelete", ["egg"], depth=0, llm=model)
+    prefetcher.fill()
+    assert prefetcher.pending() == 0
+    assert prefetcher.next(timeout=1) is None
+    assert model.prompts == []
+
+
+def test_variants_are_generated_up_to_the_depth():
+    model = FakeModel()
+    prefetcher = RecipePrefetcher("- Omelete", ["egg"], depth=1, llm=model)
+    prefetcher.fill()
+    assert prefetcher.pending() == 1
+    assert prefetcher.next(timeout=5) == RECIPE
+    prefetcher.cancel()
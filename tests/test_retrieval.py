@@ -0,0 +1,137 @@
+import numpy as np
+from langchain_core.documents import Document
+
+from src.rag.context import MIN_RECIPE_TOKENS, build_context, context_ids, count_tokens
+from src.rag.diversify import diversify, mmr_select
+from src.rag.ingredient_index import IngredientIndex
+from src.rag.ingredients import canonicalize_ingredient, canonicalize_ingredients, ingredient_terms
+
+
+class TestCanonicalizer:
+    def test_qualifiers_plurals_and_case(self):
+        assert canonicalize_ingredient("Fresh Shredded Tomatoes") == "tomato"
+        assert canonicalize_ingredient("2 large eggs") == "egg"
+        assert canonicalize_ingredient("finely chopped red onions") == "red onion"
+        assert canonicalize_ingredient("cherries") == "cherry"
+        assert canonicalize_ingredient("asparagus") == "asparagus"
+
+    def test_aliases_and_portuguese_names(self):
+        assert canonicalize_ingredient("Scallions") == "green onion"
+        assert canonicalize_ingredient("all-purpose flour") == "flour"
+        assert canonicalize_ingredient("Feijão") == "bean"
+        assert canonicalize_ingredient("carne moída") == "ground beef"
+
+    def test_parentheticals_and_punctuation(self):
+        assert canonicalize_ingredient("garlic cloves (about 3), minced") == "garlic"
+
+    def test_deduplicated_in_order(self):
+        assert canonicalize_ingredients(["Tomatoes", "ovo", "tomato", "eggs", ""]) == ["tomato", "egg"]
+
+    def test_terms_include_word_spans(self):
+        assert ingredient_terms(["ground black pepper", "cheese"]) == [
+            "ground black pepper", "ground black", "black pepper", "ground", "black", "pepper", "cheese"]
+
+
+class TestMMR:
+    def test_empty_and_k_zero(self):
+        assert mmr_select([], [], 3) == []
+        assert mmr_select([[1, 0]], [1.0], 0) == []
+
+    def test_relevance_only(self):
+        vectors = [[1, 0], [0, 1], [1, 1]]
+        assert mmr_select(vectors, [0.2, 0.9, 0.5], 3, diversity=0) == [1, 2, 0]
+
+    def test_near_duplicates_are_collapsed(self):
+        vectors = [[1, 0], [1, 0.01], [0, 1]]
+        assert mmr_select(vectors, [0.9, 0.8, 0.1], 3) == [0, 2]
+
+    def test_diversity_prefers_novel_candidates(self):
+        vectors = [[1, 0], [0.9, 0.44], [0, 1]]
+        relevance = [1.0, 0.9, 0.8]
+        assert mmr_select(vectors, relevance, 2, diversity=0) == [0, 1]
+        assert mmr_select(vectors, relevance, 2, diversity=0.7) == [0, 2]
+
+    def test_zero_vectors_and_equal_relevance(self):
+        picked = mmr_select(np.zeros((3, 4)), [0.5, 0.5, 0.5], 3)
+        assert sorted(picked) == [0, 1, 2]
+
+    def test_diversify_returns_items(self):
+        assert diversify(["a", "b", "c"], [[1, 0], [1, 0], [0, 1]], [3, 2, 1], 3) == ["a", "c"]
+
+
+def recipe(title, ingredients, point_id=None, score=None, instructions="No instructions provided"):
+    metadata = {"title": title, "ingredients": ingredients}
+    if point_id is not None:
+        metadata["_id"] = point_id
+    if score is not None:
+        metadata["_score"] = score
+    content = f"Recipe Name: {title}\nIngredients: {ingredients}\nInstructions: {instructions}"
+    return Document(page_content=content, metadata=metadata)
+
+
+class TestIngredientIndex:
+    def setup_method(self):
+        self.index = IngredientIndex.from_documents([
+            recipe("Caprese", ["Cherry Tomatoes", "mozzarella cheese", "fresh basil"], point_id="a"),
+            recipe("Omelette", ["eggs", "parmesan cheese", "tomato"], point_id="b"),
+            recipe("Rice", ["brown rice", "scallions"], point_id="c"),
+        ])
+
+    def test_partial_names_match(self):
+        assert self.index.points_for("tomatoes") == {"a", "b"}
+        assert self.index.points_for("cheese") == {"a", "b"}
+        assert self.index.points_for("spring onion") == {"c"}
+
+    def test_match_all_and_any(self):
+        assert self.index.match_all(["tomato", "egg"]) == {"b"}
+        assert self.index.match_all(["tomato", "rice"]) == set()
+        assert self.index.match_any(["basil", "rice"]) == {"a", "c"}
+
+    def test_matched_terms(self):
+        assert self.index.matched_terms(["basil", "chocolate", "egg"]) == ["basil", "egg"]
+
+    def test_short_terms_scan_every_ingredient(self):
+        assert self.index.points_for("egg") == {"b"}
+
+    def test_readd_and_remove(self):
+        self.index.add("b", ["chocolate"])
+        assert self.index.points_for("egg") == set()
+        assert self.index.points_for("chocolate") == {"b"}
+        self.index.remove("b")
+        assert "b" not in self.index and len(self.index) == 2
+        assert self.index.points_for("chocolate") == set()
+
+    def test_positions_without_point_ids(self):
+        index = IngredientIndex.from_documents([recipe("A", ["egg"]), recipe("B", ["milk"])])
+        assert index.points_for("milk") == {1}
+
+
+class TestBuildContext:
+    def test_ranked_by_relevance(self):
+        docs = [recipe("Low", ["egg"], score=0.1), recipe("High", ["tomato"], score=0.9)]
+        lines = build_context(docs).split("\n")
+        assert lines == ["- High | ingredientes: tomato", "- Low | ingredientes: egg"]
+
+    def test_instructions_are_cleaned_and_truncated(self):
+        steps = "<ol>" + "".join(f"<li>Step {n} of the recipe.</li>" for n in range(100)) + "</ol>"
+        line = build_context([recipe("Long", ["egg"], instructions=steps)])
+        assert "<li>" not in line
+        assert line.startswith("- Long | ingredientes: egg | preparo: Step 0 of the recipe. Step 1")
+        assert line.endswith("…")
+
+    def test_within_budget(self):
+        docs = [recipe(f"Recipe {n}", ["tomato", "egg", "cheese", "onion"], score=1 - n / 100)
+                for n in range(50)]
+        for budget in (0, 10, MIN_RECIPE_TOKENS + 5, 100, 600):
+            context = build_context(docs, budget=budget)
+            assert count_tokens(context) <= budget
+        # Too little room for even a truncated recipe
+        assert build_context(docs, budget=5) == ""
+
+
+def test_context_ids():
+    spoonacular = recipe("Omelete", ["egg"])
+    spoonacular.metadata["id"] = 42
+    assert context_ids([spoonacular, recipe("Salada", ["tomato"], point_id="abc")]) == [42, "abc"]
+    # Without an id for every recipe, generations are keyed on the context text
+    assert context_ids([spoonacular, recipe("Salada", ["tomato"])]) is None
@@ -0,0 +1,184 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.api.spoonacular_integration import (QuotaExceededError, ResponseCache, SpoonacularClient,
+                                             SpoonacularError)
+
+RECIPES = [{
+    "id": 1, "title": "Tomato omelette", "instructions": "Beat the eggs.",
+    "usedIngredients": [{"name": "Tomato"}, {"name": "Egg"}],
+    "missedIngredients": [{"name": "Chives"}],
+}]
+
+
+class StubServer:
+    """
+    findByIngredients stand-in answering the scripted (status, headers, body)
+    responses in order, then 200 with RECIPES. Runs in a daemon thread.
+    """
+
+    def __init__(self, responses=(), latency=0.0):
+        self.responses = list(responses)
+        self.latency = latency
+        self.requests = []  # (time, headers, query)
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                with stub._lock:
+                    stub.requests.append((time.monotonic(), dict(self.headers), self.path))
+                    status, headers, body = stub.responses.pop(0) if stub.responses else (200, {}, RECIPES)
+                time.sleep(stub.latency)
+                data = b"" if body is None else json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                for name, value in {"Content-Type": "application/json", **headers}.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture(scope="module")
+def server():
+    server = StubServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def stub(server):
+    server.responses, server.requests, server.latency = [], [], 0.0
+    return server
+
+
+def make_client(stub, **kwargs):
+    options = {"api_key": "test", "base_url": stub.url, "rate": 1000, "burst": 1000, "backoff": 0.05}
+    return SpoonacularClient(**{**options, **kwargs})
+
+
+def test_documents_are_built_from_the_response(stub):
+    docs = make_client(stub).fetch_recipes(["tomato", "egg"], 5)
+    assert len(docs) == 1
+    assert docs[0].metadata["ingredients"] == ["tomato", "egg", "chives"]
+    assert "ingredients=tomato%2Cegg" in stub.requests[0][2] and "number=5" in stub.requests[0][2]
+
+
+def test_retries_with_exponential_backoff(stub):
+    stub.responses = [(503, {}, None), (500, {}, None)]
+    client = make_client(stub)
+    assert client.find_by_ingredients(["egg"]) == RECIPES
+    times = [request[0] for request in stub.requests]
+    assert len(times) == 3
+    assert times[1] - times[0] >= 0.05
+    assert times[2] - times[1] >= 0.1
+    assert client.stats()["requests"] == 3
+
+
+def test_retry_after_is_honoured(stub):
+    stub.responses = [(429, {"Retry-After": "0.3"}, None)]
+    client = make_client(stub)
+    assert client.find_by_ingredients(["egg"]) == RECIPES
+    assert stub.requests[1][0] - stub.requests[0][0] >= 0.3
+
+
+def test_gives_up_after_max_retries(stub):
+    stub.responses = [(503, {}, None)] * 3
+    client = make_client(stub, max_retries=2)
+    with pytest.raises(SpoonacularError):
+        client.find_by_ingredients(["egg"])
+    assert len(stub.requests) == 3
+
+
+def test_quota_exceeded_is_not_retried(stub):
+    stub.responses = [(402, {"X-API-Quota-Left": "0"}, {"message": "quota"})]
+    client = make_client(stub)
+    with pytest.raises(QuotaExceededError):
+        client.find_by_ingredients(["egg"])
+    assert len(stub.requests) == 1
+    assert client.stats()["quota_left"] == 0
+
+
+def test_fresh_cache_entries_skip_the_request(stub):
+    client = make_client(stub, cache=ResponseCache(":memory:"))
+    assert client.find_by_ingredients(["tomato", "egg"]) == RECIPES
+    # Same set in another order and case
+    assert client.find_by_ingredients(["Egg", "tomato"]) == RECIPES
+    assert len(stub.requests) == 1
+    assert client.stats()["cache_hits"] == 1
+
+
+def test_stale_entries_are_revalidated(stub):
+    stub.responses = [(200, {"ETag": '"v1"'}, RECIPES), (304, {}, None)]
+    cache = ResponseCache(":memory:", ttl=-1)
+    client = make_client(stub, cache=cache)
+    client.find_by_ingredients(["egg"])
+    assert client.find_by_ingredients(["egg"]) == RECIPES
+    assert stub.requests[1][1].get("If-None-Match") == '"v1"'
+    assert client.stats()["revalidated"] == 1
+
+
+def test_stale_entries_are_replaced(stub):
+    updated = [{**RECIPES[0], "title": "Updated"}]
+    stub.responses = [(200, {"ETag": '"v1"'}, RECIPES), (200, {"ETag": '"v2"'}, updated)]
+    cache = ResponseCache(":memory:", ttl=-1)
+    client = make_client(stub, cache=cache)
+    client.find_by_ingredients(["egg"])
+    assert client.find_by_ingredients(["egg"]) == updated
+    body, etag, fresh = cache.get(ResponseCache.make_key(["egg"], 10))
+    assert (body, etag, fresh) == (updated, '"v2"', False)
+
+
+def test_fetch_many_stays_within_the_rate_limit(stub):
+    stub.latency = 0.01
+    client = make_client(stub, rate=20, burst=2)
+    lists = [[f"ingredient {index}"] for index in range(8)]
+    start = time.monotonic()
+    results = client.fetch_many(lists, max_workers=4)
+    elapsed = time.monotonic() - start
+
+    assert [len(docs) for docs in results] == [1] * 8
+    # 2 at once, then one every 1/20 s
+    assert elapsed >= 6 / 20
+    times = sorted(request[0] for request in stub.requests)
+    assert times[-1] - times[0] >= 5 / 20
+    assert client.stats()["requests"] == 8
+    assert client.limiter.stats()["acquired"] == 8
+
+
+def test_fetch_many_returns_empty_lists_for_failures(stub):
+    stub.responses = [(400, {}, {"message": "bad request"})]
+    results = make_client(stub, max_retries=0).fetch_many([["egg"], ["milk"]], max_workers=1)
+    assert results[0] == [] and len(results[1]) == 1
+
+
+def test_request_counter_is_thread_safe(stub):
+    client = make_client(stub)
+    lists = [[f"ingredient {index}"] for index in range(40)]
+    client.fetch_many(lists, max_workers=8)
+    assert client.stats()["requests"] == len(stub.requests) == 40
@@ -0,0 +1,198 @@
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from src import telemetry
+from src.rag import llm as llm_module
+from src.rag.generation_cache import GenerationCache
+from src.rag.llm import generate_recipe, generate_recipes, stream_recipe
+
+RECIPE = {
+    "title": "Salada de tomate",
+    "ingredients": ["2 tomates (240 g)", "50 g de queijo"],
+    "steps": ["Corte os tomates.", "Misture com o queijo."],
+}
+CONTEXT = "- Tomato salad | ingredientes: tomato, cheese"
+INGREDIENTS = ["tomato", "cheese"]
+
+
+class FakeStreamModel:
+    """Chat model whose stream() yields the given text in chunks of chunk_size characters"""
+
+    model_name = "fake-model"
+    temperature = 0.0
+
+    def __init__(self, text, chunk_size=5, usage=None):
+        self.text = text
+        self.chunk_size = chunk_size
+        self.usage = usage
+        self.prompts = []
+
+    def stream(self, prompt):
+        self.prompts.append(prompt)
+        # Models send empty chunks too (e.g. the role, or the final usage)
+        yield SimpleNamespace(content="", usage_metadata=None)
+        for start in range(0, len(self.text), self.chunk_size):
+            yield SimpleNamespace(content=self.text[start:start + self.chunk_size], usage_metadata=None)
+        yield SimpleNamespace(content="", usage_metadata=self.usage)
+
+
+class FailingStreamModel(FakeStreamModel):
+    """Chat model whose stream() fails after the first chunks"""
+
+    def stream(self, prompt):
+        yield from list(super().stream(prompt))[:3]
+        raise ConnectionError("stream interrupted")
+
+
+@pytest.fixture
+def generation_cache():
+    previous = llm_module.get_generation_cache()
+    cache = GenerationCache(":memory:")
+    llm_module.set_generation_cache(cache)
+    telemetry.REGISTRY.reset()
+    yield cache
+    llm_module.set_generation_cache(previous)
+
+
+def test_events_and_metrics(generation_cache):
+    text = json.dumps(RECIPE, ensure_ascii=False)
+    model = FakeStreamModel(text, usage={"input_tokens": 120, "output_tokens": 45})
+    events = list(stream_recipe(CONTEXT, INGREDIENTS, None, llm=model))
+
+    tokens = [event["text"] for event in events if event["type"] == "token"]
+    assert "".join(tokens) == text
+    assert len(tokens) == -(-len(text) // model.chunk_size)
+    assert [(event["type"], event["key"], event["value"]) for event in events
+            if event["type"] in ("field", "item")] == [
+        ("field", "title", RECIPE["title"]),
+        ("item", "ingredients", RECIPE["ingredients"][0]),
+        ("item", "ingredients", RECIPE["ingredients"][1]),
+        ("field", "ingredients", RECIPE["ingredients"]),
+        ("item", "steps", RECIPE["steps"][0]),
+        ("item", "steps", RECIPE["steps"][1]),
+        ("field", "steps", RECIPE["steps"]),
+    ]
+
+    done = events[-1]
+    assert done["type"] == "done"
+    assert done["recipe"] == RECIPE
+    metrics = done["metrics"]
+    assert metrics["chunks"] == len(tokens)
+    assert metrics["cached"] is False
+    assert 0 <= metrics["time_to_first_token_s"] <= metrics["total_time_s"]
+
+    assert telemetry.REGISTRY.histogram("stage_duration_seconds", stage="llm.stream")["count"] == 1
+    assert telemetry.REGISTRY.counter("llm_tokens_total", kind="prompt", model="fake-model") == 120
+    assert telemetry.REGISTRY.counter("llm_tokens_total", kind="completion", model="fake-model") == 45
+    assert INGREDIENTS[0] in model.prompts[0] and CONTEXT in model.prompts[0]
+
+
+def test_code_fence_is_stripped(generation_cache):
+    text = "```json\n" + json.dumps(RECIPE) + "\n```"
+    events = list(stream_recipe(CONTEXT, INGREDIENTS, None, llm=FakeStreamModel(text, chunk_size=1)))
+    assert events[-1]["recipe"] == RECIPE
+
+
+def test_cached_generation_is_replayed(generation_cache):
+    model = FakeStreamModel(json.dumps(RECIPE))
+    list(stream_recipe(CONTEXT, INGREDIENTS, None, llm=model))
+    events = list(stream_recipe(CONTEXT, INGREDIENTS, None, llm=model))
+
+    assert len(model.prompts) == 1
+    assert not [event for event in events if event["type"] == "token"]
+    assert [event["key"] for event in events if event["type"] == "field"] == ["title", "ingredients", "steps"]
+    assert events[-1]["recipe"] == RECIPE
+    assert events[-1]["metrics"]["cached"] is True
+    assert events[-1]["metrics"]["chunks"] == 0
+
+
+def test_invalid_json_is_returned_as_text(generation_cache):
+    events = list(stream_recipe(CONTEXT, INGREDIENTS, None, llm=FakeStreamModel("Desculpe, não sei.")))
+    assert events[-1]["recipe"] == "Desculpe, não sei."
+    assert generation_cache.stats()["entries"] == 0
+
+
+def test_failed_stream_is_recorded_as_an_error(generation_cache):
+    with pytest.raises(ConnectionError):
+        list(stream_recipe(CONTEXT, INGREDIENTS, None, llm=FailingStreamModel(json.dumps(RECIPE))))
+    assert telemetry.REGISTRY.histogram("stage_duration_seconds", stage="llm.stream")["count"] == 1
+    assert telemetry.REGISTRY.counter("stage_errors_total", stage="llm.stream") == 1
+    assert generation_cache.stats()["entries"] == 0
+
+
+def test_stream_closed_early_is_recorded_as_an_error(generation_cache):
+    events = stream_recipe(CONTEXT, INGREDIENTS, None, llm=FakeStreamModel(json.dumps(RECIPE)))
+    assert next(events)["type"] == "token"
+    events.close()
+    assert telemetry.REGISTRY.histogram("stage_duration_seconds", stage="llm.stream")["count"] == 1
+    assert telemetry.REGISTRY.counter("stage_errors_total", stage="llm.stream") == 1
+
+
+def test_stream_closed_after_done_is_not_an_error(generation_cache):
+    events = stream_recipe(CONTEXT, INGREDIENTS, None, llm=FakeStreamModel(json.dumps(RECIPE)))
+    assert [event for event in events if event["type"] == "done"]
+    events.close()
+    assert telemetry.REGISTRY.counter("stage_errors_total", stage="llm.stream") == 0
+
+
+class FakeModel(FakeStreamModel):
+    def invoke(self, prompt):
+        self.prompts.append(prompt)
+        return SimpleNamespace(content=self.text, usage_metadata=None)
+
+
+def test_generated_variants_are_cached_apart(generation_cache):
+    model = FakeModel(json.dumps(RECIPE))
+    assert generate_recipe(CONTEXT, INGREDIENTS, None, llm=model) == RECIPE
+    assert generate_recipe(CONTEXT, INGREDIENTS, None, llm=model, variant=1) == RECIPE
+    assert generate_recipe(CONTEXT, INGREDIENTS, None, llm=model, variant=1) == RECIPE
+    assert len(model.prompts) == 2 and model.prompts[0] != model.prompts[1]
+    # The plain stream is served by the plain generation
+    list(stream_recipe(CONTEXT, INGREDIENTS, None, llm=model))
+    assert len(model.prompts) == 2
+
+
+def test_generations_are_keyed_on_the_context_ids(generation_cache):
+    model = FakeModel(json.dumps(RECIPE))
+    generate_recipe(CONTEXT, INGREDIENTS, None, llm=model, context_ids=[2, 1])
+    # Same recipes, rendered differently (e.g. another token budget)
+    events = list(stream_recipe(CONTEXT + " | preparo: ...", INGREDIENTS, None, llm=model, context_ids=[1, 2]))
+    assert events[-1]["metrics"]["cached"] is True
+    assert len(model.prompts) == 1
+
+
+class SlowModel(FakeModel):
+    """Answers the first prompt at once and the others after delay seconds"""
+
+    def __init__(self, texts, delay):
+        super().__init__(texts[0])
+        self.texts = list(texts)
+        self.delay = delay
+        self._lock = threading.Lock()
+
+    def invoke(self, prompt):
+        with self._lock:
+            self.prompts.append(prompt)
+            text = self.texts[len(self.prompts) - 1]
+        if len(self.prompts) > 1:
+            time.sleep(self.delay)
+        return SimpleNamespace(content=text, usage_metadata=None)
+
+
+def test_generate_recipes_keeps_what_finished_before_the_timeout(generation_cache):
+    other = {**RECIPE, "title": "Torta de queijo", "ingredients": ["3 ovos", "200 g de queijo"]}
+    model = SlowModel([json.dumps(RECIPE), json.dumps(other)], delay=0.5)
+    start = time.monotonic()
+    recipes = generate_recipes(CONTEXT, INGREDIENTS, 2, llm=model, timeout=0.2)
+    assert time.monotonic() - start < 0.45
+    assert recipes == [RECIPE]
+
+
+def test_code_fence_is_stripped_without_streaming(generation_cache):
+    model = FakeModel("```json\n" + json.dumps(RECIPE) + "\n```")
+    assert generate_recipe(CONTEXT, INGREDIENTS, None, llm=model) == RECIPE
+    assert generation_cache.stats()["entries"] == 1
@@ -0,0 +1,22 @@
+import urllib.request
+
+from src import telemetry
+
+
+def test_label_values_are_escaped():
+    registry = telemetry.MetricsRegistry()
+    registry.incr("queries_total", ingredient='queijo "minas"\\\nfresco')
+    assert r'recipe_gen_queries_total{ingredient="queijo \"minas\"\\\nfresco"} 1' in registry.render_prometheus()
+
+
+def test_metrics_server_binds_to_localhost(monkeypatch):
+    monkeypatch.setattr(telemetry, "_metrics_server", None)
+    server = telemetry.start_metrics_server(port=0)
+    try:
+        host, port = server.server_address[:2]
+        assert host == "127.0.0.1"
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as response:
+            assert response.status == 200
+    finally:
+        server.shutdown()
+        server.server_close()
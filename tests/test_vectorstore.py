@@ -0,0 +1,86 @@
+import pytest
+from langchain_core.documents import Document
+from qdrant_client import QdrantClient
+
+from src.rag import vectorstore
+from src.rag.embedders import HashingEmbeddings
+from src.rag.local_store import LocalVectorStore, MirroredClient
+
+
+@pytest.fixture(autouse=True)
+def registry(tmp_path, monkeypatch):
+    monkeypatch.setattr(vectorstore, "LOCAL_VECTOR_PATH", str(tmp_path / "vectors"))
+    vectorstore.reset_registry()
+    yield
+    vectorstore.reset_registry()
+
+
+class OfflineQdrantClient(QdrantClient):
+    """QdrantClient that does not ask the server for its version (in a thread, over the network)"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, check_compatibility=False, **kwargs)
+
+
+def test_one_client_per_url_and_backend(monkeypatch):
+    monkeypatch.setattr(vectorstore, "QdrantClient", OfflineQdrantClient)
+    url = "http://localhost:6333"
+    qdrant = vectorstore.get_client(url, backend="qdrant")
+    local = vectorstore.get_client(url, backend="local")
+    mirror = vectorstore.get_client(url, backend="mirror")
+    assert isinstance(qdrant, QdrantClient)
+    assert isinstance(local, LocalVectorStore)
+    assert isinstance(mirror, MirroredClient)
+    assert vectorstore.get_client(url, backend="qdrant") is qdrant
+    assert vectorstore.get_client(url, backend="local") is local
+
+
+def test_url_decides_for_memory_and_local_urls(tmp_path):
+    memory = vectorstore.get_client(":memory:", backend="qdrant")
+    assert vectorstore.get_client(":memory:", backend="local") is memory
+    url = f"local://{tmp_path / 'other'}"
+    store = vectorstore.get_client(url, backend="qdrant")
+    assert isinstance(store, LocalVectorStore) and store.path == str(tmp_path / "other")
+    assert vectorstore.get_client(url, backend="mirror") is store
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        vectorstore.get_client(":memory:", backend="faiss")
+
+
+def test_ensure_collection_and_existing_hashes(tmp_path):
+    url = f"local://{tmp_path / 'recipes'}"
+    client = vectorstore.get_client(url)
+    assert vectorstore.fetch_existing_hashes(client, url, "recipes", ["a"]) == {}
+    vectorstore.ensure_collection(client, url, "recipes", 4)
+    vectorstore.ensure_collection(client, url, "recipes", 4)
+    assert vectorstore.collection_exists(client, url, "recipes")
+
+    doc = Document(page_content="Omelete", metadata={"title": "Omelete", "ingredients": ["ovo"]})
+    point_id, digest = vectorstore.recipe_point_id(doc), vectorstore.content_hash(doc)
+    client.upsert("recipes", [vectorstore.recipe_point(point_id, doc, digest, [1.0, 0.0, 0.0, 0.0])])
+    assert vectorstore.fetch_existing_hashes(client, url, "recipes", [point_id]) == {point_id: digest}
+
+
+@pytest.mark.filterwarnings("ignore:Payload indexes have no effect")
+@pytest.mark.parametrize("diversity, limit, with_vectors", [(0, 3, False), (0.3, 6, True)])
+def test_candidates_and_vectors_are_only_fetched_for_the_reranking(diversity, limit, with_vectors):
+    embedder = HashingEmbeddings(64)
+    docs = [Document(page_content=f"Recipe {n}", metadata={"id": n, "title": f"Recipe {n}",
+                                                           "ingredients": ["egg"]})
+            for n in range(10)]
+    vectorstore.store_recipes(docs, embedder, ":memory:", None, "recipes")
+    client = vectorstore.get_client(":memory:")
+    calls = []
+    query_points = client.query_points
+
+    def recording_query_points(**kwargs):
+        calls.append(kwargs)
+        return query_points(**kwargs)
+
+    client.query_points = recording_query_points
+    results = vectorstore.retrieve_similar_recipes("Recipe 1", embedder, ":memory:", None, "recipes", k=3,
+                                                   diversity=diversity)
+    assert len(results) == 3
+    assert (calls[0]["limit"], calls[0]["with_vectors"]) == (limit, with_vectors)
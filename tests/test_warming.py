@@ -0,0 +1,91 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from src.rag import llm as llm_module
+from src.rag.generation_cache import GenerationCache
+from src.warming import CacheWarmer, QueryLog
+
+
+class FakePipeline:
+    llm = None
+
+    def __init__(self):
+        self.generated = []
+
+    def context_for(self, docs):
+        return "\n".join(docs)
+
+    def context_ids(self, docs):
+        return None
+
+    def generate(self, context, ingredients, context_ids=None):
+        self.generated.append(ingredients)
+        recipe = {"title": "Omelete", "ingredients": ingredients, "steps": ["Misture."]}
+        llm_module.get_generation_cache().put(*llm_module._model_params(None), ingredients, context, recipe,
+                                              context_ids)
+        return recipe
+
+
+@pytest.fixture
+def warmer():
+    previous = llm_module.get_generation_cache()
+    pipeline = FakePipeline()
+    warmer = CacheWarmer(pipeline, QueryLog(":memory:"), workers=1, rate=1000, off_peak_hours="")
+    yield warmer
+    warmer.stop()
+    llm_module.set_generation_cache(previous)
+
+
+def test_pregenerate_fills_the_generation_cache(warmer):
+    llm_module.set_generation_cache(GenerationCache(":memory:"))
+    assert warmer._pregenerate(["egg", "tomato"], ["- Omelette"]) == "ok"
+    assert warmer._pregenerate(["egg", "tomato"], ["- Omelette"]) == "cached"
+    assert warmer.pipeline.generated == [["egg", "tomato"]]
+    assert warmer.tokens.used() > 0
+
+
+def test_pregenerate_is_disabled_without_a_generation_cache(warmer):
+    llm_module.set_generation_cache(None)
+    assert warmer._pregenerate(["egg", "tomato"], ["- Omelette"]) == "disabled"
+    assert warmer.pipeline.generated == []
+    assert warmer.tokens.used() == 0
+
+
+def test_query_log_flushes_off_the_calling_thread():
+    log = QueryLog(":memory:", flush_interval=0.0)
+    flushed_by = []
+    flush = log.flush
+
+    def recording_flush():
+        flushed_by.append(threading.current_thread())
+        flush()
+
+    log.flush = recording_flush
+    log.record(["egg", "tomato"])
+    deadline = time.monotonic() + 2
+    while (not flushed_by or log._flushing) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert flushed_by and threading.current_thread() not in flushed_by
+    assert log._pending == {}
+    assert log.top(5) == [(["egg", "tomato"], pytest.approx(1.0))]
+
+
+def test_query_log_failed_flush_is_rolled_back_and_kept(monkeypatch):
+    log = QueryLog(":memory:")
+    log.record(["egg"], count=2)
+
+    def failing_scale(now):
+        log._conn.execute("INSERT INTO query_log_epoch (epoch) VALUES (?)", (now,))
+        raise sqlite3.OperationalError("disk I/O error")
+
+    monkeypatch.setattr(log, "_scale", failing_scale)
+    with pytest.raises(sqlite3.OperationalError):
+        log.flush()
+    assert not log._conn.in_transaction
+    assert log._conn.execute("SELECT COUNT(*) FROM query_log_epoch").fetchone()[0] == 0
+    log.record(["egg"])
+    monkeypatch.undo()
+    assert log.top(5) == [(["egg"], pytest.approx(3.0))]